@@ -6,32 +6,71 @@ import asyncio
 import logging
 import time
 import shutil
-import tempfile
 import signal
 import sys
 from pathlib import Path
 from datetime import datetime,timedelta
 from enum import Enum
 from config.ConfigManager import JsonConfig,ConfigProvider
-from twitch_downloader.VideoDownloader import VideoDownloader
+from scheduler.ChannelScheduler import ChannelScheduler
+from scheduler.ResourceLimits import ResourceLimits
+from scheduler.StateJournal import StateJournal
+from scheduler.AdaptivePoller import AdaptivePoller
+from storage.StorageManager import StorageManager
+from twitch_downloader.api.EventSubListener import EventSubListener
+from pipeline.PostProcessingPipeline import PostProcessingPipeline
+from twitch_downloader.AsyncVideoDownloader import AsyncVideoDownloader
+from twitch_downloader.ThreadedVideoDownloader import ThreadedVideoDownloader
+from twitch_downloader.CachedVideoDownloader import CachedVideoDownloader
+from twitch_downloader.metrics.Metrics import Metrics
+from twitch_downloader.metrics.MetricsServer import MetricsServer
+from twitch_downloader.metrics.Trace import Trace
+from twitch_downloader.hls.IncrementalCapture import IncrementalCapture
+from twitch_downloader.hls.SegmentedCapture import SegmentedCapture
+from twitch_downloader.hls.LiveCapture import LiveCapture
 from twitch_downloader.factory.TwitchDownloaderFactory import TwitchDownloaderFactory
-from twitch_downloader.factory.TwitchVideoAndChatDownloaderFactory import TwitchVideoAndChatDownloaderFactory
+from twitch_downloader.factory.AsyncTwitchVideoAndChatDownloaderFactory import AsyncTwitchVideoAndChatDownloaderFactory
+from twitch_downloader.factory.TwitchApiDownloaderFactory import TwitchApiDownloaderFactory
+from twitch_downloader.factory.CachedDownloaderFactory import CachedDownloaderFactory
+from twitch_downloader.factory.HlsVideoAndChatDownloaderFactory import HlsVideoAndChatDownloaderFactory
 
 class TwitchDownloader:
     class TwitchDownloaderState(Enum):
         WAITING_FOR_VIDEO = 1
         CAPTURING = 2
 
-    def __init__(self, config: ConfigProvider, video_downloader_factory: VideoDownloader):
+    ONLINE_RETRY_INTERVAL = 30.0    # the video appears some seconds after the stream starts; check often meanwhile
+    ONLINE_TIMEOUT = 10*60.0        # ...but not forever
+
+    def __init__(self, config: ConfigProvider, video_downloader_factory: TwitchDownloaderFactory, channel_name: str = None, limits: ResourceLimits = None,
+                        pipeline: PostProcessingPipeline = None, storage: StorageManager = None):
         self._config = config
+        self._video_downloader_factory = video_downloader_factory
         self._video_downloader = video_downloader_factory.build()
+        if not isinstance(self._video_downloader, AsyncVideoDownloader):
+            self._video_downloader = ThreadedVideoDownloader(self._video_downloader) # don't block the rest of the channels
+        self._channel_name = channel_name # if `None` it will use the one on the config
+        self._limits = limits
+        self._logger = logging.getLogger(channel_name)
+        self._incremental_capture = IncrementalCapture()
+        self._segmented_capture = None # it depends on the config; set on `run`
+        self._pipeline = pipeline # if `None` it will run its own
+        self._own_pipeline = None
+        self._storage = storage # if `None` it will run its own
+        self._own_storage = None
         self._start = False
 
-        self._tmp_dir = tempfile.TemporaryDirectory()
-        Path(self._tmp_dir.name).mkdir(parents=True, exist_ok=True)
-
-        self._videos_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'videos')
-        Path(self._videos_folder).mkdir(parents=True, exist_ok=True)
+        self._capture_folder = None # it depends on the config; set on `run`
+        self._journal = None
+        self._poller = None
+        self._next_interval = None # seconds until the next tick
+        self._last_check = None # when the video being captured was checked
+        self._last_growth = None # when the video being captured grew
+        self._wake = None # set to check right away (eg. the stream has just started)
+        self._online_since = None # when we got notified that the stream has started
+        self._offline = False # if we got notified that the stream has ended
+        self._live_capture = None # recording of the stream while it airs (if `live_capture`)
+        self._metrics = Metrics.default()
 
     @staticmethod
     def move_if_exists(from_path: str, to_path: str):
@@ -40,7 +79,166 @@ class TwitchDownloader:
         except FileNotFoundError:
             pass
 
-    def _download(self, id: str, tmp: bool = False):
+    @property
+    def channel_name(self) -> str:
+        return self._config.channel_name if self._channel_name is None else self._channel_name
+
+    def _workspace(self, id: str) -> str:
+        """
+        Folder where the temporal captures of a video are stored; it's kept between restarts
+        """
+        return os.path.join(self._capture_folder, id)
+
+    def _save_state(self):
+        self._journal.save({
+            'state': self._state.name,
+            'current_video': self._current_video,
+            'current_video_published': None if self._current_video_published is None else self._current_video_published.isoformat(),
+            'current_video_duration': None if self._current_video_duration is None else self._current_video_duration.total_seconds(),
+            'last_time': self._last_time.isoformat(),
+            'last_id': self._last_id,
+            'schedule': [published.isoformat() for published in self._poller.history],
+        })
+
+    def _load_state(self) -> bool:
+        """
+        Restores the state saved by a previous run.
+        :return:    If there was a saved state
+        """
+        state = self._journal.load()
+        if state is None:
+            return False
+
+        self._state = TwitchDownloader.TwitchDownloaderState[state['state']]
+        self._current_video = state['current_video']
+        self._current_video_published = None if state['current_video_published'] is None else datetime.fromisoformat(state['current_video_published'])
+        self._current_video_duration = None if state['current_video_duration'] is None else timedelta(seconds=state['current_video_duration'])
+        self._last_time = datetime.fromisoformat(state['last_time'])
+        self._last_id = state['last_id']
+        self._last_id_info = None
+        for published in state.get('schedule', []):
+            self._poller.record_start(datetime.fromisoformat(published))
+        return True
+
+    def _waiting_interval(self) -> float:
+        if self._online_since is not None and time.time() - self._online_since < TwitchDownloader.ONLINE_TIMEOUT:
+            return TwitchDownloader.ONLINE_RETRY_INTERVAL # it has started, but the video is not there yet
+        self._online_since = None
+
+        interval = self._poller.waiting_interval()
+        if self._config.eventsub['enabled']:
+            interval = max(interval, self._config.eventsub['fallback_interval']) # we'll get notified; this is just in case some notification is lost
+        return interval
+
+    def stream_online(self):
+        """
+        The stream has started (notified by EventSub); look for the new video right away
+        """
+        self._logger.info("The stream has started")
+        self._online_since = time.time()
+        self._start_live_capture()
+        if isinstance(self._video_downloader, CachedVideoDownloader):
+            self._video_downloader.invalidate_channel(self.channel_name)
+        if self._wake is not None:
+            self._wake.set()
+
+    def stream_offline(self):
+        """
+        The stream has ended (notified by EventSub); finish the capture right away
+        """
+        self._logger.info("The stream has ended")
+        self._offline = True
+        self._online_since = None
+        if isinstance(self._video_downloader, CachedVideoDownloader) and self._current_video is not None:
+            self._video_downloader.invalidate(self._current_video)
+        if self._wake is not None:
+            self._wake.set()
+
+    def _phase(self, phase: str):
+        """
+        Measures a part of a tick
+        """
+        return self._metrics.time('tick_phase_seconds', channel=self.channel_name, phase=phase)
+
+    def _record_download(self, transferred: int, elapsed: float):
+        self._metrics.inc('capture_bytes_total', transferred, channel=self.channel_name)
+        if elapsed > 0:
+            self._metrics.set('capture_throughput_bytes_per_second', transferred / elapsed, channel=self.channel_name)
+
+    def _live_folder(self) -> str:
+        return os.path.join(self._capture_folder, 'live')
+
+    def _start_live_capture(self):
+        if not self._config.live_capture or (self._live_capture is not None and self._live_capture.started):
+            return
+        self._live_capture = LiveCapture(self.channel_name, self._config.download_quality, self._live_folder())
+        asyncio.ensure_future(self._live_capture.run())
+
+    async def _finish_live_capture(self, id: str):
+        """
+        Waits for the live recording to end, and moves it with the rest of the captures of the video
+        """
+        if self._live_capture is not None:
+            deadline = time.time() + 2*LiveCapture.OFFLINE_TIMEOUT
+            while self._live_capture.started:
+                if time.time() > deadline:
+                    self._live_capture.stop() # the video says it has ended, but the stream doesn't
+                await asyncio.sleep(1) # the stream has ended; it will realize soon
+            self._live_capture = None
+        if os.path.isdir(self._live_folder()):
+            Path(self._workspace(id)).mkdir(parents=True, exist_ok=True)
+            shutil.move(self._live_folder(), os.path.join(self._workspace(id), 'live'))
+
+    def _clean_capture_folder(self):
+        """
+        Removes the captures of the videos that are not being captured (the ones left by videos that were removed, for example)
+        """
+        for name in os.listdir(self._capture_folder):
+            if name != self._current_video and not (name == 'live' and self._current_video is not None):
+                self._logger.debug(f"Removing old capture '{name}'")
+                shutil.rmtree(os.path.join(self._capture_folder, name), ignore_errors=True)
+
+    async def _download_incremental(self, id: str, length: timedelta):
+        """
+        Same as `_download`, but only the segments that weren't got on previous calls are downloaded.
+        As all the segments are kept there's no need to rotate the temporal videos.
+        """
+        part_path = os.path.join(self._workspace(id), id + ".ts")
+        previous_size = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        size = previous_size + StorageManager.estimate_size(self._config.download_quality, (length - self._current_video_duration).total_seconds())
+        async with self._limits.downloads, self._storage.reserve(self._workspace(id), size, part_path):
+            with self._metrics.time('capture_download_seconds', channel=self.channel_name) as timer:
+                captured = await self._incremental_capture.capture(id, self._config.download_quality, part_path)
+        self._record_download(os.path.getsize(part_path) - previous_size, timer.elapsed)
+        self._logger.debug(f"Captured {timedelta(seconds=int(captured))} of the video.")
+
+    async def _download_segmented(self, id: str, length: timedelta):
+        """
+        Same as `_download_incremental`, but into chunks (that can be played while streaming)
+        """
+        folder = os.path.join(self._workspace(id), 'segments')
+        previous_size = SegmentedCapture.size(folder)
+        size = StorageManager.estimate_size(self._config.download_quality, (length - self._current_video_duration).total_seconds())
+        async with self._limits.downloads, self._storage.reserve(self._workspace(id), size):
+            with self._metrics.time('capture_download_seconds', channel=self.channel_name) as timer:
+                captured = await self._segmented_capture.capture(id, self._config.download_quality, folder)
+        self._record_download(SegmentedCapture.size(folder) - previous_size, timer.elapsed)
+        self._logger.debug(f"Captured {timedelta(seconds=int(captured))} of the video.")
+
+    async def _download(self, id: str, length: timedelta):
+        """
+        Captures the current state of a video that is still being streamed.
+        The complete video will be got by the post-processing pipeline once it ends.
+        :param length:  Current length of the video
+        """
+        Path(self._workspace(id)).mkdir(parents=True, exist_ok=True)
+        if self._config.segmented_capture['enabled']:
+            await self._download_segmented(id, length)
+            return
+        if self._config.incremental_capture:
+            await self._download_incremental(id, length)
+            return
+
         # If we're capturing a temporal video, we must store the last 3 videos. Explanation:
         # Let's assume we're capturing a video and we store it as "A.mp4"
         # Then, we'll trigger another download 1 second before the video ends, this is "B.mp4"
@@ -51,100 +249,120 @@ class TwitchDownloader:
         # In the next tick the program will realize that C.mp4 is the complete stream, and will
         # merge it (if enabled) with the uncompleted one. In this case, we want to pick "A.mp4".
 
-        target_path = os.path.join(self._videos_folder, id + ".mkv") # TODO mp4
-        tmp_target_path_gen = lambda n : os.path.join(self._tmp_dir.name, id + "." + str(n) + ".mkv") # mkv extension requires less operations
-        if tmp:
-            # move "B" and "C" (if they exist)
-            TwitchDownloader.move_if_exists(tmp_target_path_gen(2), tmp_target_path_gen(1))
-            TwitchDownloader.move_if_exists(tmp_target_path_gen(3), tmp_target_path_gen(2))
-            # we're writting on "C"
-            target_path = tmp_target_path_gen(3)
-        else:
-            # if we got "C", then we can export it directly
-            if os.path.isfile(tmp_target_path_gen(3)):
-                logging.debug("Re-using latest tmp video.")
-                VideoDownloader.move_and_reformat(tmp_target_path_gen(3), target_path)
-                return # we got it
-            # we weren't downloading tmp files; download the final video
-
-        logging.debug(f"Downloading into {target_path}...")
-        self._video_downloader.download(id, self._config.download_quality, target_path)
-
-
-    def _merge(self, id: str):
-        target_path = os.path.join(self._videos_folder, id + ".mkv") # TODO mp4
-        tmp_target_path_gen = lambda n : os.path.join(self._tmp_dir.name, id + "." + str(n) + ".mkv")
-        to_merge = tmp_target_path_gen(1)
-
-        if not os.path.isfile(to_merge):
-            logging.debug("Nothing to merge.")
-            return
-
-        # make sure `target_path` exists
-        if not os.path.isfile(target_path):
-            logging.debug(f"Couldn't merge as {target_path} doesn't exist.")
-            # at least keep the temporal
-            VideoDownloader.move_and_reformat(to_merge, os.path.join(self._videos_folder, "start_" + id + ".mkv"))
-            return
-
-        # merge the temporal with the final file
-        logging.debug(f"Merging '{to_merge}' with '{target_path}'...")
-        # TODO merge instead of this
-        VideoDownloader.move_and_reformat(to_merge, os.path.join(self._videos_folder, "start_" + id + ".mkv"))
-
-    def __tick(self):
+        tmp_target_path_gen = lambda n : os.path.join(self._workspace(id), id + "." + str(n) + ".mkv") # mkv extension requires less operations
+        # move "B" and "C" (if they exist)
+        TwitchDownloader.move_if_exists(tmp_target_path_gen(2), tmp_target_path_gen(1))
+        TwitchDownloader.move_if_exists(tmp_target_path_gen(3), tmp_target_path_gen(2))
+        # we're writting on "C"
+        target_path = tmp_target_path_gen(3)
+
+        async with self._limits.downloads, self._storage.reserve(self._workspace(id), StorageManager.estimate_size(self._config.download_quality, length.total_seconds())):
+            self._logger.debug(f"Downloading into {target_path}...")
+            with self._metrics.time('capture_download_seconds', channel=self.channel_name) as timer:
+                await self._video_downloader.download(id, self._config.download_quality, target_path)
+        if os.path.isfile(target_path):
+            self._record_download(os.path.getsize(target_path), timer.elapsed)
+
+    async def _find_last_video(self):
+        """
+        Gets the latest video of the channel, so only the ones published after it are captured.
+        We'll use time instead of ID comparison just in case a video gets deleted;
+        if the "latest video" is before `_last_time`, then there's no new video.
+        """
+        last_id = await self._video_downloader.get_last_video(self.channel_name)
+        self._last_id = last_id
+        self._last_id_info = None
+        if last_id is not None:
+            self._last_id_info = await self._video_downloader.get_info(last_id)
+            self._last_time = self._last_id_info['published']
+            self._poller.record_start(self._last_time)
+        self._save_state()
+
+    async def __tick(self):
+        self._next_interval = self._config.check_interval
         if self._state == TwitchDownloader.TwitchDownloaderState.WAITING_FOR_VIDEO:
             # is the next video already there?
-            last_id = self._video_downloader.get_last_video(self._config.channel_name)
-            self._last_id_info = None if last_id is None else self._video_downloader.get_info(last_id)
+            with self._phase('check'):
+                last_id = await self._video_downloader.get_last_video(self.channel_name)
+                if last_id is None:
+                    self._last_id_info = None
+                elif last_id != self._last_id or self._last_id_info is None:
+                    self._last_id_info = await self._video_downloader.get_info(last_id)
+            # else the video didn't change; its publish time won't change either
+            self._last_id = last_id
             if last_id is not None:
                 if self._last_time < self._last_id_info['published']:
                     # new video found
-                    logging.info("Found a new video! Starting to capture...")
+                    self._logger.info("Found a new video! Starting to capture...")
+                    self._online_since = None
                     self._current_video = last_id
+                    self._current_video_published = self._last_id_info['published']
                     self._current_video_duration = timedelta(0) # simulate that we've captured this video when it was 0 seconds long
                     self._state = TwitchDownloader.TwitchDownloaderState.CAPTURING
+                    self._start_live_capture() # if it's not already running
+                    self._poller.record_start(self._current_video_published)
+                    self._last_check = self._last_growth = time.time()
+                    self._save_state()
 
                     # as now we've changed the stage, capture what we've already got
-                    self.__tick()
+                    await self.__tick()
                 else:
-                    logging.debug("No new video got.")
+                    self._logger.debug("No new video got.")
+                    self._next_interval = self._waiting_interval()
+            else:
+                self._next_interval = self._waiting_interval()
         elif self._state == TwitchDownloader.TwitchDownloaderState.CAPTURING:
-            current_video_info = self._video_downloader.get_info(self._current_video)
+            with self._phase('check'):
+                current_video_info = await self._video_downloader.get_info(self._current_video)
+            now = time.time()
+            elapsed = now - self._last_check
+            self._last_check = now
             if 'length' in current_video_info and self._current_video_duration < current_video_info['length']:
                 # got new data
-                logging.debug(f"The stream is still going.")
+                self._logger.debug("The stream is still going.")
+                self._last_growth = now
+                self._next_interval = self._poller.capturing_interval((current_video_info['length'] - self._current_video_duration).total_seconds(), elapsed)
                 
                 if self._config.download_while_stream:
-                    self._download(self._current_video, tmp=True)
-                    logging.debug(f"Overriden latest video for the new one.")
+                    with self._phase('download'):
+                        await self._download(self._current_video, current_video_info['length'])
+                    self._logger.debug("Overriden latest video for the new one.")
+
+                if self._config.chat_while_stream:
+                    try:
+                        Path(self._workspace(self._current_video)).mkdir(parents=True, exist_ok=True)
+                        with self._phase('chat'):
+                            await self._video_downloader.sync_chat(self._current_video, self._workspace(self._current_video))
+                    except Exception as ex:
+                        # not critical; the pipeline will get it at the end
+                        self._logger.warning(ex, exc_info=True)
                     
                 self._current_video_duration = current_video_info['length'] # update the current downloaded length
+                self._save_state()
+            elif now - self._last_growth < self._poller.stall_timeout and current_video_info.get('length') is not None and not self._offline:
+                # Twitch doesn't update the length right away; wait a bit more before considering it ended
+                self._logger.debug(f"The video didn't grow since {timedelta(seconds=int(now - self._last_growth))} ago.")
+                self._next_interval = self._poller.capturing_interval(None, elapsed)
             else:
                 # the video has ended/has been removed
-                logging.info("The video has ended.")
-
-                try:
-                    self._download(self._current_video)
-                    self._video_downloader.get_chat(self._current_video, self._config.chat_format, os.path.join(self._videos_folder, self._current_video + "." + self._config.chat_format))
-                except Exception as ex:
-                    # just in case the video was removed; we want to keep the tmp file
-                    logging.critical(ex, exc_info=True)
-
-                if self._config.download_while_stream:
-                    # we have old videos pending to merge
-                    self._merge(self._current_video)
+                self._logger.info("The video has ended.")
+                # if we were notified we didn't wait for Twitch to update the video; the last temporal may not have the end
+                complete = not (self._offline and now - self._last_growth < self._poller.stall_timeout)
 
-                # we're done with that video
-                shutil.rmtree(self._tmp_dir.name, ignore_errors=True) # clear
-                Path(self._tmp_dir.name).mkdir(parents=True, exist_ok=True)
+                # the rest (final download, merge, chat...) is done by the pipeline, so we can look for the next video right away
+                with self._phase('submit'):
+                    await self._finish_live_capture(self._current_video)
+                    await self._pipeline.submit(self.channel_name, self._current_video, self._current_video_published, self._workspace(self._current_video), complete)
 
+                self._last_time = self._current_video_published # update the "last download video" time
                 self._current_video = None
+                self._current_video_published = None
                 self._current_video_duration = None
-                self._last_time = self._last_id_info['published'] # update the "last download video" time
+                self._offline = False
                 self._state = TwitchDownloader.TwitchDownloaderState.WAITING_FOR_VIDEO
+                self._save_state()
         else:
-            logging.warning(f"Got a tick while having unknown stage: {self._state}")
+            self._logger.warning(f"Got a tick while having unknown stage: {self._state}")
 
     async def run(self):
         if self.started:
@@ -154,41 +372,74 @@ class TwitchDownloader:
         self._state = TwitchDownloader.TwitchDownloaderState.WAITING_FOR_VIDEO
         if not self._config.loaded:
             self._config.read()
-
-        # check latest video
-        # We'll use time instead of ID comparison just in case a video gets deleted;
-        # if the "latest video" is before `_last_time`, then there's no new video.
-        try:
-            last_id = self._video_downloader.get_last_video(self._config.channel_name)
+        self._capture_folder = os.path.join(self._config.work_folder, 'capture', self.channel_name)
+        Path(self._capture_folder).mkdir(parents=True, exist_ok=True)
+        Path(os.path.join(self._config.work_folder, 'channels')).mkdir(parents=True, exist_ok=True)
+        self._journal = StateJournal(os.path.join(self._config.work_folder, 'channels', self.channel_name + '.json'))
+        self._poller = AdaptivePoller(self._config.check_interval, **self._config.adaptive_polling,
+                        incremental_capture=not self._config.download_while_stream or self._config.incremental_capture or self._config.segmented_capture['enabled'])
+        self._segmented_capture = SegmentedCapture(chunk_duration=self._config.segmented_capture['chunk_duration'])
+        self._wake = asyncio.Event()
+        self._next_interval = self._config.check_interval
+        if self._limits is None:
+            self._limits = ResourceLimits(self._config.max_concurrent_downloads, self._config.max_concurrent_ffmpeg)
+        if self._storage is None:
+            self._storage = StorageManager(self._config)
+            self._storage.setup()
+            self._own_storage = asyncio.ensure_future(self._storage.run())
+        if self._pipeline is None:
+            self._pipeline = PostProcessingPipeline(self._config, self._video_downloader_factory, self._limits, self._storage)
+            self._own_pipeline = asyncio.ensure_future(self._pipeline.run())
+
+        found_last_video = self._load_state()
+        if found_last_video:
+            # keep going from where we left it; if a video started while we were stopped it will be found on the first tick
+            self._logger.info(f"Resuming from state {self._state.name}" + ("" if self._current_video is None else f" (video {self._current_video})"))
+        else:
             self._last_time = datetime.min
             self._current_video = None
+            self._current_video_published = None
             self._current_video_duration = None
-            if last_id is not None:
-                self._last_time = self._video_downloader.get_info(last_id)['published']
-        except Exception as ex:
-            # even if there's no video we shouldn't expect an expection; crashing means something really bad happened
-            logging.critical(ex, exc_info=True)
-            self.stop()
+        self._clean_capture_folder()
+        self._last_check = self._last_growth = time.time()
+        if self._state == TwitchDownloader.TwitchDownloaderState.CAPTURING:
+            self._start_live_capture() # it will continue the previous recording
 
         # check&download loop
         while self.started:
             start_time = time.time()
             try:
-                self.__tick()
+                if not found_last_video:
+                    # (if it fails, it will be tried again on the next check)
+                    await self._find_last_video()
+                    found_last_video = True
+                await self.__tick()
             except Exception as ex:
-                logging.error(ex, exc_info=True)
+                self._logger.error(ex, exc_info=True)
+                self._metrics.inc('tick_errors_total', channel=self.channel_name)
             end_time = time.time()
+            self._metrics.observe('tick_duration_seconds', end_time - start_time, channel=self.channel_name)
+            self._metrics.set('channel_capturing', 1 if self._state == TwitchDownloader.TwitchDownloaderState.CAPTURING else 0, channel=self.channel_name)
+            if end_time - start_time > self._next_interval:
+                # the next check will be late (and with `download_while_stream`, more audio may be lost)
+                self._logger.warning(f"The check took {end_time - start_time:.1f}s, more than the interval ({self._next_interval:.1f}s)")
+                self._metrics.inc('tick_overruns_total', channel=self.channel_name)
 
             # wait for the next petition
             try:
-                sleep_for = self._config.check_interval - (end_time - start_time)
-                if sleep_for > 0:
-                    logging.debug(f"Sleeping for {sleep_for:.1f} seconds")
-                    await asyncio.sleep(sleep_for)
+                sleep_for = self._next_interval - (end_time - start_time)
+                if sleep_for > 0 and not self._wake.is_set():
+                    self._logger.debug(f"Sleeping for {sleep_for:.1f} seconds")
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), sleep_for)
+                    except asyncio.TimeoutError:
+                        pass
+                self._wake.clear()
             except Exception as ex:
-                # as this is high severity (if we don't run the sleep in a loop it will cause a lot of petitions), we'll stop the program
-                logging.critical(ex, exc_info=True)
-                self.stop()
+                # we can't skip the sleep (it would cause a lot of petitions); wait the whole interval
+                self._logger.critical(ex, exc_info=True)
+                self._wake.clear()
+                await asyncio.sleep(self._config.check_interval)
 
     @property
     def started(self) -> bool:
@@ -196,25 +447,55 @@ class TwitchDownloader:
 
     def stop(self):
         self._start = False
-        self._tmp_dir.cleanup()
+        if self._wake is not None:
+            self._wake.set() # don't wait for the next check
+        if self._live_capture is not None:
+            self._live_capture.stop()
+        if self._own_pipeline is not None:
+            self._pipeline.stop()
+        if self._own_storage is not None:
+            self._storage.stop()
+        # the captures are kept; they'll be resumed on the next run
 
 
 async def main():
     global downloader
     config = JsonConfig(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"))
+    config.read()
+    logging.getLogger().setLevel(logging.getLevelName(config.log_level)) # 'TRACE' for the whole output of the commands
+    Trace.sample_every = config.metrics['trace_sample_every']
 
     # TODO forward logger msg to Discord
     # logger = logging.getLogger('shrubbery')
     # create a class inheriting `logging.Filter`
     # logger.addFilter(f)
 
-    video_downloader_factory = TwitchVideoAndChatDownloaderFactory()
-    downloader = TwitchDownloader(config, video_downloader_factory)
+    limits = ResourceLimits(config.max_concurrent_downloads, config.max_concurrent_ffmpeg)
+    storage = StorageManager(config)
+    storage.setup()
+    video_downloader_factory = AsyncTwitchVideoAndChatDownloaderFactory()
+    if config.use_twitch_api:
+        if config.native_download:
+            video_downloader_factory = HlsVideoAndChatDownloaderFactory(connections=config.download_connections, job_rate=config.job_bandwidth_limit,
+                                                                        global_rate=config.global_bandwidth_limit, native_chat=config.native_chat,
+                                                                        chat_store=config.chat_store, limits=limits, storage=storage)
+        else:
+            video_downloader_factory = AsyncTwitchVideoAndChatDownloaderFactory(native_chat=config.native_chat, chat_store=config.chat_store)
+        video_downloader_factory = TwitchApiDownloaderFactory(downloader_factory=video_downloader_factory, batch_window=1.0)
+    video_downloader_factory = CachedDownloaderFactory(video_downloader_factory, **config.metadata_cache)
+    pipeline = PostProcessingPipeline(config, video_downloader_factory, limits, storage)
+    downloader = ChannelScheduler([TwitchDownloader(config, video_downloader_factory, channel, limits, pipeline, storage) for channel in config.channel_names],
+                                  config.check_interval, pipeline, config.poll_batch_size)
+    downloader.services.append(storage) # retention and archive
+    if config.eventsub['enabled']:
+        downloader.services.append(EventSubListener(config.eventsub['secret'], downloader.on_stream_event,
+                                                    config.eventsub['host'], config.eventsub['port'], config.eventsub['path']))
+    if config.metrics['enabled']:
+        downloader.services.append(MetricsServer(Metrics.default(), config.metrics['host'], config.metrics['port']))
 
     await downloader.run()
 
 def signal_handler(sig, frame):
-    global downloader
     print('Got SIGINT; cleaning...')
     downloader.stop()
     sys.exit(0) # TODO abort sleep instead of exiting
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+from typing import Any,Dict,List,Optional
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_FOLDER) # so it can also be run as a script
+
+from benchmarks.FakeTwitchServer import FakeTwitchServer,FakeVideo
+from benchmarks.RecordingVideoDownloader import RecordingDownloaderFactory
+from config.ConfigManager import JsonConfig
+from scheduler.ChannelScheduler import ChannelScheduler
+from scheduler.ResourceLimits import ResourceLimits
+from pipeline.PostProcessingPipeline import PostProcessingPipeline
+from storage.StorageManager import StorageManager
+from twitch_downloader.AsyncVideoDownloader import AsyncVideoDownloader
+from twitch_downloader.FFmpeg import FFmpeg
+from twitch_downloader.api.TwitchApiClient import TwitchApiClient
+from twitch_downloader.factory.TwitchApiDownloaderFactory import TwitchApiDownloaderFactory
+from twitch_downloader.factory.HlsVideoAndChatDownloaderFactory import HlsVideoAndChatDownloaderFactory
+from TwitchDownloader import TwitchDownloader
+
+class Benchmarks:
+    """
+    Runs the downloader against a local `FakeTwitchServer`, so the performance can be compared between changes
+    without depending on Twitch (nor on the network).
+    Each scenario runs on its own process, so its peak memory doesn't depend on the other ones.
+    """
+    SCENARIOS = ['poll', 'download', 'capture', 'merge', 'reformat']
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, args: argparse.Namespace, folder: str):
+        """
+        :param folder str:  Where to store the files of the scenario; it's removed afterwards
+        """
+        self._args = args
+        self._folder = folder
+        self._ffmpeg = shutil.which('ffmpeg') is not None and shutil.which('ffprobe') is not None
+
+    @staticmethod
+    def percentile(samples: List[float], percentile: float) -> float:
+        """
+        Nearest-rank percentile of some sorted samples
+        """
+        rank = max(int(round(percentile / 100 * len(samples) + 0.5)) - 1, 0)
+        return samples[min(rank, len(samples) - 1)]
+
+    @staticmethod
+    def summarize(samples: List[float], errors: int, elapsed: float) -> Dict[str,Any]:
+        """
+        :param samples:     Latencies (seconds) of an operation
+        :param elapsed:     Duration of the whole scenario
+        :return:            Count, throughput (operations per second) and latency percentiles
+        """
+        samples = sorted(samples)
+        r = {'count': len(samples), 'errors': errors, 'throughput': len(samples) / elapsed if elapsed > 0 else 0.0}
+        if len(samples) > 0:
+            r['mean'] = sum(samples) / len(samples)
+            for percentile in Benchmarks.PERCENTILES:
+                r[f'p{percentile}'] = Benchmarks.percentile(samples, percentile)
+            r['max'] = samples[-1]
+        return r
+
+    async def _generate_video(self, path: str, seconds: float):
+        # a real video (H.264 + AAC on MPEG-TS, as Twitch), so ffmpeg can work with it
+        await AsyncVideoDownloader.run_command('ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f'testsrc=duration={seconds}:size=640x360:rate=30',
+                                               '-f', 'lavfi', '-i', f'sine=duration={seconds}', '-c:v', 'libx264', '-preset', 'ultrafast',
+                                               '-g', '60', '-c:a', 'aac', '-f', 'mpegts', path, check=True)
+
+    async def _template(self) -> bytes:
+        """
+        Content served as the videos; without ffmpeg it's just random MPEG-TS-sized packets
+        """
+        if self._ffmpeg:
+            path = os.path.join(self._folder, 'template.ts')
+            await self._generate_video(path, self._args.video_length)
+            with open(path, 'rb') as f:
+                return f.read()
+        generator = random.Random(self._args.seed)
+        packets = int(self._args.video_length * 50) # ~75kbps
+        return b''.join(b'\x47' + generator.getrandbits(187*8).to_bytes(187, 'little') for _ in range(packets))
+
+    async def _server(self) -> FakeTwitchServer:
+        server = FakeTwitchServer(await self._template(), latency=self._args.latency, jitter=self._args.jitter,
+                                  failure_rate=self._args.failure_rate, seed=self._args.seed)
+        server.start()
+        return server
+
+    @staticmethod
+    def _client(server: FakeTwitchServer) -> TwitchApiClient:
+        client = TwitchApiClient(gql_url=server.url + '/gql', usher_url=server.url)
+        TwitchApiClient.set_default(client) # for the ones that don't get a client (eg. the incremental captures)
+        return client
+
+    def _factory(self, client: TwitchApiClient) -> RecordingDownloaderFactory:
+        # same chain as `main` (without the cache, or we'd be measuring it)
+        return RecordingDownloaderFactory(TwitchApiDownloaderFactory(client, HlsVideoAndChatDownloaderFactory(client=client),
+                                                                     batch_window=self._args.batch_window))
+
+    @staticmethod
+    def _operations(factory: RecordingDownloaderFactory, elapsed: float) -> Dict[str,Any]:
+        return {operation: Benchmarks.summarize(samples, factory.errors.get(operation, 0), elapsed) for operation,samples in factory.samples.items()}
+
+    async def poll(self) -> Dict[str,Any]:
+        """
+        Checks the last video (and its information) of `channels` channels at the same time, `rounds` times
+        """
+        server = await self._server()
+        try:
+            channels = [f"channel{n}" for n in range(self._args.channels)]
+            for n,channel in enumerate(channels):
+                server.add_video(FakeVideo(str(1000 + n), channel, self._args.video_length, live=False))
+            factory = self._factory(Benchmarks._client(server))
+            downloaders = [factory.build() for _ in channels]
+
+            async def check(downloader, channel: str):
+                try:
+                    last_id = await downloader.get_last_video(channel)
+                    if last_id is not None:
+                        await downloader.get_info(last_id)
+                except Exception as ex:
+                    logging.debug(ex) # counted by the recorder
+
+            rounds = []
+            start = time.perf_counter()
+            for _ in range(self._args.rounds):
+                round_start = time.perf_counter()
+                await asyncio.gather(*[check(downloader, channel) for downloader,channel in zip(downloaders, channels)])
+                rounds.append(time.perf_counter() - round_start)
+            elapsed = time.perf_counter() - start
+
+            operations = Benchmarks._operations(factory, elapsed)
+            operations['round'] = Benchmarks.summarize(rounds, 0, elapsed)
+            return {'elapsed': elapsed, 'operations': operations, 'server_requests': server.requests, 'server_failures': server.failures}
+        finally:
+            server.stop()
+
+    async def download(self) -> Dict[str,Any]:
+        """
+        Downloads a finished video (natively), `rounds` times
+        """
+        server = await self._server()
+        try:
+            server.add_video(FakeVideo('1000', 'channel0', self._args.video_length, live=False))
+            factory = self._factory(Benchmarks._client(server))
+            downloader = factory.build()
+
+            out_path = os.path.join(self._folder, '1000.ts')
+            downloaded = 0
+            start = time.perf_counter()
+            for _ in range(self._args.rounds):
+                try:
+                    await downloader.download('1000', self._args.quality, out_path)
+                    downloaded += os.path.getsize(out_path)
+                except Exception as ex:
+                    logging.debug(ex)
+                if os.path.isfile(out_path):
+                    os.remove(out_path)
+            elapsed = time.perf_counter() - start
+
+            return {'elapsed': elapsed, 'operations': Benchmarks._operations(factory, elapsed), 'bytes_per_second': downloaded / elapsed,
+                    'server_requests': server.requests, 'server_failures': server.failures}
+        finally:
+            server.stop()
+
+    def _capture_config(self) -> JsonConfig:
+        config_path = os.path.join(self._folder, 'config.json')
+        data = JsonConfig._get_defaults()
+        data.update({
+            'channel_names': [f"channel{n}" for n in range(self._args.channels)],
+            'check_interval': 1.0, # the fake videos grow faster
+            'adaptive_polling': {'enabled': True, 'min_interval': 0.5, 'max_interval': 2.0, 'capture_min_interval': 0.5},
+            'incremental_capture': True,
+            'output_format': 'ts', # no ffmpeg needed
+            'chat_format': 'json',
+            'download_quality': self._args.quality,
+            'work_folder': os.path.join(self._folder, 'work'),
+            'videos_folder': os.path.join(self._folder, 'videos'),
+            'max_concurrent_downloads': self._args.channels,
+        })
+        with open(config_path, 'w') as f:
+            json.dump(data, f)
+        config = JsonConfig(config_path)
+        config.read()
+        return config
+
+    async def capture(self) -> Dict[str,Any]:
+        """
+        Follows `channels` channels through a whole stream (the videos grow `speed` times faster than real time): the new video
+        is found, captured (segments and chat) while it grows on the `CAPTURING` state, and post-processed once it ends.
+        The publish delay is the time between the end of the video and its file being on the videos folder.
+        """
+        server = await self._server()
+        scheduler = None
+        try:
+            config = self._capture_config()
+            channels = config.channel_names
+            for n,channel in enumerate(channels):
+                server.add_video(FakeVideo(str(1000 + n), channel, self._args.video_length, live=False)) # already downloaded
+            factory = self._factory(Benchmarks._client(server))
+            videos_folder = config.videos_folder
+            limits = ResourceLimits(config.max_concurrent_downloads, config.max_concurrent_ffmpeg)
+            storage = StorageManager(config)
+            storage.setup()
+            pipeline = PostProcessingPipeline(config, factory, limits, storage)
+            scheduler = ChannelScheduler([TwitchDownloader(config, factory, channel, limits, pipeline, storage) for channel in channels],
+                                         config.check_interval, pipeline, config.poll_batch_size)
+            scheduler.services.append(storage)
+            task = asyncio.ensure_future(scheduler.run())
+
+            await asyncio.sleep(config.check_interval + 1) # all the channels have started
+            start = time.perf_counter()
+            videos = [FakeVideo(str(2000 + n), channel, self._args.video_length, speed=self._args.speed) for n,channel in enumerate(channels)]
+            for video in videos:
+                server.add_video(video)
+
+            # the videos end at the same time; they'll be published after that
+            ended = start + self._args.video_length / self._args.speed
+            delays = {}
+            deadline = ended + self._args.timeout
+            while len(delays) < len(videos) and time.perf_counter() < deadline and not task.done():
+                for video in videos:
+                    if video.id not in delays and os.path.isfile(os.path.join(videos_folder, video.id + '.ts')):
+                        delays[video.id] = time.perf_counter() - ended
+                await asyncio.sleep(0.1)
+            elapsed = time.perf_counter() - start
+
+            operations = Benchmarks._operations(factory, elapsed)
+            operations['publish_delay'] = Benchmarks.summarize(list(delays.values()), len(videos) - len(delays), elapsed)
+            published = sum(os.path.getsize(os.path.join(videos_folder, video.id + '.ts')) for video in videos if video.id in delays)
+            return {'elapsed': elapsed, 'operations': operations, 'published': len(delays), 'bytes_per_second': published / elapsed,
+                    'server_requests': server.requests, 'server_failures': server.failures}
+        finally:
+            if scheduler is not None:
+                scheduler.stop()
+                await asyncio.sleep(0) # let them realize
+            server.stop()
+
+    async def _ffmpeg_rounds(self, operation: str, run) -> Dict[str,Any]:
+        samples = []
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(self._args.rounds):
+            round_start = time.perf_counter()
+            try:
+                await run()
+            except Exception as ex:
+                logging.debug(ex)
+                errors += 1
+            samples.append(time.perf_counter() - round_start)
+        elapsed = time.perf_counter() - start
+        return {'elapsed': elapsed, 'operations': {operation: Benchmarks.summarize(samples, errors, elapsed)}}
+
+    async def merge(self) -> Dict[str,Any]:
+        """
+        Joins a partial capture with the complete video (`PostProcessingPipeline._remux` with `download_while_stream`)
+        """
+        if not self._ffmpeg:
+            return {'skipped': "ffmpeg is not installed"}
+        start_path = os.path.join(self._folder, 'start.ts')
+        full_path = os.path.join(self._folder, 'full.ts')
+        out_path = os.path.join(self._folder, 'merged.mkv')
+        await self._generate_video(start_path, self._args.video_length / 2)
+        await self._generate_video(full_path, self._args.video_length)
+        return await self._ffmpeg_rounds('merge', lambda: FFmpeg.merge(start_path, full_path, out_path))
+
+    async def reformat(self) -> Dict[str,Any]:
+        """
+        Moves a captured video into the output format (`AsyncVideoDownloader.move_and_reformat`)
+        """
+        if not self._ffmpeg:
+            return {'skipped': "ffmpeg is not installed"}
+        source_path = os.path.join(self._folder, 'source.ts')
+        await self._generate_video(source_path, self._args.video_length)
+
+        async def run():
+            from_path = os.path.join(self._folder, 'capture.ts')
+            shutil.copyfile(source_path, from_path) # it's moved
+            await AsyncVideoDownloader.move_and_reformat(from_path, os.path.join(self._folder, 'video.' + self._args.output_format))
+        return await self._ffmpeg_rounds('reformat', run)
+
+    async def run(self, scenario: str) -> Dict[str,Any]:
+        r = await getattr(self, scenario)()
+        # the fake server is included, but it's the same on every run; the ffmpeg commands are counted apart
+        r['peak_rss_kb'] = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        return r
+
+def run_scenario(scenario: str, argv: List[str]) -> Dict[str,Any]:
+    """
+    Runs a scenario on a new process
+    """
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', scenario] + argv, cwd=REPO_FOLDER,
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        return {'error': f"exit code {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def print_results(results: Dict[str,Dict[str,Any]], baseline: Optional[Dict[str,Dict[str,Any]]], tolerance: float) -> List[str]:
+    """
+    :return:    Regressions from `baseline` (more than `tolerance` worse)
+    """
+    regressions = []
+    def compare(name: str, value: float, base_value: Optional[float], higher_is_better: bool) -> str:
+        if base_value is None or base_value == 0:
+            return ''
+        change = (value - base_value) / base_value
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append(name)
+        return f" ({change:+.0%})"
+
+    for scenario,r in results.items():
+        base = (baseline or {}).get(scenario, {})
+        if 'skipped' in r or 'error' in r:
+            print(f"{scenario}: {r.get('skipped', r.get('error'))}")
+            continue
+        line = f"{scenario}: {r['elapsed']:.2f}s, peak RSS {r['peak_rss_kb'] / 1024:.1f}MB" + compare(f"{scenario} RSS", r['peak_rss_kb'], base.get('peak_rss_kb'), False)
+        if 'bytes_per_second' in r:
+            line += f", {r['bytes_per_second'] / 1024 / 1024:.2f}MB/s" + compare(f"{scenario} throughput", r['bytes_per_second'], base.get('bytes_per_second'), True)
+        if 'server_requests' in r:
+            line += f", {r['server_requests']} requests ({r['server_failures']} failed)"
+        print(line)
+        for operation,summary in sorted(r['operations'].items()):
+            base_summary = base.get('operations', {}).get(operation, {})
+            line = f"  {operation:<16} {summary['count']:>6} ops ({summary['errors']} errors), {summary['throughput']:.1f}/s"
+            if summary['count'] > 0:
+                line += ', ' + ', '.join(f"{name} {summary[name]*1000:.1f}ms" for name in [f'p{p}' for p in Benchmarks.PERCENTILES] + ['max'])
+                line += compare(f"{scenario} {operation} p50", summary['p50'], base_summary.get('p50'), False)
+            print(line)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the benchmarks against a local fake Twitch server")
+    parser.add_argument('scenarios', nargs='*', help="any of " + ', '.join(Benchmarks.SCENARIOS) + " (all of them by default)")
+    parser.add_argument('--channels', type=int, default=50, help="channels polled/captured at the same time")
+    parser.add_argument('--rounds', type=int, default=10, help="repetitions of each operation")
+    parser.add_argument('--video-length', type=float, default=120.0, help="length (seconds) of the videos")
+    parser.add_argument('--speed', type=float, default=20.0, help="how much faster than real time the captured videos grow")
+    parser.add_argument('--quality', default='480p')
+    parser.add_argument('--output-format', default='mkv', help="container of the 'reformat' scenario")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to each request")
+    parser.add_argument('--jitter', type=float, default=0.01, help="up to this random seconds added to each request")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="probability of a request failing")
+    parser.add_argument('--batch-window', type=float, default=0.05, help="seconds the queries are grouped")
+    parser.add_argument('--timeout', type=float, default=120.0, help="max seconds to wait for the captured videos to be published")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="save the results (JSON) here")
+    parser.add_argument('--baseline', help="compare with these results (saved with `--output`)")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative change considered a regression")
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    argv = sys.argv[1:]
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.ERROR)
+    unknown = [scenario for scenario in args.scenarios if scenario not in Benchmarks.SCENARIOS]
+    if len(unknown) > 0:
+        parser.error("unknown scenarios: " + ', '.join(unknown))
+
+    if args.child is not None:
+        with tempfile.TemporaryDirectory() as folder:
+            result = asyncio.get_event_loop().run_until_complete(Benchmarks(args, folder).run(args.child))
+        print(json.dumps(result))
+        return
+
+    # the options are passed to each scenario
+    options = [arg for arg in argv if arg not in Benchmarks.SCENARIOS]
+    results = {scenario: run_scenario(scenario, options) for scenario in (args.scenarios or Benchmarks.SCENARIOS)}
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    regressions = print_results(results, baseline, args.tolerance)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if len(regressions) > 0:
+        print("Regressions: " + ', '.join(regressions))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import re
+import json
+import time
+import random
+import threading
+from datetime import datetime,timedelta
+from http.server import ThreadingHTTPServer,BaseHTTPRequestHandler
+from typing import Any,Dict,Optional,Tuple
+
+class FakeVideo:
+    """
+    Synthetic stream/VOD. Its length grows (`speed` video seconds per real second) until `length` is reached.
+    """
+    def __init__(self, id: str, channel: str, length: float, speed: float = 1.0, chat_rate: float = 1.0, live: bool = True):
+        self.id = id
+        self.channel = channel
+        self.length = length                # final length, in seconds
+        self.speed = speed
+        self.chat_rate = chat_rate          # messages per second of video
+        self.started = time.monotonic()
+        self.published = datetime.utcnow().replace(microsecond=0)
+        if not live:
+            # already ended
+            self.started -= length / speed
+            self.published -= timedelta(seconds=length)
+
+    @property
+    def current_length(self) -> float:
+        return min((time.monotonic() - self.started) * self.speed, self.length)
+
+    @property
+    def live(self) -> bool:
+        return self.current_length < self.length
+
+class FakeTwitchServer:
+    """
+    Local stand-in for the Twitch endpoints used by the downloaders: GQL (video information, last video, access tokens and chat pages),
+    usher (VOD and live master playlists) and the HLS media playlists and segments.
+    Every request can be delayed (`latency` + up to `jitter` seconds) and fail (with a 503) with a `failure_rate` probability.
+    """
+    SEGMENT_DURATION = 2.0
+    LIVE_WINDOW = 6 # segments on the live playlists
+    QUALITIES = {'chunked': '1080p60 (source)', '480p30': '480p'}
+
+    def __init__(self, template: bytes, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                        failure_rate: float = 0.0, seed: int = 0):
+        """
+        :param template bytes:  Content of the videos (the whole `length` of each video); the segments are slices of it, so
+                                the downloaded videos are byte-to-byte the template (a valid MPEG-TS if it was one)
+        """
+        self._template = template
+        self._latency = latency
+        self._jitter = jitter
+        self._failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._channels = {} # login -> videos (newest last)
+        self._videos = {}   # ID -> video
+        self.requests = 0
+        self.failures = 0
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, as Twitch
+            def log_message(self, *args):
+                pass
+            def do_GET(self):
+                server._handle(self, None)
+            def do_POST(self):
+                server._handle(self, self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host,port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_channel(self, login: str):
+        with self._lock:
+            self._channels.setdefault(login, [])
+
+    def add_video(self, video: FakeVideo):
+        with self._lock:
+            self._channels.setdefault(video.channel, []).append(video)
+            self._videos[video.id] = video
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _chance(self, probability: float) -> bool:
+        with self._random_lock:
+            return self._random.random() < probability
+
+    def _delay(self) -> float:
+        with self._random_lock:
+            return self._latency + self._random.random() * self._jitter
+
+    @staticmethod
+    def _reply(handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str = 'application/json'):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, handler: BaseHTTPRequestHandler, body: Optional[bytes]):
+        with self._lock:
+            self.requests += 1
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+        if self._chance(self._failure_rate):
+            with self._lock:
+                self.failures += 1
+            FakeTwitchServer._reply(handler, 503, b'injected failure', 'text/plain')
+            return
+
+        path = handler.path.split('?')[0]
+        try:
+            if body is not None and path == '/gql':
+                status,content,content_type = 200, json.dumps(self._gql(json.loads(body))).encode(), 'application/json'
+            else:
+                status,content,content_type = self._hls(path)
+        except KeyError:
+            status,content,content_type = 404, b'not found', 'text/plain'
+        FakeTwitchServer._reply(handler, status, content, content_type)
+
+    # --- GQL ---
+
+    def _video_info(self, id: str) -> Optional[Dict[str,Any]]:
+        video = self._videos.get(id)
+        if video is None:
+            return None
+        return {'id': video.id, 'publishedAt': video.published.strftime('%Y-%m-%dT%H:%M:%SZ'), 'lengthSeconds': int(video.current_length)}
+
+    def _user(self, login: str) -> Optional[Dict[str,Any]]:
+        videos = self._channels.get(login)
+        if videos is None:
+            return None
+        return {'videos': {'edges': [] if len(videos) == 0 else [{'node': {'id': videos[-1].id}}]}}
+
+    def _comments(self, variables: Dict[str,Any]) -> Optional[Dict[str,Any]]:
+        video = self._videos.get(variables['videoID'])
+        if video is None:
+            return None
+        # one message every `1/chat_rate` seconds; the cursor is the index of the last message of the page
+        period = 1 / video.chat_rate
+        total = int(video.current_length / period)
+        first = int(variables['cursor']) + 1 if 'cursor' in variables else int(variables.get('contentOffsetSeconds', 0) / period)
+        last = min(first + 50, total)
+        edges = [{'cursor': str(n), 'node': {
+            'id': f"{video.id}-{n}",
+            'contentOffsetSeconds': n * period,
+            'createdAt': (video.published + timedelta(seconds=n * period)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'commenter': {'login': f"user{n % 97}", 'displayName': f"User{n % 97}"},
+            'message': {'userColor': '#1E90FF', 'fragments': [{'text': f"message {n} Kappa"}]},
+        }} for n in range(first, last)]
+        return {'comments': {'edges': edges, 'pageInfo': {'hasNextPage': last < total}}}
+
+    def _gql(self, payload: Dict[str,Any]) -> Dict[str,Any]:
+        if payload.get('operationName') == 'VideoCommentsByOffsetOrCursor':
+            return {'data': {'video': self._comments(payload['variables'])}}
+
+        query = payload['query']
+        variables = payload.get('variables') or {}
+        token = {'value': '{}', 'signature': 'fake'}
+        if 'videoPlaybackAccessToken' in query:
+            return {'data': {'videoPlaybackAccessToken': token}}
+        if 'streamPlaybackAccessToken' in query:
+            return {'data': {'streamPlaybackAccessToken': token}}
+        if 'id' in variables:
+            return {'data': {'video': self._video_info(variables['id'])}}
+        if 'login' in variables:
+            return {'data': {'user': self._user(variables['login'])}}
+
+        # aliased batch (`r0: video(id: "1") {...} r1: ...`)
+        data = {}
+        for alias,field,value in re.findall(r'(r\d+): (video|user)\((?:id|login): "([^"]*)"\)', query):
+            data[alias] = self._video_info(value) if field == 'video' else self._user(value)
+        return {'data': data}
+
+    # --- HLS ---
+
+    def _segment(self, video: FakeVideo, n: int) -> bytes:
+        # the template is split on 188-byte (MPEG-TS packets) boundaries
+        segments = max(int(video.length / FakeTwitchServer.SEGMENT_DURATION), 1)
+        packets = len(self._template) // 188
+        start = packets * n // segments * 188
+        end = len(self._template) if n == segments - 1 else packets * (n + 1) // segments * 188
+        return self._template[start:end]
+
+    def _master(self, prefix: str) -> bytes:
+        lines = ['#EXTM3U']
+        for group,name in FakeTwitchServer.QUALITIES.items():
+            lines.append(f'#EXT-X-MEDIA:TYPE=VIDEO,GROUP-ID="{group}",NAME="{name}",AUTOSELECT=YES,DEFAULT=YES')
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH=1000000,VIDEO="{group}"')
+            lines.append(f'{prefix}/{group}/index.m3u8')
+        return ('\n'.join(lines) + '\n').encode()
+
+    def _media(self, video: FakeVideo, prefix: str, live: bool) -> bytes:
+        available = int(video.current_length / FakeTwitchServer.SEGMENT_DURATION)
+        if not video.live:
+            available = max(int(video.length / FakeTwitchServer.SEGMENT_DURATION), 1)
+        first = max(available - FakeTwitchServer.LIVE_WINDOW, 0) if live else 0
+        lines = ['#EXTM3U', f'#EXT-X-TARGETDURATION:{int(FakeTwitchServer.SEGMENT_DURATION)}', f'#EXT-X-MEDIA-SEQUENCE:{first}']
+        for n in range(first, available):
+            if live:
+                date_time = video.published + timedelta(seconds=n * FakeTwitchServer.SEGMENT_DURATION)
+                lines.append('#EXT-X-PROGRAM-DATE-TIME:' + date_time.isoformat(timespec='milliseconds') + 'Z')
+            lines.append(f'#EXTINF:{FakeTwitchServer.SEGMENT_DURATION:.3f},{"live" if live else ""}')
+            lines.append(f'{prefix}/{n}.ts')
+        if not video.live:
+            lines.append('#EXT-X-ENDLIST')
+        return ('\n'.join(lines) + '\n').encode()
+
+    def _hls(self, path: str) -> Tuple[int,bytes,str]:
+        playlist = 'application/vnd.apple.mpegurl'
+        match = re.match(r'^/vod/(\w+)\.m3u8$', path)
+        if match:
+            self._videos[match.group(1)] # 404 if it doesn't exist
+            return 200, self._master(f"/hls/{match.group(1)}"), playlist
+        match = re.match(r'^/api/channel/hls/(\w+)\.m3u8$', path)
+        if match:
+            videos = self._channels.get(match.group(1)) or []
+            if len(videos) == 0 or not videos[-1].live:
+                return 404, b'offline', 'text/plain'
+            return 200, self._master(f"/live/{videos[-1].id}"), playlist
+        match = re.match(r'^/(hls|live)/(\w+)/(\w+)/index\.m3u8$', path)
+        if match:
+            video = self._videos[match.group(2)]
+            if match.group(1) == 'live' and not video.live:
+                return 404, b'offline', 'text/plain'
+            return 200, self._media(video, f"/{match.group(1)}/{video.id}/{match.group(3)}", match.group(1) == 'live'), playlist
+        match = re.match(r'^/(hls|live)/(\w+)/(\w+)/(\d+)\.ts$', path)
+        if match:
+            return 200, self._segment(self._videos[match.group(2)], int(match.group(4))), 'video/mp2t'
+        return 404, b'not found', 'text/plain'
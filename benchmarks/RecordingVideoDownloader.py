@@ -0,0 +1,61 @@
+import time
+from typing import Any,Dict,List,Optional
+from twitch_downloader.AsyncVideoDownloader import AsyncVideoDownloader
+from twitch_downloader.ThreadedVideoDownloader import ThreadedVideoDownloader
+from twitch_downloader.factory.TwitchDownloaderFactory import TwitchDownloaderFactory
+
+class RecordingVideoDownloader(AsyncVideoDownloader):
+    """
+    Forwards everything to another downloader, keeping how long each call took (and how many failed)
+    """
+    def __init__(self, video_downloader: AsyncVideoDownloader, samples: Dict[str,List[float]], errors: Dict[str,int]):
+        """
+        :param samples:     Where to add the latencies (seconds) of each operation; shared by all the downloaders of a factory
+        :param errors:      Where to count the failed calls of each operation
+        """
+        self._video_downloader = video_downloader
+        self._samples = samples
+        self._errors = errors
+
+    async def _measure(self, operation: str, coroutine) -> Any:
+        start = time.perf_counter()
+        try:
+            return await coroutine
+        except Exception:
+            self._errors[operation] = self._errors.get(operation, 0) + 1
+            raise
+        finally:
+            self._samples.setdefault(operation, []).append(time.perf_counter() - start)
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        await self._measure('download', self._video_downloader.download(id_or_url, quality, out_path))
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        return await self._measure('get_info', self._video_downloader.get_info(id_or_url))
+
+    async def get_last_video(self, channel: str) -> str:
+        return await self._measure('get_last_video', self._video_downloader.get_last_video(channel))
+
+    async def get_infos(self, ids_or_urls: List[str]) -> Dict[str,Dict[str,Any]]:
+        return await self._measure('get_infos', self._video_downloader.get_infos(ids_or_urls))
+
+    async def get_last_videos(self, channels: List[str]) -> Dict[str,Optional[str]]:
+        return await self._measure('get_last_videos', self._video_downloader.get_last_videos(channels))
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        await self._measure('get_chat', self._video_downloader.get_chat(id_or_url, format, out_path))
+
+    async def sync_chat(self, id_or_url: str, folder: str):
+        await self._measure('sync_chat', self._video_downloader.sync_chat(id_or_url, folder))
+
+class RecordingDownloaderFactory(TwitchDownloaderFactory):
+    def __init__(self, downloader_factory: TwitchDownloaderFactory):
+        self._downloader_factory = downloader_factory
+        self.samples = {} # operation -> latencies
+        self.errors = {} # operation -> failed calls
+
+    def build(self) -> AsyncVideoDownloader:
+        downloader = self._downloader_factory.build()
+        if not isinstance(downloader, AsyncVideoDownloader):
+            downloader = ThreadedVideoDownloader(downloader)
+        return RecordingVideoDownloader(downloader, self.samples, self.errors)
@@ -1,28 +1,144 @@
 import json
 import os
-from typing import Dict,Any
+from typing import Dict,Any,List,Optional
 
 class ConfigProvider:
     @property
     def download_while_stream(self) -> bool:
         pass
 
+    @property
+    def incremental_capture(self) -> bool:
+        pass
+
+    @property
+    def segmented_capture(self) -> Dict[str,Any]:
+        pass
+
+    @property
+    def live_capture(self) -> bool:
+        pass
+
+    @property
+    def use_twitch_api(self) -> bool:
+        pass
+
+    @property
+    def poll_batch_size(self) -> int:
+        pass
+
+    @property
+    def metadata_cache(self) -> Dict[str,float]:
+        pass
+
+    @property
+    def native_download(self) -> bool:
+        pass
+
+    @property
+    def download_connections(self) -> int:
+        pass
+
+    @property
+    def job_bandwidth_limit(self) -> Optional[float]:
+        pass
+
+    @property
+    def global_bandwidth_limit(self) -> Optional[float]:
+        pass
+
     @property
     def check_interval(self) -> float:
         pass
 
+    @property
+    def adaptive_polling(self) -> Dict[str,Any]:
+        pass
+
+    @property
+    def eventsub(self) -> Dict[str,Any]:
+        pass
+
+    @property
+    def metrics(self) -> Dict[str,Any]:
+        pass
+
+    @property
+    def log_level(self) -> str:
+        pass
+
     @property
     def channel_name(self) -> str:
         pass
 
+    @property
+    def channel_names(self) -> List[str]:
+        pass
+
+    @property
+    def max_concurrent_downloads(self) -> int:
+        pass
+
+    @property
+    def max_concurrent_ffmpeg(self) -> int:
+        pass
+
     @property
     def download_quality(self) -> str:
         pass
 
+    @property
+    def output_format(self) -> str:
+        pass
+
+    @property
+    def quality_ladder(self) -> Dict[str,Any]:
+        pass
+
+    @property
+    def transcode_preset(self) -> Optional[str]:
+        pass
+
     @property
     def chat_format(self) -> str:
         pass
 
+    @property
+    def native_chat(self) -> bool:
+        pass
+
+    @property
+    def chat_while_stream(self) -> bool:
+        pass
+
+    @property
+    def chat_store(self) -> bool:
+        pass
+
+    @property
+    def work_folder(self) -> str:
+        pass
+
+    @property
+    def temp_folder(self) -> str:
+        pass
+
+    @property
+    def videos_folder(self) -> str:
+        pass
+
+    @property
+    def archive_folder(self) -> Optional[str]:
+        pass
+
+    @property
+    def storage(self) -> Dict[str,Any]:
+        pass
+
+    @property
+    def pipeline_workers(self) -> Dict[str,int]:
+        pass
+
 class JsonConfig(ConfigProvider):
     def __init__(self, path: str):
         self._configPath = path
@@ -32,12 +148,68 @@ class JsonConfig(ConfigProvider):
     def _get_defaults() -> Dict[str, Any]:
         return {
             'download_while_stream': True,  # to prevent sound loss (due to copyright)
+            'incremental_capture': False,   # download only the new HLS segments on each check, instead of the whole video again
+            'segmented_capture': {          # same as `incremental_capture`, but into chunk files listed on `<capture>/segments/index.m3u8`, so the
+                                            # capture can be played while it's recorded; they're joined at the end. It takes precedence over `incremental_capture`
+                'enabled': False, 'chunk_duration': 60.0
+            },
+            'live_capture': False,          # record the streams while they air (nothing muted, and no download at the end); it needs to start
+                                            # right after the stream, so use it with `eventsub` (if it starts late the video is downloaded as usual)
+            'use_twitch_api': False,        # query the videos through the Twitch API instead of launching twitch-dl
+            'poll_batch_size': 35,          # channels checked at the same time (with a single request if `use_twitch_api` is enabled)
+            'metadata_cache': {             # how long (seconds) the video information is kept, and how many entries
+                'info_ttl': 60.0, 'last_video_ttl': 30.0, 'max_entries': 1024
+            },
+            'native_download': False,       # download the HLS segments directly (resumable) instead of using twitch-dl; requires `use_twitch_api`
+            'download_connections': 4,      # segments downloaded at the same time by each native download
+            'job_bandwidth_limit': None,    # max. bytes per second of each native download (`None` for no limit)
+            'global_bandwidth_limit': None, # max. bytes per second of all the native downloads together (`None` for no limit)
             'check_interval': 24*60.0,      # 24 minute interval.
                                             # The max audio loss will be 2 times this number; check `TwitchDownloader._download` for explanation.
                                             # Don't set it too low or it will fail due to Twitch's way to sync (eg. 12min is too low)
-            'channel_name': '',             # where to download the videos
-            'download_quality': '480p',     # downloaded video resolution
-            'chat_format': 'srt'            # downloaded chat format
+            'adaptive_polling': {           # learn when the channels stream, and check often only around those hours (and while they stream);
+                                            # `check_interval` is used until there's enough videos to learn from. Times in seconds
+                'enabled': True, 'min_interval': 3*60.0, 'max_interval': 2*60*60.0, 'capture_min_interval': 4*60.0
+            },
+            'eventsub': {                   # get notified when the streams start/end instead of waiting for the next check. The `stream.online` and
+                                            # `stream.offline` subscriptions must be created (with `secret`) pointing to this server;
+                                            # the checks will still be done every `fallback_interval` (at least) in case a notification is lost
+                'enabled': False, 'secret': '', 'host': '0.0.0.0', 'port': 8080, 'path': '/eventsub', 'fallback_interval': 60*60.0
+            },
+            'metrics': {                    # serve the timings/counters on http://<host>:<port>/metrics (Prometheus format);
+                                            # only 1 of each `trace_sample_every` outputs of the commands is logged (on the TRACE level)
+                'enabled': False, 'host': '127.0.0.1', 'port': 9464, 'trace_sample_every': 10
+            },
+            'log_level': 'DEBUG',           # 'TRACE' also logs (sampled) the output of the commands
+            'channel_name': '',             # where to download the videos (single channel; kept for old config files)
+            'channel_names': [],            # where to download the videos (all of them are watched by the same process)
+            'max_concurrent_downloads': 2,  # global cap of videos being downloaded at the same time
+            'max_concurrent_ffmpeg': 1,     # global cap of ffmpeg jobs running at the same time
+            'download_quality': '480p',     # downloaded video resolution ('source' if `quality_ladder` is enabled)
+            'output_format': 'mkv',         # container of the saved videos ('mkv', 'mp4'...); the video is remuxed, not re-encoded
+            'quality_ladder': {             # download the videos once at source quality, and also save smaller copies (`<id>.<name>.<output_format>`)
+                                            # of them, all generated with the same ffmpeg run (renditions taller than the video are skipped)
+                'enabled': False, 'preset': 'veryfast',
+                'renditions': [{'name': 'mobile', 'height': 360, 'video_bitrate': '800k', 'audio_bitrate': '96k'}]
+            },
+            'transcode_preset': None,       # x264 preset (eg. 'veryfast') for when the codecs don't fit `output_format`; `None` for ffmpeg's default
+            'chat_format': 'srt',           # downloaded chat format ('srt', 'json', 'ass' or 'tcs' with `native_chat`)
+            'chat_store': False,            # with `native_chat`, also keep the chat on a compact indexed format (`<id>.tcs*`) that can be queried by time or user
+            'native_chat': False,           # download the chat through the Twitch API instead of TCD; requires `use_twitch_api`
+            'chat_while_stream': True,      # with `native_chat`, download the chat on each check (so only the last messages are left at the end)
+            'work_folder': 'work',          # where the finished videos are processed (relative to the config file); it must persist between restarts
+            'temp_folder': None,            # temporal files of the downloads (eg. twitch-dl's segments); `None` for `<work_folder>/tmp`.
+                                            # Keep `temp_folder`, `work_folder` and `videos_folder` on the same disk, so the videos are renamed instead of copied
+            'videos_folder': 'videos',      # where the finished videos are saved (relative to the config file)
+            'archive_folder': None,         # where the videos are moved after `storage.archive_after` (eg. on a cheaper disk); `None` to keep them
+            'storage': {                    # disk space checks and retention of the saved videos (only the ones saved by this program are removed).
+                                            # Sizes in bytes, times in seconds; `None` for no limit
+                'min_free_space': 1024**3, 'archive_after': 7*24*60*60.0, 'max_age': None, 'max_total_size': None,
+                'channel_quota': None, 'channel_quotas': {}, 'check_interval': 60*60.0
+            },
+            'pipeline_workers': {           # videos processed at the same time on each post-processing stage
+                'capture': 2, 'remux': 1, 'renditions': 1, 'chat': 2, 'publish': 1
+            }
         }
 
     def create(self):
@@ -52,6 +224,12 @@ class JsonConfig(ConfigProvider):
         with open(self._configPath, 'r') as f:
             self._data = json.load(f)
 
+    def _get(self, key: str) -> Any:
+        """
+        Gets a config value, falling back to the default one if the config file is older than the key
+        """
+        return self._data.get(key, JsonConfig._get_defaults()[key])
+
     @property
     def loaded(self) -> bool:
         return self._data is not None
@@ -60,18 +238,143 @@ class JsonConfig(ConfigProvider):
     def download_while_stream(self) -> bool:
         return self._data['download_while_stream']
 
+    @property
+    def incremental_capture(self) -> bool:
+        return self._get('incremental_capture')
+
+    @property
+    def segmented_capture(self) -> Dict[str,Any]:
+        return {**JsonConfig._get_defaults()['segmented_capture'], **self._get('segmented_capture')}
+
+    @property
+    def live_capture(self) -> bool:
+        return self._get('live_capture')
+
+    @property
+    def use_twitch_api(self) -> bool:
+        return self._get('use_twitch_api')
+
+    @property
+    def poll_batch_size(self) -> int:
+        return self._get('poll_batch_size')
+
+    @property
+    def metadata_cache(self) -> Dict[str,float]:
+        return self._get('metadata_cache')
+
+    @property
+    def native_download(self) -> bool:
+        return self._get('native_download')
+
+    @property
+    def download_connections(self) -> int:
+        return self._get('download_connections')
+
+    @property
+    def job_bandwidth_limit(self) -> Optional[float]:
+        return self._get('job_bandwidth_limit')
+
+    @property
+    def global_bandwidth_limit(self) -> Optional[float]:
+        return self._get('global_bandwidth_limit')
+
     @property
     def check_interval(self) -> float:
         return self._data['check_interval']
 
+    @property
+    def adaptive_polling(self) -> Dict[str,Any]:
+        return {**JsonConfig._get_defaults()['adaptive_polling'], **self._get('adaptive_polling')} # the missing ones are the default ones
+
+    @property
+    def eventsub(self) -> Dict[str,Any]:
+        return {**JsonConfig._get_defaults()['eventsub'], **self._get('eventsub')}
+
+    @property
+    def metrics(self) -> Dict[str,Any]:
+        return {**JsonConfig._get_defaults()['metrics'], **self._get('metrics')}
+
+    @property
+    def log_level(self) -> str:
+        return self._get('log_level')
+
     @property
     def channel_name(self) -> str:
-        return self._data['channel_name']
+        return self._get('channel_name')
+
+    @property
+    def channel_names(self) -> List[str]:
+        channels = list(self._get('channel_names'))
+        if self.channel_name != '' and self.channel_name not in channels:
+            channels.insert(0, self.channel_name)
+        return channels
+
+    @property
+    def max_concurrent_downloads(self) -> int:
+        return self._get('max_concurrent_downloads')
+
+    @property
+    def max_concurrent_ffmpeg(self) -> int:
+        return self._get('max_concurrent_ffmpeg')
 
     @property
     def download_quality(self) -> str:
+        if self.quality_ladder['enabled']:
+            return 'source' # the rest are generated from it
         return self._data['download_quality']
 
+    @property
+    def output_format(self) -> str:
+        return self._get('output_format')
+
+    @property
+    def quality_ladder(self) -> Dict[str,Any]:
+        return {**JsonConfig._get_defaults()['quality_ladder'], **self._get('quality_ladder')}
+
+    @property
+    def transcode_preset(self) -> Optional[str]:
+        return self._get('transcode_preset')
+
     @property
     def chat_format(self) -> str:
-        return self._data['chat_format']
\ No newline at end of file
+        return self._data['chat_format']
+
+    @property
+    def native_chat(self) -> bool:
+        return self._get('native_chat')
+
+    @property
+    def chat_while_stream(self) -> bool:
+        return self._get('chat_while_stream')
+
+    @property
+    def chat_store(self) -> bool:
+        return self._get('chat_store')
+
+    @property
+    def work_folder(self) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(self._configPath)), self._get('work_folder')) # absolute paths are kept as-is
+
+    @property
+    def temp_folder(self) -> str:
+        if self._get('temp_folder') is None:
+            return os.path.join(self.work_folder, 'tmp')
+        return os.path.join(os.path.dirname(os.path.abspath(self._configPath)), self._get('temp_folder'))
+
+    @property
+    def videos_folder(self) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(self._configPath)), self._get('videos_folder'))
+
+    @property
+    def archive_folder(self) -> Optional[str]:
+        if self._get('archive_folder') is None:
+            return None
+        return os.path.join(os.path.dirname(os.path.abspath(self._configPath)), self._get('archive_folder'))
+
+    @property
+    def storage(self) -> Dict[str,Any]:
+        return {**JsonConfig._get_defaults()['storage'], **self._get('storage')}
+
+    @property
+    def pipeline_workers(self) -> Dict[str,int]:
+        return self._get('pipeline_workers')
\ No newline at end of file
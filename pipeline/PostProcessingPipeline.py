@@ -0,0 +1,350 @@
+import os
+import shutil
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Any,Dict
+from config.ConfigManager import ConfigProvider
+from scheduler.ResourceLimits import ResourceLimits
+from storage.StorageManager import StorageManager,StorageFullException
+from pipeline.WorkQueue import WorkQueue
+from twitch_downloader.AsyncVideoDownloader import AsyncVideoDownloader
+from twitch_downloader.ThreadedVideoDownloader import ThreadedVideoDownloader
+from twitch_downloader.FFmpeg import FFmpeg
+from twitch_downloader.hls.IncrementalCapture import IncrementalCapture
+from twitch_downloader.hls.SegmentedCapture import SegmentedCapture
+from twitch_downloader.hls.LiveCapture import LiveCapture
+from twitch_downloader.chat.ChatStore import ChatStore
+from twitch_downloader.metrics.Metrics import Metrics
+from twitch_downloader.factory.TwitchDownloaderFactory import TwitchDownloaderFactory
+
+class PostProcessingPipeline:
+    """
+    Processes the finished videos outside the capture loop: capture -> remux/merge -> renditions -> chat -> publish.
+    Each stage has its own workers, and the jobs are persisted between stages so they're resumed after a restart.
+    A stage that fails is repeated later (with its workspace untouched); after `RETRIES` attempts the job is parked until the next run,
+    or the stage is skipped if it's one of `OPTIONAL_STAGES`.
+    """
+    STAGES = ['capture', 'remux', 'renditions', 'chat', 'publish']
+    # stages skipped once their retries are exhausted, as the rest can go on without them
+    # (if the complete video can't be got, remux keeps the most complete temporal; the video is published without chat/renditions)
+    OPTIONAL_STAGES = ['capture', 'renditions', 'chat']
+    RETRIES = 3
+    RETRY_DELAY = 60 # seconds; doubled on each attempt
+
+    def __init__(self, config: ConfigProvider, video_downloader_factory: TwitchDownloaderFactory, limits: ResourceLimits, storage: StorageManager):
+        self._config = config
+        self._video_downloader = video_downloader_factory.build()
+        if not isinstance(self._video_downloader, AsyncVideoDownloader):
+            self._video_downloader = ThreadedVideoDownloader(self._video_downloader)
+        self._limits = limits
+        self._storage = storage
+        self._incremental_capture = IncrementalCapture()
+        self._segmented_capture = SegmentedCapture(chunk_duration=config.segmented_capture['chunk_duration'])
+        self._metrics = Metrics.default()
+        self._start = False
+
+        self._work_folder = storage.staging_folder
+        Path(self._work_folder).mkdir(parents=True, exist_ok=True)
+        self._videos_folder = storage.videos_folder
+        Path(self._videos_folder).mkdir(parents=True, exist_ok=True)
+
+        self._work_queue = WorkQueue(os.path.join(self._work_folder, 'queue.json'))
+        self._queues = None
+        self._workers = []
+        self._retries = [] # scheduled re-runs of the failed stages
+
+    @property
+    def started(self) -> bool:
+        return self._start
+
+    def _update_queue_depths(self):
+        for stage,queue in self._queues.items():
+            self._metrics.set('pipeline_queue_depth', queue.qsize(), stage=stage)
+
+    def _workspace(self, job: Dict[str,Any]) -> str:
+        return os.path.join(self._work_folder, job['id'])
+
+    async def submit(self, channel: str, id: str, published: datetime, workspace: str, complete: bool = True):
+        """
+        Queues a finished video.
+        :param channel str:     Channel of the video
+        :param id str:          ID of the video
+        :param published:       Publish time of the video
+        :param workspace str:   Folder with the files captured while streaming; it will be moved into the pipeline
+        :param complete bool:   If the last temporal video was got once the video had ended (so it's the complete one)
+        """
+        if any(job['id'] == id for job in self._work_queue.jobs):
+            logging.debug(f"Video {id} was already queued") # submitted right before a restart
+            return
+
+        job = {'id': id, 'channel': channel, 'published': published.isoformat(), 'stage': PostProcessingPipeline.STAGES[0], 'outputs': [], 'complete': complete}
+        target = self._workspace(job)
+        if os.path.isdir(workspace):
+            await asyncio.get_event_loop().run_in_executor(None, shutil.move, workspace, target)
+        Path(target).mkdir(parents=True, exist_ok=True)
+
+        self._work_queue.put(job)
+        logging.debug(f"Queued video {id} for post-processing")
+        if self._queues is not None:
+            await self._queues[job['stage']].put(job)
+            self._update_queue_depths()
+
+    async def _download_size(self, id: str) -> int:
+        """
+        Approximate size of the complete video, to reserve the space before downloading it
+        """
+        info = await self._video_downloader.get_info(id)
+        return StorageManager.estimate_size(self._config.download_quality, info['length'].total_seconds() if 'length' in info else 0)
+
+    async def _capture(self, job: Dict[str,Any]):
+        """
+        Gets the complete video; it will re-use the temporal captures when possible.
+        """
+        id = job['id']
+        workspace = self._workspace(job)
+        live_folder = os.path.join(workspace, 'live')
+        live = LiveCapture.load(live_folder)
+        live_complete = LiveCapture.is_complete(live, datetime.fromisoformat(job['published']))
+        if live is not None and not live_complete:
+            logging.warning(f"The live recording of video {id} is not complete; the video will be downloaded.")
+
+        if live_complete:
+            # recorded while streaming; nothing to download
+            logging.debug(f"Using the live recording of video {id}.")
+            parts = LiveCapture.parts(live_folder)
+            final_path = os.path.join(workspace, id + ".live.ts")
+            if os.path.isfile(final_path):
+                pass # interrupted after joining them
+            elif len(parts) == 1:
+                shutil.move(parts[0], final_path)
+            else:
+                async with self._storage.reserve(workspace, sum(os.path.getsize(part) for part in parts), os.path.join(workspace, id + ".live.tmp.ts")), self._limits.ffmpeg_jobs:
+                    await FFmpeg.concat(parts, os.path.join(workspace, id + ".live.tmp.ts"))
+                os.replace(os.path.join(workspace, id + ".live.tmp.ts"), final_path)
+            job['live'] = True
+        elif self._config.segmented_capture['enabled']:
+            final_path = os.path.join(workspace, id + ".ts")
+            segments_folder = os.path.join(workspace, 'segments')
+            if os.path.isfile(final_path) and not os.path.isdir(segments_folder):
+                pass # interrupted after compacting it
+            else:
+                async with self._limits.downloads, self._storage.reserve(workspace, max(await self._download_size(id) - SegmentedCapture.size(segments_folder), 0)):
+                    await self._segmented_capture.capture(id, self._config.download_quality, segments_folder)
+                # the chunks are already on disk; joining them is just a copy
+                async with self._storage.reserve(workspace, SegmentedCapture.size(segments_folder), final_path), self._limits.ffmpeg_jobs:
+                    await SegmentedCapture.compact(segments_folder, final_path)
+        elif self._config.incremental_capture:
+            final_path = os.path.join(workspace, id + ".ts")
+            async with self._limits.downloads, self._storage.reserve(workspace, await self._download_size(id), final_path):
+                await self._incremental_capture.capture(id, self._config.download_quality, final_path)
+        elif job.get('complete', True) and os.path.isfile(os.path.join(workspace, id + ".3.mkv")):
+            # if we got "C", then we can export it directly (check `TwitchDownloader._download` for explanation)
+            logging.debug("Re-using latest tmp video.")
+            final_path = os.path.join(workspace, id + ".3.mkv")
+        else:
+            # we weren't downloading tmp files; download the final video
+            final_path = os.path.join(workspace, id + ".final.mkv")
+            async with self._limits.downloads, self._storage.reserve(workspace, await self._download_size(id)):
+                logging.debug(f"Downloading into {final_path}...")
+                await self._video_downloader.download(id, self._config.download_quality, final_path)
+        job['final'] = os.path.basename(final_path)
+
+    async def _move_and_reformat(self, from_path: str, to_path: str):
+        if os.path.splitext(from_path)[1] == os.path.splitext(to_path)[1]:
+            await AsyncVideoDownloader.move_and_reformat(from_path, to_path) # just a move
+            return
+        async with self._storage.reserve(os.path.dirname(to_path), os.path.getsize(from_path), to_path), self._limits.ffmpeg_jobs:
+            await AsyncVideoDownloader.move_and_reformat(from_path, to_path, self._config.transcode_preset)
+
+    async def _remux(self, job: Dict[str,Any]):
+        """
+        Saves the final video on the output format, merging it with the start captured while streaming (if any).
+        """
+        id = job['id']
+        workspace = self._workspace(job)
+        output = id + "." + self._config.output_format
+        to_merge = os.path.join(workspace, id + ".1.mkv")
+        final_path = None if 'final' not in job else os.path.join(workspace, job['final'])
+
+        if (final_path is None or not os.path.isfile(final_path)) and os.path.isfile(os.path.join(workspace, output)):
+            logging.debug(f"Video {id} was already reformatted.") # interrupted after moving it
+        elif final_path is None or not os.path.isfile(final_path):
+            # the video may have been removed; at least keep the most complete temporal
+            candidates = [os.path.join(workspace, name) for name in (id + ".ts", id + ".3.mkv", id + ".2.mkv", id + ".1.mkv")]
+            partial = next((path for path in candidates if os.path.isfile(path)), None)
+            if partial is None:
+                logging.warning(f"Nothing to save from video {id}.")
+                return
+            logging.debug("Couldn't find the complete video; keeping the partial one.")
+            output = "start_" + output
+            await self._move_and_reformat(partial, os.path.join(workspace, output))
+        elif self._config.download_while_stream and final_path != to_merge and os.path.isfile(to_merge) and not job.get('live', False):
+            # (the live recordings already have the start; and they don't share timestamps with the VOD)
+            # merge the temporal with the final file
+            logging.debug(f"Merging '{to_merge}' with '{final_path}'...")
+            try:
+                # (the merged mkv, and the remuxed copy of it)
+                async with self._storage.reserve(workspace, 2 * os.path.getsize(final_path), os.path.join(workspace, output)), self._limits.ffmpeg_jobs:
+                    await FFmpeg.merge(to_merge, final_path, os.path.join(workspace, output), self._config.transcode_preset)
+            except StorageFullException:
+                raise # the merge will be repeated once there's space
+            except Exception as ex:
+                logging.error(ex, exc_info=True)
+                # at least keep the temporal
+                await self._move_and_reformat(to_merge, os.path.join(workspace, "start_" + output))
+                job['outputs'].append("start_" + output)
+                await self._move_and_reformat(final_path, os.path.join(workspace, output))
+        else:
+            await self._move_and_reformat(final_path, os.path.join(workspace, output))
+        job['outputs'].append(output)
+
+    async def _renditions(self, job: Dict[str,Any]):
+        """
+        Generates the smaller copies of the video (`quality_ladder`) from the saved one.
+        """
+        ladder = self._config.quality_ladder
+        if not ladder['enabled'] or len(ladder['renditions']) == 0:
+            return
+        id = job['id']
+        workspace = self._workspace(job)
+        source_path = os.path.join(workspace, id + "." + self._config.output_format)
+        if not os.path.isfile(source_path):
+            logging.warning(f"There's no complete video {id} to generate the renditions from.")
+            return
+
+        probe = await FFmpeg.probe(source_path)
+        height = max((stream.get('height', 0) for stream in probe['streams'] if stream.get('codec_type') == 'video'), default=0)
+        duration = float(probe['format'].get('duration', 0))
+        renditions = []
+        for rendition in ladder['renditions']:
+            if height > 0 and rendition['height'] >= height:
+                logging.debug(f"Video {id} is {height}p; skipping rendition '{rendition['name']}' ({rendition['height']}p)")
+                continue
+            renditions.append({**rendition, 'path': os.path.join(workspace, f"{id}.{rendition['name']}.{self._config.output_format}")})
+        if len(renditions) == 0:
+            return
+
+        size = sum(StorageManager.estimate_size(f"{rendition['height']}p", duration) for rendition in renditions)
+        async with self._storage.reserve(workspace, size), self._limits.ffmpeg_jobs:
+            logging.debug(f"Generating {len(renditions)} renditions of video {id}...")
+            await FFmpeg.renditions(source_path, renditions, ladder['preset'])
+        job['outputs'] += [os.path.basename(rendition['path']) for rendition in renditions]
+
+    async def _chat(self, job: Dict[str,Any]):
+        output = job['id'] + "." + self._config.chat_format
+        await self._video_downloader.get_chat(job['id'], self._config.chat_format, os.path.join(self._workspace(job), output))
+        job['outputs'].append(output)
+        if self._config.chat_store:
+            # the files that are not there (eg. the downloader can't generate the store) are not published
+            job['outputs'] += [os.path.basename(path) for path in ChatStore.files(os.path.join(self._workspace(job), job['id'] + ".tcs"))
+                                    if os.path.isfile(path) and os.path.basename(path) not in job['outputs']]
+
+    async def _publish(self, job: Dict[str,Any]):
+        """
+        Moves the outputs into the videos folder, and removes the rest (only once all of them are there).
+        """
+        workspace = self._workspace(job)
+        for output in dict.fromkeys(job['outputs']):
+            if os.path.isfile(os.path.join(workspace, output)):
+                await asyncio.get_event_loop().run_in_executor(None, shutil.move, os.path.join(workspace, output), os.path.join(self._videos_folder, output))
+            elif not os.path.isfile(os.path.join(self._videos_folder, output)): # (it may have been moved before a restart)
+                raise Exception(f"Output '{output}' of video {job['id']} is missing; keeping '{workspace}'")
+        shutil.rmtree(workspace, ignore_errors=True)
+        self._storage.add(job['channel'], job['id'], datetime.fromisoformat(job['published']), job['outputs'])
+        logging.info(f"Video {job['id']} published.")
+
+    def _requeue(self, job: Dict[str,Any], stage: str, delay: float):
+        def put():
+            self._retries.remove(handle)
+            self._queues[stage].put_nowait(job)
+            self._update_queue_depths()
+        handle = asyncio.get_event_loop().call_later(delay, put)
+        self._retries.append(handle)
+
+    def _retry(self, job: Dict[str,Any], stage: str, ex: Exception):
+        """
+        Keeps the job on the stage that failed, to repeat it later; the next stages never run with a missing/broken input
+        """
+        job['failures'] = job.get('failures', 0) + 1
+        job['error'] = str(ex)
+        if job['failures'] > PostProcessingPipeline.RETRIES and stage in PostProcessingPipeline.OPTIONAL_STAGES:
+            logging.error(f"Stage '{stage}' of video {job['id']} failed {job['failures']} times; skipping it")
+            self._advance(job, stage)
+            return
+        if job['failures'] > PostProcessingPipeline.RETRIES:
+            job['failed'] = True
+            self._work_queue.update(job)
+            logging.error(f"Stage '{stage}' of video {job['id']} failed {job['failures']} times; it's kept on '{self._workspace(job)}' until the next run")
+            return
+        self._work_queue.update(job)
+        delay = PostProcessingPipeline.RETRY_DELAY * 2 ** (job['failures'] - 1)
+        logging.warning(f"Retrying stage '{stage}' of video {job['id']} in {delay}s")
+        self._requeue(job, stage, delay)
+
+    def _advance(self, job: Dict[str,Any], stage: str):
+        """
+        Moves a job into the stage after `stage` (or removes it if it was the last one)
+        """
+        job.pop('failures', None)
+        job.pop('error', None)
+        if stage == PostProcessingPipeline.STAGES[-1]:
+            self._work_queue.remove(job)
+            return
+        job['stage'] = PostProcessingPipeline.STAGES[PostProcessingPipeline.STAGES.index(stage) + 1]
+        self._work_queue.update(job)
+        self._queues[job['stage']].put_nowait(job)
+        self._update_queue_depths()
+
+    async def _worker(self, stage: str):
+        stage_fn = getattr(self, '_' + stage)
+        while True:
+            job = await self._queues[stage].get()
+            self._update_queue_depths()
+            try:
+                logging.debug(f"Running stage '{stage}' of video {job['id']}")
+                with self._metrics.time('pipeline_stage_seconds', stage=stage):
+                    await stage_fn(job)
+            except StorageFullException as ex:
+                # not the job's fault; wait for the retention policies (or someone) to free some space
+                delay = PostProcessingPipeline.RETRY_DELAY
+                logging.warning(f"{ex}; stage '{stage}' of video {job['id']} will be repeated in {delay}s")
+                self._requeue(job, stage, delay)
+                continue
+            except Exception as ex:
+                logging.critical(ex, exc_info=True)
+                self._metrics.inc('pipeline_errors_total', stage=stage)
+                self._retry(job, stage, ex)
+                continue
+            self._advance(job, stage)
+
+    async def run(self):
+        if self.started:
+            raise Exception("Can't run the same instance twice!")
+        self._start = True
+
+        self._queues = {stage: asyncio.Queue() for stage in PostProcessingPipeline.STAGES}
+        for job in self._work_queue.jobs:
+            logging.info(f"Resuming the post-processing of video {job['id']} (stage '{job['stage']}')")
+            if job.pop('failed', False):
+                job['failures'] = 0 # parked; try again
+                self._work_queue.update(job)
+            self._queues[job['stage']].put_nowait(job)
+        self._update_queue_depths()
+
+        workers = self._config.pipeline_workers
+        self._workers = [asyncio.ensure_future(self._worker(stage)) for stage in PostProcessingPipeline.STAGES for _ in range(max(workers.get(stage, 1), 1))]
+        try:
+            await asyncio.gather(*self._workers)
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        # the interrupted jobs keep their stage, so they'll be repeated on the next run
+        self._start = False
+        for worker in self._workers:
+            worker.cancel()
+        for handle in self._retries:
+            handle.cancel()
+        self._retries = []
@@ -0,0 +1,32 @@
+from typing import Any,Dict,List
+from scheduler.StateJournal import StateJournal
+
+class WorkQueue:
+    """
+    Jobs pending to be processed, persisted on disk so they survive a restart.
+    Every change is saved right away, so a crash never leaves a half-written queue.
+    """
+    def __init__(self, path: str):
+        self._journal = StateJournal(path)
+        self._jobs = self._journal.load() or []
+
+    @property
+    def jobs(self) -> List[Dict[str,Any]]:
+        return list(self._jobs)
+
+    def _save(self):
+        self._journal.save(self._jobs)
+
+    def put(self, job: Dict[str,Any]):
+        self._jobs.append(job)
+        self._save()
+
+    def update(self, job: Dict[str,Any]):
+        """
+        Persists the changes made on a job that is already in the queue
+        """
+        self._save()
+
+    def remove(self, job: Dict[str,Any]):
+        self._jobs.remove(job)
+        self._save()
@@ -0,0 +1,130 @@
+from datetime import datetime,timedelta
+from typing import List,Optional
+
+class AdaptivePoller:
+    """
+    Decides how long a channel should wait until the next check.
+    While waiting for a video it learns at which hours of the week the channel usually starts streaming
+    (using the publish time of the previous videos), checking often around them and rarely on the rest.
+    While capturing it follows how fast Twitch updates the length of the video.
+    """
+    HOURS_PER_WEEK = 7*24
+    MAX_HISTORY = 64    # remembered stream starts
+    MIN_HISTORY = 3     # stream starts needed before trusting the schedule
+
+    def __init__(self, check_interval: float, min_interval: float, max_interval: float, capture_min_interval: float,
+                        enabled: bool = True, history: List[datetime] = None, incremental_capture: bool = True):
+        """
+        :param check_interval float:        Interval used when there's nothing learned (and the max interval while capturing)
+        :param min_interval float:          Shortest wait around an expected stream start
+        :param max_interval float:          Longest wait on quiet hours
+        :param capture_min_interval float:  Shortest wait while capturing
+        :param enabled bool:                If `False` it will always return `check_interval`
+        :param history:                     Publish times of the previous videos (UTC)
+        :param incremental_capture bool:    If each check while capturing only gets the new data; otherwise (the whole video is
+                                            downloaded again) the growing video is checked every `check_interval`
+        """
+        self._check_interval = check_interval
+        self._min_interval = min(min_interval, check_interval)
+        self._max_interval = max(max_interval, check_interval)
+        self._capture_min_interval = min(capture_min_interval, check_interval)
+        self._enabled = enabled
+        self._incremental_capture = incremental_capture
+        self._history = [] if history is None else sorted(history)[-AdaptivePoller.MAX_HISTORY:]
+        self._histogram = None
+        self._capture_interval = check_interval
+
+    @staticmethod
+    def _hour_of_week(time: datetime) -> int:
+        return time.weekday()*24 + time.hour
+
+    @property
+    def history(self) -> List[datetime]:
+        return list(self._history)
+
+    @property
+    def stall_timeout(self) -> float:
+        """
+        How long the length of the video can stay the same before considering that the stream has ended.
+        Checking faster than Twitch updates the video would end the captures too early otherwise.
+        """
+        return self._check_interval if self._enabled else 0
+
+    def record_start(self, published: datetime):
+        if published in self._history:
+            return
+        self._history.append(published)
+        self._history = sorted(self._history)[-AdaptivePoller.MAX_HISTORY:]
+        self._histogram = None
+        self._capture_interval = self._check_interval # new video; start again
+
+    def _get_histogram(self) -> List[float]:
+        """
+        Starts per hour of the week, relative to the mean (1 = average hour).
+        Neighbour hours also get some weight, as streams don't start exactly at the same time.
+        """
+        if self._histogram is not None:
+            return self._histogram
+
+        counts = [0.0] * AdaptivePoller.HOURS_PER_WEEK
+        for published in self._history:
+            hour = AdaptivePoller._hour_of_week(published)
+            counts[hour] += 1
+            counts[(hour-1) % AdaptivePoller.HOURS_PER_WEEK] += 0.5 # they may start a bit earlier...
+            counts[(hour+1) % AdaptivePoller.HOURS_PER_WEEK] += 0.25 # ...or be late
+        mean = sum(counts) / AdaptivePoller.HOURS_PER_WEEK
+        self._histogram = [count / mean for count in counts]
+        return self._histogram
+
+    def waiting_interval(self, now: Optional[datetime] = None) -> float:
+        """
+        :param now:     Current time (UTC)
+        :return:        Seconds to wait until the next check for a new video
+        """
+        if not self._enabled or len(self._history) < AdaptivePoller.MIN_HISTORY:
+            return self._check_interval
+        if now is None:
+            now = datetime.utcnow()
+
+        histogram = self._get_histogram()
+        hour = AdaptivePoller._hour_of_week(now)
+        score = histogram[hour]
+        if score > 0:
+            interval = self._check_interval / score
+        else:
+            interval = self._max_interval
+        interval = min(max(interval, self._min_interval), self._max_interval)
+
+        # don't sleep past the start of a busy hour
+        next_hour = now.replace(minute=0, second=0, microsecond=0)
+        while True:
+            next_hour += timedelta(hours=1)
+            until = (next_hour - now).total_seconds()
+            if until >= interval:
+                break
+            if histogram[AdaptivePoller._hour_of_week(next_hour)] >= 1:
+                interval = max(until, self._min_interval)
+                break
+        return interval
+
+    def capturing_interval(self, growth: Optional[float], elapsed: float) -> float:
+        """
+        :param growth float:    Seconds that the video has grown since the last check (`None` if it didn't grow)
+        :param elapsed float:   Seconds since the last check
+        :return:                Seconds to wait until the next check of the video being captured
+        """
+        if not self._enabled:
+            return self._check_interval
+
+        if growth is None:
+            # maybe it has ended, maybe Twitch didn't update it yet; check again soon
+            return self._capture_min_interval
+        if not self._incremental_capture:
+            return self._check_interval # checking faster would only repeat the downloads
+        if growth >= 0.8*elapsed:
+            # the length is keeping up with the real time; we can check more often
+            self._capture_interval = max(self._capture_interval * 0.75, self._capture_min_interval)
+        else:
+            # Twitch updates it slower than we check; we're making useless petitions
+            self._capture_interval = min(self._capture_interval * 1.5, self._check_interval)
+        return self._capture_interval
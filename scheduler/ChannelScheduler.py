@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import math
+from typing import Any,Dict,List,TYPE_CHECKING
+if TYPE_CHECKING:
+    from TwitchDownloader import TwitchDownloader
+    from pipeline.PostProcessingPipeline import PostProcessingPipeline
+
+class ChannelScheduler:
+    """
+    Runs multiple channel downloaders on the same event loop.
+    The starts are staggered along `check_interval`, so the channels don't check for new videos at the same time.
+    Channels can be grouped, so the checks of the same group can be batched.
+    """
+    def __init__(self, downloaders: List['TwitchDownloader'], check_interval: float, pipeline: 'PostProcessingPipeline' = None, group_size: int = 1):
+        self._downloaders = downloaders
+        self._group_size = max(group_size, 1)
+        self._pipeline = pipeline # shared by all the downloaders; it will be run along with them
+        self._check_interval = check_interval
+        self.services = [] # run along with the channels (eg. the EventSub listener, that must call `on_stream_event`); they need `run` and `stop`
+        self._start = False
+
+    async def _run_staggered(self, downloader: 'TwitchDownloader', delay: float):
+        if delay > 0:
+            logging.debug(f"Delaying the start of the channel by {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+
+        if not self.started:
+            return # stopped while waiting
+        await downloader.run()
+
+    async def run(self):
+        if self.started:
+            raise Exception("Can't run the same instance twice!")
+        self._start = True
+
+        groups = max(math.ceil(len(self._downloaders) / self._group_size), 1)
+        step = self._check_interval / groups
+        tasks = [self._run_staggered(downloader, (n // self._group_size)*step) for n,downloader in enumerate(self._downloaders)]
+        if self._pipeline is not None:
+            tasks.append(self._pipeline.run())
+        tasks += [service.run() for service in self.services]
+        await asyncio.gather(*tasks)
+
+    def on_stream_event(self, type: str, event: Dict[str,Any]):
+        """
+        Forwards a `stream.online`/`stream.offline` notification to its channel
+        """
+        channel = event.get('broadcaster_user_login', '').lower()
+        for downloader in self._downloaders:
+            if downloader.channel_name.lower() != channel:
+                continue
+            if type == 'stream.online':
+                downloader.stream_online()
+            elif type == 'stream.offline':
+                downloader.stream_offline()
+            return
+        logging.debug(f"Got a {type} event of an unknown channel ({channel})")
+
+    @property
+    def started(self) -> bool:
+        return self._start
+
+    def stop(self):
+        self._start = False
+        for downloader in self._downloaders:
+            downloader.stop()
+        if self._pipeline is not None:
+            self._pipeline.stop()
+        for service in self.services:
+            service.stop()
@@ -0,0 +1,19 @@
+import asyncio
+
+class ResourceLimits:
+    """
+    Caps shared by all the channels, so they don't download (or reformat) all at the same time.
+    To never deadlock, they're always taken in the same order: `downloads`, then the storage reservations, then `ffmpeg_jobs`
+    (nobody waits for space while keeping an FFmpeg job).
+    """
+    def __init__(self, max_downloads: int = 1, max_ffmpeg_jobs: int = 1):
+        self._downloads = asyncio.Semaphore(max_downloads)
+        self._ffmpeg_jobs = asyncio.Semaphore(max_ffmpeg_jobs)
+
+    @property
+    def downloads(self) -> asyncio.Semaphore:
+        return self._downloads
+
+    @property
+    def ffmpeg_jobs(self) -> asyncio.Semaphore:
+        return self._ffmpeg_jobs
@@ -0,0 +1,38 @@
+import os
+import json
+from typing import Any
+
+class StateJournal:
+    """
+    Persists a state (of a channel, a queue, a download...), so it can be resumed after a restart.
+    Every save is written on a temporal file, synced and renamed; a crash leaves either the old or the new state.
+    """
+    def __init__(self, path: str):
+        self._path = path
+
+    def load(self) -> Any:
+        """
+        :return:    The last saved state, or `None` if there's no (valid) state
+        """
+        try:
+            with open(self._path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            return None # not even written once
+
+    def save(self, state: Any):
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+        # make the rename itself durable
+        fd = os.open(os.path.dirname(os.path.abspath(self._path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
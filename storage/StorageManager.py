@@ -0,0 +1,322 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from typing import Any,Dict,List,Optional
+from config.ConfigManager import ConfigProvider
+from scheduler.StateJournal import StateJournal
+from twitch_downloader.metrics.Metrics import Metrics
+
+class StorageFullException(Exception):
+    pass
+
+class _Reservation:
+    """
+    Space kept for a file while it's written; see `StorageManager.reserve`
+    """
+    def __init__(self, storage: 'StorageManager', folder: str, size: int, path: Optional[str]):
+        self._storage = storage
+        self._folder = folder
+        self.size = size
+        self.path = path
+        self.device = None
+        self.task = None # the one holding it; it can't wait for itself (eg. a reformat reserved inside a download)
+
+    @property
+    def pending(self) -> int:
+        """
+        Reserved bytes that are not written yet
+        """
+        written = 0
+        if self.path is not None and os.path.isfile(self.path):
+            written = os.path.getsize(self.path)
+        return max(self.size - written, 0)
+
+    async def __aenter__(self) -> '_Reservation':
+        await self._storage._acquire(self, self._folder)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._storage._release(self)
+        return False
+
+class StorageManager:
+    """
+    Owns the folders where the videos are written: temporal (downloads), staging (captures and post-processing),
+    final (saved videos) and archive (old videos, eg. on a cheaper disk).
+    Before writing a big file the space is reserved, so the concurrent downloads/remuxes don't fill the disk; and the saved videos
+    are removed (by age, total size and size by channel) and archived according to the retention policies.
+    Only the videos saved through `add` are managed; anything else on the folders is left alone.
+    """
+    # approximate bitrates (bits per second) of the Twitch qualities, to estimate the size of the downloads
+    QUALITY_BITRATES = {'160p': 300_000, '360p': 700_000, '480p': 1_500_000, '720p': 3_500_000, '1080p': 6_500_000}
+    SOURCE_BITRATE = 8_000_000
+    SIZE_MARGIN = 1.1
+
+    def __init__(self, config: ConfigProvider):
+        self._config = config
+        self._reservations = []
+        self._condition = None # created on the event loop
+        self._lock = None # retention and archive don't run at the same time
+        self._index = None # video ID -> {'channel', 'published', 'tier', 'files' (name -> size)}
+        self._journal = None
+        self._metrics = Metrics.default()
+        self._wake = None
+        self._start = False
+
+    @property
+    def temp_folder(self) -> str:
+        return self._config.temp_folder
+
+    @property
+    def staging_folder(self) -> str:
+        return self._config.work_folder
+
+    @property
+    def videos_folder(self) -> str:
+        return self._config.videos_folder
+
+    @property
+    def archive_folder(self) -> Optional[str]:
+        return self._config.archive_folder
+
+    def _tier_folder(self, tier: str) -> str:
+        return self.archive_folder if tier == 'archive' else self.videos_folder
+
+    @staticmethod
+    def _device(folder: str) -> int:
+        return os.stat(folder).st_dev
+
+    def setup(self):
+        """
+        Creates the folders, and makes every temporal file (also the ones of the commands, like twitch-dl) go into `temp_folder`
+        """
+        folders = [self.temp_folder, self.staging_folder, self.videos_folder] + ([] if self.archive_folder is None else [self.archive_folder])
+        for folder in folders:
+            Path(folder).mkdir(parents=True, exist_ok=True)
+
+        # the files are moved temp -> staging -> final; if they're on the same filesystem it's just a rename
+        for from_folder,to_folder in ((self.temp_folder, self.staging_folder), (self.staging_folder, self.videos_folder)):
+            if StorageManager._device(from_folder) != StorageManager._device(to_folder):
+                logging.warning(f"'{from_folder}' and '{to_folder}' are on different filesystems; the videos will be copied between them instead of renamed")
+
+        tempfile.tempdir = self.temp_folder
+        os.environ['TMPDIR'] = self.temp_folder
+
+        self._journal = StateJournal(os.path.join(self.staging_folder, 'storage.json'))
+        self._index = self._journal.load() or {}
+
+    @staticmethod
+    def estimate_size(quality: str, seconds: float) -> int:
+        """
+        :return:    Approximate bytes of `seconds` of video on a quality
+        """
+        quality = quality.lower()
+        bitrate = next((bitrate for name,bitrate in StorageManager.QUALITY_BITRATES.items() if quality.startswith(name)), StorageManager.SOURCE_BITRATE)
+        return int(bitrate / 8 * seconds * StorageManager.SIZE_MARGIN)
+
+    def reserve(self, folder: str, size: int, path: Optional[str] = None) -> _Reservation:
+        """
+        Keeps space on the disk of `folder` while a file is written:
+        `async with storage.reserve(workspace, size, path): ...`
+        If there's not enough space it waits for the other reservations (of the same disk) to end, after applying the retention
+        policies; it raises `StorageFullException` if there's nothing else to wait for.
+        :param size int:    Bytes that will be written
+        :param path str:    File being written (if known); the bytes already on it are not counted twice
+        """
+        return _Reservation(self, folder, size, path)
+
+    def _pending(self, device: int) -> int:
+        return sum(reservation.pending for reservation in self._reservations if reservation.device == device)
+
+    def _available(self, folder: str, device: int) -> int:
+        return shutil.disk_usage(folder).free - self._pending(device) - self._config.storage['min_free_space']
+
+    async def _acquire(self, reservation: _Reservation, folder: str):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        Path(folder).mkdir(parents=True, exist_ok=True)
+        device = StorageManager._device(folder)
+        reservation.task = asyncio.current_task()
+        enforced = False
+        while True:
+            async with self._condition:
+                while reservation.size > self._available(folder, device) and any(other.device == device and other.task is not reservation.task for other in self._reservations):
+                    logging.debug(f"Waiting for {reservation.size / 1024**3:.1f}GB to be available on '{folder}'")
+                    await self._condition.wait() # they'll end (and some of their space may be freed)
+
+                if reservation.size <= self._available(folder, device):
+                    reservation.device = device
+                    self._reservations.append(reservation)
+                    self._metrics.set('storage_reserved_bytes', self._pending(device), device=device)
+                    return
+                if enforced:
+                    self._metrics.inc('storage_full_total')
+                    raise StorageFullException(f"There's not enough space on '{folder}' for {reservation.size / 1024**3:.1f}GB "
+                                               f"({max(self._available(folder, device), 0) / 1024**3:.1f}GB available)")
+            # maybe some old videos can be removed
+            enforced = True
+            await self.enforce_retention()
+
+    async def _release(self, reservation: _Reservation):
+        async with self._condition:
+            self._reservations.remove(reservation)
+            self._metrics.set('storage_reserved_bytes', self._pending(reservation.device), device=reservation.device)
+            self._condition.notify_all()
+
+    def _save(self):
+        self._journal.save(self._index)
+
+    def add(self, channel: str, id: str, published: datetime, files: List[str]):
+        """
+        Registers a saved video, so the retention policies are applied to it.
+        :param files:   Names of its files (on `videos_folder`)
+        """
+        sizes = {name: os.path.getsize(os.path.join(self.videos_folder, name)) for name in files if os.path.isfile(os.path.join(self.videos_folder, name))}
+        self._index[id] = {'channel': channel, 'published': published.isoformat(), 'tier': 'videos', 'files': sizes}
+        self._save()
+        if self._wake is not None:
+            self._wake.set() # check the quotas
+
+    def _size(self, video: Dict[str,Any]) -> int:
+        return sum(video['files'].values())
+
+    def _remove(self, id: str, reason: str):
+        video = self._index.pop(id)
+        logging.info(f"Removing video {id} of {video['channel']} ({reason})")
+        for name in video['files']:
+            try:
+                os.remove(os.path.join(self._tier_folder(video['tier']), name))
+            except FileNotFoundError:
+                pass
+        self._metrics.inc('storage_removed_videos_total', reason=reason)
+        self._metrics.inc('storage_removed_bytes_total', self._size(video), reason=reason)
+
+    async def enforce_retention(self):
+        """
+        Removes the saved videos that are too old, or the oldest ones while the total size (or the size of its channel) is over the limit
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self._enforce_retention()
+
+    async def _enforce_retention(self):
+        policy = self._config.storage
+        oldest_first = sorted(self._index.items(), key=lambda item: item[1]['published'])
+        now = datetime.utcnow()
+
+        removed = {} # ID -> reason
+        if policy['max_age'] is not None:
+            removed.update({id: 'age' for id,video in oldest_first if (now - datetime.fromisoformat(video['published'])).total_seconds() > policy['max_age']})
+
+        sizes = {} # channel -> size
+        total = 0
+        for id,video in oldest_first:
+            if id in removed:
+                continue
+            sizes[video['channel']] = sizes.get(video['channel'], 0) + self._size(video)
+            total += self._size(video)
+        for id,video in oldest_first:
+            if id in removed:
+                continue
+            quota = policy['channel_quotas'].get(video['channel'], policy['channel_quota'])
+            if quota is not None and sizes[video['channel']] > quota:
+                reason = 'channel_quota'
+            elif policy['max_total_size'] is not None and total > policy['max_total_size']:
+                reason = 'total_size'
+            else:
+                continue
+            removed[id] = reason
+            sizes[video['channel']] -= self._size(video)
+            total -= self._size(video)
+
+        if len(removed) > 0:
+            await asyncio.get_event_loop().run_in_executor(None, lambda: [self._remove(id, reason) for id,reason in removed.items()])
+            self._save()
+            if self._condition is not None:
+                async with self._condition:
+                    self._condition.notify_all() # maybe now there's space
+        self._metrics.set('storage_videos_bytes', total)
+
+    def _archive(self, id: str) -> bool:
+        video = self._index[id]
+        size = self._size(video)
+        if shutil.disk_usage(self.archive_folder).free - size < self._config.storage['min_free_space']:
+            logging.warning(f"There's not enough space on '{self.archive_folder}' to archive video {id}")
+            return False
+        for name in video['files']:
+            from_path = os.path.join(self.videos_folder, name)
+            if os.path.isfile(from_path):
+                shutil.move(from_path, os.path.join(self.archive_folder, name)) # a copy if it's on another disk; interrupted ones are repeated
+        video['tier'] = 'archive'
+        self._save()
+        self._metrics.inc('storage_archived_videos_total')
+        return True
+
+    async def archive(self):
+        """
+        Moves the saved videos older than `archive_after` into `archive_folder`, one at a time
+        """
+        after = self._config.storage['archive_after']
+        if self.archive_folder is None or after is None:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        now = datetime.utcnow()
+        for id,video in sorted(self._index.items(), key=lambda item: item[1]['published']):
+            if not self.started:
+                return
+            if video['tier'] == 'videos' and (now - datetime.fromisoformat(video['published'])).total_seconds() > after:
+                logging.debug(f"Archiving video {id}")
+                async with self._lock:
+                    if id not in self._index:
+                        continue # removed meanwhile
+                    archived = await asyncio.get_event_loop().run_in_executor(None, self._archive, id)
+                if not archived:
+                    return
+
+    def _update_free_space(self):
+        for tier,folder in (('temp', self.temp_folder), ('staging', self.staging_folder), ('videos', self.videos_folder), ('archive', self.archive_folder)):
+            if folder is not None:
+                self._metrics.set('storage_free_bytes', shutil.disk_usage(folder).free, tier=tier)
+
+    async def run(self):
+        """
+        Applies the retention policies and archives the old videos every `check_interval` (and after each saved video)
+        """
+        if self.started:
+            raise Exception("Can't run the same instance twice!")
+        self._start = True
+        self._wake = asyncio.Event()
+        if self._index is None:
+            self.setup()
+
+        while self.started:
+            start = time.time()
+            try:
+                await self.enforce_retention()
+                await self.archive()
+                self._update_free_space()
+            except Exception as ex:
+                logging.error(ex, exc_info=True)
+            logging.debug(f"Storage checked in {time.time() - start:.1f}s")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._config.storage['check_interval'])
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    @property
+    def started(self) -> bool:
+        return self._start
+
+    def stop(self):
+        self._start = False
+        if self._wake is not None:
+            self._wake.set()
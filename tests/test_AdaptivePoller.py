@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime,timedelta
+from scheduler.AdaptivePoller import AdaptivePoller
+
+class AdaptivePollerTest(unittest.TestCase):
+    CHECK_INTERVAL = 600
+    MIN_INTERVAL = 180
+    MAX_INTERVAL = 7200
+    CAPTURE_MIN_INTERVAL = 240
+
+    def _poller(self, **kwargs) -> AdaptivePoller:
+        return AdaptivePoller(AdaptivePollerTest.CHECK_INTERVAL, AdaptivePollerTest.MIN_INTERVAL, AdaptivePollerTest.MAX_INTERVAL,
+                              AdaptivePollerTest.CAPTURE_MIN_INTERVAL, **kwargs)
+
+    @staticmethod
+    def _weekly(hour: int, weeks: int):
+        # streams every monday at `hour`
+        first = datetime(2022, 1, 3, hour, 5)
+        return [first + timedelta(weeks=n) for n in range(weeks)]
+
+    def test_not_enough_history(self):
+        poller = self._poller(history=AdaptivePollerTest._weekly(18, AdaptivePoller.MIN_HISTORY - 1))
+        self.assertEqual(poller.waiting_interval(datetime(2022, 3, 7, 18, 0)), AdaptivePollerTest.CHECK_INTERVAL)
+
+    def test_disabled(self):
+        poller = self._poller(enabled=False, history=AdaptivePollerTest._weekly(18, 10))
+        self.assertEqual(poller.waiting_interval(datetime(2022, 3, 7, 18, 0)), AdaptivePollerTest.CHECK_INTERVAL)
+        self.assertEqual(poller.capturing_interval(600, 600), AdaptivePollerTest.CHECK_INTERVAL)
+        self.assertEqual(poller.stall_timeout, 0)
+
+    def test_waiting_interval(self):
+        poller = self._poller(history=AdaptivePollerTest._weekly(18, 10))
+        # around the usual start it checks often
+        self.assertEqual(poller.waiting_interval(datetime(2022, 3, 14, 18, 10)), AdaptivePollerTest.MIN_INTERVAL)
+        # on quiet hours it waits the most...
+        self.assertEqual(poller.waiting_interval(datetime(2022, 3, 16, 3, 0)), AdaptivePollerTest.MAX_INTERVAL)
+        # ...but it doesn't sleep past the start of a busy hour
+        self.assertEqual(poller.waiting_interval(datetime(2022, 3, 14, 16, 30)), 30*60)
+
+    def test_record_start(self):
+        poller = self._poller()
+        for published in AdaptivePollerTest._weekly(18, AdaptivePoller.MAX_HISTORY + 10):
+            poller.record_start(published)
+            poller.record_start(published) # repeated ones are ignored
+        self.assertEqual(len(poller.history), AdaptivePoller.MAX_HISTORY)
+
+    def test_capturing_interval(self):
+        poller = self._poller()
+        # the video keeps up with the real time: the interval shrinks down to the minimum
+        intervals = [poller.capturing_interval(600, 600) for _ in range(5)]
+        self.assertEqual(intervals[:2], [450, 337.5])
+        self.assertEqual(intervals[-1], AdaptivePollerTest.CAPTURE_MIN_INTERVAL)
+        # Twitch updates it slower than we check: it grows back up to `check_interval`
+        intervals = [poller.capturing_interval(10, 240) for _ in range(5)]
+        self.assertEqual(intervals[0], 360)
+        self.assertEqual(intervals[-1], AdaptivePollerTest.CHECK_INTERVAL)
+        # it didn't grow: check again soon
+        self.assertEqual(poller.capturing_interval(None, 600), AdaptivePollerTest.CAPTURE_MIN_INTERVAL)
+
+    def test_capturing_interval_rotation(self):
+        # each check downloads the whole video; it's never checked more often than `check_interval`
+        poller = self._poller(incremental_capture=False)
+        self.assertEqual([poller.capturing_interval(600, 600) for _ in range(3)], [AdaptivePollerTest.CHECK_INTERVAL]*3)
+
+if __name__ == '__main__':
+    unittest.main()
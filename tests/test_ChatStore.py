@@ -0,0 +1,65 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from twitch_downloader.chat.ChatStore import ChatStore
+
+class ChatStoreTest(unittest.TestCase):
+    USERS = ['alice', 'bob', 'carol']
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, '1.tcs')
+        self.comments = [{'id': f'message-{n}', 'offset': n * 0.5, 'created': f'2022-01-31T18:{n // 120:02d}:{n // 2 % 60:02d}.{n % 2 * 5}00Z',
+                          'user': ChatStoreTest.USERS[(n + n // 7) % 3], 'display': ChatStoreTest.USERS[(n + n // 7) % 3].title(),
+                          'color': None if (n + n // 7) % 3 == 2 else '#FF0000', 'text': f'message {n} ñ'} for n in range(500)]
+        ChatStore.build(iter(self.comments), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_files(self):
+        self.assertEqual(sorted(os.listdir(self.folder)), sorted(os.path.basename(path) for path in ChatStore.files(self.path)))
+
+    def test_read(self):
+        with ChatStore(self.path) as store:
+            self.assertEqual(len(store), len(self.comments))
+            self.assertEqual(list(store), self.comments)
+
+    def test_between(self):
+        with ChatStore(self.path) as store:
+            self.assertEqual(list(store.between(10, 20)), [comment for comment in self.comments if 10 <= comment['offset'] < 20])
+            self.assertEqual(list(store.between(1000)), [])
+
+    def test_from_user(self):
+        with ChatStore(self.path) as store:
+            for user in ChatStoreTest.USERS:
+                self.assertEqual(list(store.from_user(user)), [comment for comment in self.comments if comment['user'] == user])
+                self.assertEqual(list(store.from_user(user, 10.5, 100)),
+                                 [comment for comment in self.comments if comment['user'] == user and 10.5 <= comment['offset'] < 100])
+            self.assertEqual(list(store.from_user('nobody')), [])
+
+    def test_export_json(self):
+        out = io.StringIO()
+        with ChatStore(self.path) as store:
+            store.export('json', out, 0, 5)
+        # the IDs and creation times are kept
+        self.assertEqual(json.loads(out.getvalue()), [comment for comment in self.comments if comment['offset'] < 5])
+
+    def test_empty(self):
+        ChatStore.build(iter([]), self.path)
+        with ChatStore(self.path) as store:
+            self.assertEqual(len(store), 0)
+            self.assertEqual(list(store.between()), [])
+            self.assertEqual(list(store.from_user('alice')), [])
+
+    def test_not_a_store(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'something else')
+        with self.assertRaises(ValueError):
+            ChatStore(self.path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import hmac
+import json
+import asyncio
+import unittest
+import urllib.error
+import urllib.request
+from datetime import datetime,timedelta
+from twitch_downloader.api.EventSubListener import EventSubListener
+
+class EventSubListenerTest(unittest.IsolatedAsyncioTestCase):
+    SECRET = 's3cret'
+
+    async def asyncSetUp(self):
+        self.events = []
+        self.listener = EventSubListener(EventSubListenerTest.SECRET, lambda type,event: self.events.append((type, event)), '127.0.0.1', 0)
+        self.task = asyncio.ensure_future(self.listener.run())
+        while self.listener.port is None:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.listener.stop()
+        await asyncio.wait_for(self.task, 5)
+
+    def _post_sync(self, message_type: str, body: bytes, message_id: str, timestamp: str, secret: str, path: str):
+        request = urllib.request.Request(f'http://127.0.0.1:{self.listener.port}{path}', body, method='POST', headers={
+            'Twitch-Eventsub-Message-Id': message_id,
+            'Twitch-Eventsub-Message-Timestamp': timestamp,
+            'Twitch-Eventsub-Message-Type': message_type,
+            'Twitch-Eventsub-Message-Signature': EventSubListener.sign(secret, message_id, timestamp, body)})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as ex:
+            return ex.code, ''
+
+    async def _post(self, message_type: str, message, message_id: str = 'id-1', timestamp: datetime = None, secret: str = SECRET, path: str = '/eventsub'):
+        # Twitch sends the timestamps with nanoseconds
+        timestamp = (datetime.utcnow() if timestamp is None else timestamp).isoformat() + '123Z'
+        return await asyncio.get_event_loop().run_in_executor(None, self._post_sync, message_type, json.dumps(message).encode(),
+                                                              message_id, timestamp, secret, path)
+
+    @staticmethod
+    def _notification(type: str, login: str):
+        return {'subscription': {'type': type}, 'event': {'broadcaster_user_login': login}}
+
+    async def test_challenge(self):
+        status,body = await self._post('webhook_callback_verification', {'challenge': 'abc', 'subscription': {'type': 'stream.online'}})
+        self.assertEqual(status, 200)
+        self.assertEqual(body, 'abc')
+        self.assertEqual(self.events, [])
+
+    async def test_notification(self):
+        status,_ = await self._post('notification', EventSubListenerTest._notification('stream.online', 'abc'))
+        self.assertEqual(status, 204)
+        self.assertEqual(self.events, [('stream.online', {'broadcaster_user_login': 'abc'})])
+
+    async def test_bad_signature(self):
+        status,_ = await self._post('notification', EventSubListenerTest._notification('stream.online', 'abc'), secret='other')
+        self.assertEqual(status, 403)
+        self.assertEqual(self.events, [])
+
+    async def test_old_message(self):
+        status,_ = await self._post('notification', EventSubListenerTest._notification('stream.online', 'abc'),
+                                    timestamp=datetime.utcnow() - 2*EventSubListener.MAX_MESSAGE_AGE)
+        self.assertEqual(status, 403)
+        self.assertEqual(self.events, [])
+
+    async def test_replay(self):
+        message = EventSubListenerTest._notification('stream.offline', 'abc')
+        self.assertEqual((await self._post('notification', message, 'id-1'))[0], 204)
+        self.assertEqual((await self._post('notification', message, 'id-1'))[0], 204)
+        self.assertEqual(len(self.events), 1)
+        await self._post('notification', message, 'id-2')
+        self.assertEqual(len(self.events), 2)
+
+    async def test_revocation(self):
+        status,_ = await self._post('revocation', {'subscription': {'type': 'stream.online', 'status': 'authorization_revoked'}})
+        self.assertEqual(status, 204)
+        self.assertEqual(self.events, [])
+
+    async def test_wrong_path(self):
+        status,_ = await self._post('notification', EventSubListenerTest._notification('stream.online', 'abc'), path='/other')
+        self.assertEqual(status, 404)
+        self.assertEqual(self.events, [])
+
+class SignatureTest(unittest.TestCase):
+    def test_sign(self):
+        # HMAC-SHA256 of the message ID + timestamp + body, as documented by Twitch
+        self.assertEqual(EventSubListener.sign('secret', 'id', '2022-01-31T18:03:51.123456789Z', b'{}'),
+                         'sha256=' + hmac.new(b'secret', b'id2022-01-31T18:03:51.123456789Z{}', 'sha256').hexdigest())
+
+    def test_parse_timestamp(self):
+        self.assertEqual(EventSubListener._parse_timestamp('2022-01-31T18:03:51.123456789Z'), datetime(2022, 1, 31, 18, 3, 51, 123456))
+        self.assertEqual(EventSubListener._parse_timestamp('2022-01-31T18:03:51Z'), datetime(2022, 1, 31, 18, 3, 51))
+
+    def test_verify(self):
+        listener = EventSubListener('secret', lambda type,event: None)
+        timestamp = datetime.utcnow().isoformat() + 'Z'
+        headers = {'twitch-eventsub-message-id': 'id', 'twitch-eventsub-message-timestamp': timestamp,
+                   'twitch-eventsub-message-signature': EventSubListener.sign('secret', 'id', timestamp, b'{}')}
+        self.assertTrue(listener._verify(headers, b'{}'))
+        self.assertFalse(listener._verify(headers, b'{"changed": 1}'))
+        self.assertFalse(listener._verify({**headers, 'twitch-eventsub-message-id': 'other'}, b'{}'))
+        self.assertFalse(listener._verify({key: value for key,value in headers.items() if key != 'twitch-eventsub-message-signature'}, b'{}'))
+        old = (datetime.utcnow() - timedelta(hours=1)).isoformat() + 'Z'
+        self.assertFalse(listener._verify({**headers, 'twitch-eventsub-message-timestamp': old,
+                                           'twitch-eventsub-message-signature': EventSubListener.sign('secret', 'id', old, b'{}')}, b'{}'))
+
+if __name__ == '__main__':
+    unittest.main()
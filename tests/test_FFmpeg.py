@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from twitch_downloader.FFmpeg import FFmpeg
+
+class FFmpegTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.commands = []
+        async def run(operation, out_path, *args):
+            self.commands.append((operation, list(args)))
+            with open(out_path, 'wb') as f:
+                f.write(b'video')
+        async def probe(path):
+            return {'format': {'duration': '60.0' if 'start' in path else '120.0'},
+                    'streams': [{'index': 0, 'codec_type': 'video', 'codec_name': 'h264'}, {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac'}]}
+        self._run = FFmpeg._run
+        self._probe = FFmpeg.probe
+        FFmpeg._run = staticmethod(run)
+        FFmpeg.probe = staticmethod(probe)
+        self.folder = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.folder) # the outputs with relative paths
+
+    async def asyncTearDown(self):
+        FFmpeg._run = staticmethod(self._run)
+        FFmpeg.probe = staticmethod(self._probe)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    async def test_merge(self):
+        await FFmpeg.merge(os.path.join(self.folder, 'start.ts'), os.path.join(self.folder, 'full.ts'), os.path.join(self.folder, '1.mp4'))
+        # joined into a mkv first, whatever the output container is
+        self.assertEqual([(operation, args[-1]) for operation,args in self.commands],
+                         [('merge', os.path.join(self.folder, '1.merge.mkv')), ('remux', os.path.join(self.folder, '1.mp4'))])
+        self.assertEqual(os.listdir(self.folder), ['1.mp4'])
+
+    async def test_merge_mkv(self):
+        await FFmpeg.merge(os.path.join(self.folder, 'start.ts'), os.path.join(self.folder, 'full.ts'), os.path.join(self.folder, '1.mkv'))
+        self.assertEqual([(operation, args[-1]) for operation,args in self.commands], [('merge', os.path.join(self.folder, '1.mkv'))])
+
+    async def test_renditions(self):
+        # 'mkv' is the default `output_format`
+        await FFmpeg.renditions('1.mkv', [{'path': '1.mobile.mkv', 'height': 360, 'video_bitrate': '800k'},
+                                          {'path': '1.low.mp4', 'height': 160}], 'veryfast')
+        operation,args = self.commands[0]
+        self.assertEqual(operation, 'renditions')
+        self.assertEqual(args[args.index('-filter_complex') + 1], '[0:v:0]split=2[in0][in1];[in0]scale=-2:360[out0];[in1]scale=-2:160[out1]')
+        mkv = args[args.index('[out0]') - 1:args.index('1.mobile.mkv')]
+        self.assertEqual(mkv, ['-map', '[out0]', '-map', '0:a:0?', '-c:v', 'libx264', '-c:a', 'aac', '-preset', 'veryfast', '-b:v', '800k'])
+        self.assertEqual(args[-3:], ['-movflags', '+faststart', '1.low.mp4'])
+
+    async def test_renditions_unsupported_container(self):
+        with self.assertRaises(ValueError):
+            await FFmpeg.renditions('1.mkv', [{'path': '1.mobile.avi', 'height': 360}])
+
+if __name__ == '__main__':
+    unittest.main()
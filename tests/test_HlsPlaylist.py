@@ -0,0 +1,77 @@
+import unittest
+from datetime import datetime
+from twitch_downloader.hls.HlsPlaylist import HlsPlaylist
+
+class HlsPlaylistTest(unittest.TestCase):
+    VOD = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:10
+#EXT-X-MEDIA-SEQUENCE:0
+#EXTINF:10.000,
+0.ts
+#EXTINF:10.000,
+1-muted.ts
+
+#EXT-X-DISCONTINUITY
+#EXTINF:4.5,
+2-unmuted.ts
+#EXT-X-ENDLIST
+"""
+    LIVE = """#EXTM3U
+#EXT-X-TARGETDURATION:2
+#EXT-X-MEDIA-SEQUENCE:120
+#EXT-X-PROGRAM-DATE-TIME:2022-01-31T18:03:51.123Z
+#EXTINF:2.000,live
+https://cdn.example.com/a.ts
+#EXTINF:2.000,Amazon
+https://cdn.example.com/ad.ts
+"""
+    MASTER = """#EXTM3U
+#EXT-X-MEDIA:TYPE=VIDEO,GROUP-ID="chunked",NAME="1080p60 (source)",AUTOSELECT=YES,DEFAULT=YES
+#EXT-X-STREAM-INF:BANDWIDTH=8000000,RESOLUTION=1920x1080,VIDEO="chunked"
+https://cdn.example.com/chunked/index-dvr.m3u8
+#EXT-X-MEDIA:TYPE=VIDEO,GROUP-ID="720p60",NAME="720p60",AUTOSELECT=YES,DEFAULT=YES
+#EXT-X-STREAM-INF:BANDWIDTH=3000000,RESOLUTION=1280x720,VIDEO="720p60"
+720p60/index-dvr.m3u8
+#EXT-X-MEDIA:TYPE=VIDEO,GROUP-ID="480p30",NAME="480p",AUTOSELECT=YES,DEFAULT=YES
+#EXT-X-STREAM-INF:BANDWIDTH=1400000,RESOLUTION=852x480,VIDEO="480p30"
+480p30/index-dvr.m3u8
+"""
+
+    def test_parse_vod(self):
+        playlist = HlsPlaylist.parse(HlsPlaylistTest.VOD, 'https://cdn.example.com/v/chunked/index-dvr.m3u8')
+        self.assertTrue(playlist.ended)
+        self.assertEqual(playlist.target_duration, 10)
+        self.assertEqual([segment.index for segment in playlist.segments], [0, 1, 2])
+        self.assertEqual(playlist.segments[1].uri, 'https://cdn.example.com/v/chunked/1-muted.ts')
+        self.assertEqual([segment.muted for segment in playlist.segments], [False, True, False])
+        self.assertEqual([segment.discontinuity for segment in playlist.segments], [False, False, True])
+        self.assertAlmostEqual(playlist.duration, 24.5)
+
+    def test_parse_live(self):
+        playlist = HlsPlaylist.parse(HlsPlaylistTest.LIVE, 'https://cdn.example.com/live.m3u8')
+        self.assertFalse(playlist.ended)
+        self.assertEqual(playlist.media_sequence, 120)
+        # the live segments are numbered by the media sequence
+        self.assertEqual([segment.index for segment in playlist.segments], [120, 121])
+        self.assertEqual(playlist.segments[0].program_date_time, datetime(2022, 1, 31, 18, 3, 51, 123000))
+        self.assertIsNone(playlist.segments[1].program_date_time)
+        self.assertEqual([segment.ad for segment in playlist.segments], [False, True])
+
+    def test_parse_master(self):
+        playlists = HlsPlaylist.parse_master(HlsPlaylistTest.MASTER, 'https://cdn.example.com/master.m3u8')
+        self.assertEqual(playlists['chunked'], 'https://cdn.example.com/chunked/index-dvr.m3u8')
+        self.assertEqual(playlists['1080p60 (source)'], playlists['chunked'])
+        self.assertEqual(playlists['720p60'], 'https://cdn.example.com/720p60/index-dvr.m3u8')
+        self.assertEqual(playlists['480p'], playlists['480p30'])
+
+    def test_select_quality(self):
+        playlists = HlsPlaylist.parse_master(HlsPlaylistTest.MASTER, 'https://cdn.example.com/master.m3u8')
+        self.assertEqual(HlsPlaylist.select_quality(playlists, 'source'), playlists['chunked'])
+        self.assertEqual(HlsPlaylist.select_quality(playlists, '720p'), playlists['720p60'])
+        self.assertEqual(HlsPlaylist.select_quality(playlists, '480p30'), playlists['480p30'])
+        self.assertEqual(HlsPlaylist.select_quality(playlists, '1080p60'), playlists['chunked'])
+        self.assertIsNone(HlsPlaylist.select_quality(playlists, '160p'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+from config.ConfigManager import JsonConfig
+from scheduler.ResourceLimits import ResourceLimits
+from storage.StorageManager import StorageManager
+from pipeline.PostProcessingPipeline import PostProcessingPipeline
+from twitch_downloader.AsyncVideoDownloader import AsyncVideoDownloader
+from twitch_downloader.factory.TwitchDownloaderFactory import TwitchDownloaderFactory
+from twitch_downloader.video.HlsVideoDownloader import HlsVideoDownloader
+
+class StubDownloaderFactory(TwitchDownloaderFactory):
+    def build(self) -> AsyncVideoDownloader:
+        return AsyncVideoDownloader()
+
+class HlsVideoDownloaderTest(unittest.IsolatedAsyncioTestCase):
+    DISK_SIZE = 1000
+
+    async def asyncSetUp(self):
+        self._tempdir = tempfile.tempdir
+        self._tmpdir_env = os.environ.get('TMPDIR')
+        self.folder = tempfile.mkdtemp()
+        with open(os.path.join(self.folder, 'config.json'), 'w') as f:
+            json.dump({**JsonConfig._get_defaults(), 'work_folder': 'work', 'videos_folder': 'videos'}, f)
+        self.config = JsonConfig(os.path.join(self.folder, 'config.json'))
+        self.config.read()
+        self.storage = StorageManager(self.config)
+        self.storage.setup()
+        # a small disk
+        self.storage._available = lambda folder, device: HlsVideoDownloaderTest.DISK_SIZE - self.storage._pending(device)
+        self.limits = ResourceLimits()
+
+        self.remuxes = []
+        async def move_and_reformat(from_path: str, to_path: str, preset = None):
+            self.remuxes.append(os.path.basename(to_path))
+            os.replace(from_path, to_path)
+        self._move_and_reformat = AsyncVideoDownloader.move_and_reformat
+        AsyncVideoDownloader.move_and_reformat = staticmethod(move_and_reformat)
+
+    async def asyncTearDown(self):
+        AsyncVideoDownloader.move_and_reformat = staticmethod(self._move_and_reformat)
+        tempfile.tempdir = self._tempdir
+        if self._tmpdir_env is None:
+            os.environ.pop('TMPDIR', None)
+        else:
+            os.environ['TMPDIR'] = self._tmpdir_env
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _downloader(self) -> HlsVideoDownloader:
+        downloader = HlsVideoDownloader(limits=self.limits, storage=self.storage)
+        def download(id: str, quality: str, ts_path: str):
+            with open(ts_path, 'wb') as f:
+                f.write(b'x' * 100)
+        downloader._download = download
+        return downloader
+
+    async def test_reformat(self):
+        out_path = os.path.join(self.storage.staging_folder, '1.mkv')
+        await self._downloader().download('1', 'source', out_path)
+        self.assertEqual(self.remuxes, ['1.mkv'])
+        self.assertTrue(os.path.isfile(out_path))
+        self.assertFalse(os.path.isfile(os.path.join(self.storage.staging_folder, '1.download.ts')))
+
+    async def test_no_deadlock(self):
+        # a capture remuxes its download while the pipeline waits for space for another remux
+        pipeline = PostProcessingPipeline(self.config, StubDownloaderFactory(), self.limits, self.storage)
+        waiting = asyncio.Event()
+        from_path = os.path.join(self.storage.staging_folder, '2.ts')
+        with open(from_path, 'wb') as f:
+            f.write(b'x' * 500)
+
+        async def capture():
+            async with self.limits.downloads, self.storage.reserve(self.storage.staging_folder, 600):
+                waiting.set()
+                await asyncio.sleep(0.05) # the remux is waiting for space
+                await self._downloader().download('1', 'source', os.path.join(self.storage.staging_folder, '1.mkv'))
+
+        async def remux():
+            await waiting.wait()
+            await pipeline._move_and_reformat(from_path, os.path.join(self.storage.staging_folder, '2.mkv'))
+
+        await asyncio.wait_for(asyncio.gather(capture(), remux()), 5)
+        self.assertEqual(self.remuxes, ['1.mkv', '2.mkv'])
+
+if __name__ == '__main__':
+    unittest.main()
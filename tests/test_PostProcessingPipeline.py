@@ -0,0 +1,183 @@
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime
+from config.ConfigManager import JsonConfig
+from scheduler.ResourceLimits import ResourceLimits
+from storage.StorageManager import StorageManager,StorageFullException
+from pipeline.PostProcessingPipeline import PostProcessingPipeline
+from twitch_downloader.AsyncVideoDownloader import AsyncVideoDownloader
+from twitch_downloader.factory.TwitchDownloaderFactory import TwitchDownloaderFactory
+
+class StubVideoDownloader(AsyncVideoDownloader):
+    async def get_info(self, id_or_url: str):
+        return {}
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        with open(out_path, 'wb') as f:
+            f.write(b'video')
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        with open(out_path, 'w') as f:
+            f.write('chat')
+
+class StubDownloaderFactory(TwitchDownloaderFactory):
+    def build(self) -> AsyncVideoDownloader:
+        return StubVideoDownloader()
+
+class FailingReservation:
+    def __init__(self, ex: Exception):
+        self._ex = ex
+
+    async def __aenter__(self):
+        raise self._ex
+
+    async def __aexit__(self, *exc):
+        return False
+
+class PostProcessingPipelineTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tempdir = tempfile.tempdir
+        self._tmpdir_env = os.environ.get('TMPDIR')
+        self.folder = tempfile.mkdtemp()
+        with open(os.path.join(self.folder, 'config.json'), 'w') as f:
+            json.dump({**JsonConfig._get_defaults(), 'work_folder': 'work', 'videos_folder': 'videos', 'chat_store': False}, f)
+        self.config = JsonConfig(os.path.join(self.folder, 'config.json'))
+        self.config.read()
+        self.storage = StorageManager(self.config)
+        self.storage.setup()
+        self.retry_delay = PostProcessingPipeline.RETRY_DELAY
+        PostProcessingPipeline.RETRY_DELAY = 0.01
+        self.pipeline = None
+        self.task = None
+
+    async def asyncTearDown(self):
+        self._stop()
+        await asyncio.sleep(0)
+        PostProcessingPipeline.RETRY_DELAY = self.retry_delay
+        tempfile.tempdir = self._tempdir
+        if self._tmpdir_env is None:
+            os.environ.pop('TMPDIR', None)
+        else:
+            os.environ['TMPDIR'] = self._tmpdir_env
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _start(self):
+        self.pipeline = PostProcessingPipeline(self.config, StubDownloaderFactory(), ResourceLimits(), self.storage)
+        self.task = asyncio.ensure_future(self.pipeline.run())
+
+    def _stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def _fail_reservations(self, ex: Exception):
+        self.attempts = 0
+        def reserve(*args, **kwargs):
+            self.attempts += 1
+            return FailingReservation(ex)
+        self.storage.reserve = reserve
+
+    async def _wait(self, condition, timeout: float = 5):
+        for _ in range(int(timeout / 0.01)):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("Timed out")
+
+    def _jobs(self):
+        return self.pipeline._work_queue.jobs
+
+    async def test_publish(self):
+        self._start()
+        await self.pipeline.submit('channel', '1', datetime.utcnow(), os.path.join(self.folder, 'nothing'))
+        await self._wait(lambda: len(self._jobs()) == 0)
+        self.assertEqual(sorted(os.listdir(self.storage.videos_folder)), ['1.mkv', '1.srt'])
+        self.assertFalse(os.path.exists(os.path.join(self.storage.staging_folder, '1')))
+
+    async def test_failed_stage(self):
+        self._start()
+        attempts = []
+        async def remux(job):
+            attempts.append(job['id'])
+            raise Exception("ffmpeg error")
+        self.pipeline._remux = remux
+        await self.pipeline.submit('channel', '1', datetime.utcnow(), os.path.join(self.folder, 'nothing'))
+        await self._wait(lambda: any(job.get('failed', False) for job in self._jobs()))
+
+        # it never goes past the failed stage, and nothing is published or removed
+        self.assertEqual(len(attempts), PostProcessingPipeline.RETRIES + 1)
+        self.assertEqual(self._jobs()[0]['stage'], 'remux')
+        self.assertEqual(os.listdir(self.storage.videos_folder), [])
+        self.assertTrue(os.path.isfile(os.path.join(self.storage.staging_folder, '1', '1.final.mkv')))
+
+        # it's tried again on the next run
+        self._stop()
+        await self.task
+        self._start()
+        await self._wait(lambda: len(self._jobs()) == 0)
+        self.assertEqual(sorted(os.listdir(self.storage.videos_folder)), ['1.mkv', '1.srt'])
+
+    async def test_failed_capture(self):
+        # the final video can't be downloaded (eg. it was removed); the most complete temporal is kept
+        self._fail_reservations(OSError("video not found"))
+        capture = os.path.join(self.folder, 'capture')
+        os.makedirs(capture)
+        for name in ('1.1.mkv', '1.2.mkv'):
+            with open(os.path.join(capture, name), 'wb') as f:
+                f.write(name.encode())
+        self._start()
+        await self.pipeline.submit('channel', '1', datetime.utcnow(), capture)
+        await self._wait(lambda: len(self._jobs()) == 0)
+        self.assertEqual(self.attempts, PostProcessingPipeline.RETRIES + 1)
+        self.assertEqual(sorted(os.listdir(self.storage.videos_folder)), ['1.srt', 'start_1.mkv'])
+        with open(os.path.join(self.storage.videos_folder, 'start_1.mkv'), 'rb') as f:
+            self.assertEqual(f.read(), b'1.2.mkv')
+
+    async def test_storage_full(self):
+        self._fail_reservations(StorageFullException("no space"))
+        self._start()
+        await self.pipeline.submit('channel', '1', datetime.utcnow(), os.path.join(self.folder, 'nothing'))
+        await self._wait(lambda: self.attempts > PostProcessingPipeline.RETRIES + 1)
+
+        # it waits for space; it's not a failure of the job
+        self.assertFalse(self._jobs()[0].get('failed', False))
+        self.assertEqual(self._jobs()[0]['stage'], 'capture')
+        del self.storage.reserve
+        await self._wait(lambda: len(self._jobs()) == 0)
+        self.assertEqual(sorted(os.listdir(self.storage.videos_folder)), ['1.mkv', '1.srt'])
+
+    async def test_failed_renditions(self):
+        self._start()
+        async def renditions(job):
+            raise Exception("ffmpeg error")
+        self.pipeline._renditions = renditions
+        await self.pipeline.submit('channel', '1', datetime.utcnow(), os.path.join(self.folder, 'nothing'))
+        await self._wait(lambda: len(self._jobs()) == 0)
+        # the video is published without them
+        self.assertEqual(sorted(os.listdir(self.storage.videos_folder)), ['1.mkv', '1.srt'])
+
+    async def test_failed_chat(self):
+        self._start()
+        async def chat(job):
+            raise Exception("chat not available")
+        self.pipeline._chat = chat
+        await self.pipeline.submit('channel', '1', datetime.utcnow(), os.path.join(self.folder, 'nothing'))
+        await self._wait(lambda: len(self._jobs()) == 0)
+        self.assertEqual(os.listdir(self.storage.videos_folder), ['1.mkv'])
+
+    async def test_missing_output(self):
+        self._start()
+        self.pipeline._chat = self._chat_without_file
+        await self.pipeline.submit('channel', '1', datetime.utcnow(), os.path.join(self.folder, 'nothing'))
+        await self._wait(lambda: any(job['stage'] == 'publish' and 'error' in job for job in self._jobs()))
+        # the workspace is kept until all the outputs are there
+        self.assertTrue(os.path.isdir(os.path.join(self.storage.staging_folder, '1')))
+
+    async def _chat_without_file(self, job):
+        job['outputs'].append('1.srt')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from typing import BinaryIO
+from twitch_downloader.hls.SegmentDownloader import SegmentDownloader
+
+class StubClient:
+    """
+    Serves a playlist of `segments` segments; the ones on `failing` always fail
+    """
+    def __init__(self, segments: int):
+        self.segments = segments
+        self.failing = set()
+        self.downloaded = []
+        self._lock = threading.Lock()
+
+    def get_text(self, url: str) -> str:
+        return '#EXTM3U\n#EXT-X-TARGETDURATION:10\n' + ''.join(f'#EXTINF:10.0,\n{n}.ts\n' for n in range(self.segments)) + '#EXT-X-ENDLIST\n'
+
+    def download(self, url: str, out: BinaryIO) -> int:
+        n = int(url.rsplit('/', 1)[1].split('.')[0])
+        if n in self.failing:
+            raise IOError(f"Segment {n} not found")
+        with self._lock:
+            self.downloaded.append(n)
+        return out.write(StubClient.data(n))
+
+    @staticmethod
+    def data(n: int) -> bytes:
+        return f'[{n}]'.encode() * 100
+
+class SegmentDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.out_path = os.path.join(self.folder, 'video.ts')
+        self.part_path = self.out_path + '.part'
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _download(self, client: StubClient):
+        SegmentDownloader(client, connections=4, retries=2, backoff=0).download('http://localhost/playlist.m3u8', self.out_path)
+
+    def _read(self) -> bytes:
+        with open(self.out_path, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        client = StubClient(20)
+        self._download(client)
+        # the segments are written in order, whatever the order they were downloaded in
+        self.assertEqual(self._read(), b''.join(StubClient.data(n) for n in range(20)))
+        self.assertEqual(os.listdir(self.folder), ['video.ts'])
+
+    def test_resume(self):
+        client = StubClient(20)
+        client.failing = {3, 7}
+        with self.assertRaises(IOError):
+            self._download(client)
+
+        # the index has the rest of them
+        with open(SegmentDownloader.index_path(self.part_path), 'r') as f:
+            index = json.load(f)
+        self.assertEqual(index['segments'], 20)
+        self.assertEqual(sorted(int(n) for n in index['entries']), [n for n in range(20) if n not in (3, 7)])
+        bitmap = bytes.fromhex(index['bitmap'])
+        self.assertEqual([n for n in range(20) if bitmap[n // 8] & (1 << (n % 8))], [n for n in range(20) if n not in (3, 7)])
+
+        # only the missing ones are downloaded again
+        client.failing = set()
+        client.downloaded = []
+        self._download(client)
+        self.assertEqual(sorted(client.downloaded), [3, 7])
+        self.assertEqual(self._read(), b''.join(StubClient.data(n) for n in range(20)))
+        self.assertEqual(os.listdir(self.folder), ['video.ts'])
+
+    def test_truncated_part(self):
+        client = StubClient(10)
+        client.failing = {9}
+        with self.assertRaises(IOError):
+            self._download(client)
+
+        # the last written segment didn't get to the disk
+        entries = SegmentDownloader._load_index(self.part_path, 10)
+        last = max(entries, key=lambda n: entries[n][0])
+        with open(self.part_path, 'r+b') as f:
+            f.truncate(entries[last][0] + entries[last][1] - 1)
+
+        client.failing = set()
+        client.downloaded = []
+        self._download(client)
+        self.assertEqual(sorted(client.downloaded), sorted([last, 9]))
+        self.assertEqual(self._read(), b''.join(StubClient.data(n) for n in range(10)))
+
+    def test_playlist_changed(self):
+        client = StubClient(10)
+        client.failing = {9}
+        with self.assertRaises(IOError):
+            self._download(client)
+
+        # a different playlist can't use the previous index
+        client = StubClient(12)
+        self._download(client)
+        self.assertEqual(sorted(client.downloaded), list(range(12)))
+        self.assertEqual(self._read(), b''.join(StubClient.data(n) for n in range(12)))
+
+if __name__ == '__main__':
+    unittest.main()
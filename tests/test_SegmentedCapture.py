@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import unittest
+from twitch_downloader.hls.SegmentedCapture import SegmentedCapture
+from twitch_downloader.hls.SegmentManifest import SegmentManifest
+
+class SegmentedCaptureTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.segments_folder = os.path.join(self.folder, 'segments')
+        os.makedirs(self.segments_folder)
+        self.out_path = os.path.join(self.folder, '1.ts')
+
+    async def asyncTearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    async def test_compact_nothing(self):
+        # nothing was captured (eg. the playlist had no segments yet)
+        await SegmentedCapture.compact(self.segments_folder, self.out_path)
+        self.assertFalse(os.path.exists(self.out_path))
+
+    async def test_compact_single_chunk(self):
+        manifest = SegmentManifest(SegmentedCapture.manifest_path(self.segments_folder))
+        manifest.chunks.append(0)
+        manifest.add(0, 10.0, 5)
+        manifest.save()
+        with open(SegmentedCapture.chunks(self.segments_folder)[0], 'wb') as f:
+            f.write(b'video')
+
+        await SegmentedCapture.compact(self.segments_folder, self.out_path)
+        with open(self.out_path, 'rb') as f:
+            self.assertEqual(f.read(), b'video')
+        self.assertFalse(os.path.exists(self.segments_folder))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime,timedelta
+from typing import Any,Dict,Optional
+from config.ConfigManager import ConfigProvider,JsonConfig
+from storage.StorageManager import StorageManager,StorageFullException
+
+class StubConfig(ConfigProvider):
+    def __init__(self, folder: str, **storage):
+        self._folder = folder
+        self._storage = {**JsonConfig._get_defaults()['storage'], 'min_free_space': 0, 'archive_after': None, **storage}
+
+    @property
+    def work_folder(self) -> str:
+        return os.path.join(self._folder, 'work')
+
+    @property
+    def temp_folder(self) -> str:
+        return os.path.join(self._folder, 'work', 'tmp')
+
+    @property
+    def videos_folder(self) -> str:
+        return os.path.join(self._folder, 'videos')
+
+    @property
+    def archive_folder(self) -> Optional[str]:
+        return os.path.join(self._folder, 'archive')
+
+    @property
+    def storage(self) -> Dict[str,Any]:
+        return self._storage
+
+class StorageManagerTest(unittest.IsolatedAsyncioTestCase):
+    DISK_SIZE = 1000
+
+    def setUp(self):
+        self._tempdir = tempfile.tempdir
+        self._tmpdir_env = os.environ.get('TMPDIR')
+        self.folder = tempfile.mkdtemp()
+        self.now = datetime.utcnow()
+
+    def tearDown(self):
+        tempfile.tempdir = self._tempdir
+        if self._tmpdir_env is None:
+            os.environ.pop('TMPDIR', None)
+        else:
+            os.environ['TMPDIR'] = self._tmpdir_env
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _storage(self, **policy) -> StorageManager:
+        storage = StorageManager(StubConfig(self.folder, **policy))
+        storage.setup()
+        return storage
+
+    def _add(self, storage: StorageManager, channel: str, id: str, hours_ago: float, size: int):
+        name = id + '.mkv'
+        with open(os.path.join(storage.videos_folder, name), 'wb') as f:
+            f.write(b'x' * size)
+        storage.add(channel, id, self.now - timedelta(hours=hours_ago), [name, id + '.srt']) # the chat is missing
+
+    def _saved(self, folder: str):
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(folder))
+
+    async def test_max_age(self):
+        storage = self._storage(max_age=24*60*60)
+        self._add(storage, 'a', 'old', 48, 10)
+        self._add(storage, 'a', 'new', 1, 10)
+        await storage.enforce_retention()
+        self.assertEqual(self._saved(storage.videos_folder), ['new'])
+
+    async def test_max_total_size(self):
+        storage = self._storage(max_total_size=250)
+        for n in range(4):
+            self._add(storage, 'a' if n % 2 == 0 else 'b', str(n), 10 - n, 100)
+        await storage.enforce_retention()
+        # the oldest ones are removed, whatever their channel is
+        self.assertEqual(self._saved(storage.videos_folder), ['2', '3'])
+
+    async def test_channel_quotas(self):
+        storage = self._storage(channel_quota=150, channel_quotas={'big': 1000, 'unlimited': None})
+        for channel in ('small', 'big', 'unlimited'):
+            for n in range(3):
+                self._add(storage, channel, f'{channel}{n}', 10 - n, 100)
+        await storage.enforce_retention()
+        self.assertEqual(self._saved(storage.videos_folder), ['big0', 'big1', 'big2', 'small2', 'unlimited0', 'unlimited1', 'unlimited2'])
+
+    async def test_index_persisted(self):
+        storage = self._storage()
+        self._add(storage, 'a', '1', 1, 10)
+        storage = self._storage(max_age=60)
+        self._add(storage, 'a', '2', 0, 10)
+        await storage.enforce_retention()
+        self.assertEqual(self._saved(storage.videos_folder), ['2'])
+
+    async def test_unmanaged_files(self):
+        storage = self._storage(max_total_size=0)
+        with open(os.path.join(storage.videos_folder, 'mine.mkv'), 'wb') as f:
+            f.write(b'x' * 100)
+        self._add(storage, 'a', '1', 1, 10)
+        await storage.enforce_retention()
+        self.assertEqual(self._saved(storage.videos_folder), ['mine'])
+
+    async def test_archive(self):
+        storage = self._storage(archive_after=24*60*60, max_age=30*24*60*60, check_interval=0.01)
+        self._add(storage, 'a', 'expired', 31*24, 10)
+        self._add(storage, 'a', 'old', 48, 10)
+        self._add(storage, 'a', 'new', 1, 10)
+        task = asyncio.ensure_future(storage.run())
+        for _ in range(100):
+            if self._saved(storage.archive_folder) == ['old']:
+                break
+            await asyncio.sleep(0.01)
+        storage.stop()
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(self._saved(storage.videos_folder), ['new'])
+        self.assertEqual(self._saved(storage.archive_folder), ['old'])
+
+        # the archived ones are removed from the archive
+        storage = self._storage(max_age=60)
+        await storage.enforce_retention()
+        self.assertEqual(self._saved(storage.videos_folder), [])
+        self.assertEqual(self._saved(storage.archive_folder), [])
+
+    def _small_disk(self, storage: StorageManager):
+        # the saved videos and the reservations take the space of the disk
+        storage._available = lambda folder, device: (StorageManagerTest.DISK_SIZE - storage._pending(device)
+                                                     - sum(os.path.getsize(os.path.join(storage.videos_folder, name)) for name in os.listdir(storage.videos_folder)))
+
+    async def test_reserve_waits(self):
+        storage = self._storage()
+        self._small_disk(storage)
+        events = []
+        async def first():
+            async with storage.reserve(storage.staging_folder, 600):
+                events.append('first')
+                await asyncio.sleep(0.05)
+                events.append('first done')
+        async def second():
+            await asyncio.sleep(0.01)
+            async with storage.reserve(storage.staging_folder, 600):
+                events.append('second')
+        await asyncio.wait_for(asyncio.gather(first(), second()), 5)
+        self.assertEqual(events, ['first', 'first done', 'second'])
+
+    async def test_reserve_written(self):
+        # the bytes already written are not counted twice
+        storage = self._storage()
+        self._small_disk(storage)
+        path = os.path.join(storage.staging_folder, '1.ts')
+        with open(path, 'wb') as f:
+            f.write(b'x' * 400)
+        async with storage.reserve(storage.staging_folder, 600, path) as reservation:
+            self.assertEqual(reservation.pending, 200)
+
+    async def test_reserve_applies_retention(self):
+        storage = self._storage(max_total_size=500)
+        self._small_disk(storage)
+        self._add(storage, 'a', 'old', 2, 300)
+        self._add(storage, 'a', 'new', 1, 300)
+        async with storage.reserve(storage.staging_folder, 600):
+            pass
+        self.assertEqual(self._saved(storage.videos_folder), ['new'])
+
+    async def test_reserve_full(self):
+        storage = self._storage()
+        self._small_disk(storage)
+        self._add(storage, 'a', '1', 1, 300)
+        with self.assertRaises(StorageFullException):
+            async with storage.reserve(storage.staging_folder, 800):
+                pass
+        self.assertEqual(self._saved(storage.videos_folder), ['1']) # nothing to remove
+        self.assertEqual(storage._reservations, [])
+
+    async def test_estimate_size(self):
+        self.assertEqual(StorageManager.estimate_size('720p60', 100), int(3_500_000 / 8 * 100 * StorageManager.SIZE_MARGIN))
+        self.assertEqual(StorageManager.estimate_size('source', 100), int(StorageManager.SOURCE_BITRATE / 8 * 100 * StorageManager.SIZE_MARGIN))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,13 @@
+import unittest
+from twitch_downloader.VideoDownloader import VideoDownloader
+
+class VideoDownloaderTest(unittest.TestCase):
+    def test_fallback_quality(self):
+        qualities = ['1080p60', '720p60', '480p', 'audio_only']
+        self.assertEqual(VideoDownloader.fallback_quality('900p', qualities), '720p60')
+        self.assertEqual(VideoDownloader.fallback_quality('source', qualities), '1080p60')
+        self.assertEqual(VideoDownloader.fallback_quality('160p', qualities), '480p') # all of them are better
+        self.assertIsNone(VideoDownloader.fallback_quality('720p', ['audio_only']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os,shutil
+import time
+import asyncio
+import logging
+import subprocess
+from typing import Any,Dict,List,Optional
+from .metrics.Metrics import Metrics
+
+class AsyncVideoDownloader:
+    """
+    Same interface as `VideoDownloader`, but its operations don't block the event loop
+    """
+    @staticmethod
+    async def run_command(*args: List[str], check: bool = False) -> str:
+        """
+        Runs a command without blocking the event loop.
+        The output is read while the command runs, so long commands (like downloads) don't fill the pipe.
+        :param args:        Command (and its arguments) to run
+        :param check:       Raise `CalledProcessError` if the command fails
+        :return str:        Output (stdout and stderr) of the command
+        """
+        command = os.path.basename(args[0]) if len(args) < 3 or args[1] != '-u' else os.path.basename(args[2]) # the python scripts are run with '-u'
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        output = []
+        try:
+            while True:
+                chunk = await process.stdout.read(64*1024)
+                if not chunk:
+                    break
+                output.append(chunk.decode('utf-8', errors='replace'))
+            await process.wait()
+        except asyncio.CancelledError:
+            # don't leave the command running on its own
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        finally:
+            Metrics.default().observe('command_duration_seconds', time.monotonic() - start, command=command)
+        Metrics.default().inc('commands_total', command=command, status='ok' if process.returncode == 0 else 'failed')
+
+        if check and process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, args, ''.join(output))
+        return ''.join(output)
+
+    @staticmethod
+    async def move_and_reformat(from_path: str, to_path: str, preset: Optional[str] = None):
+        """
+        Moves a video, changing its container if the extension is different.
+        :param preset str:  x264 preset to use if the video can't be remuxed and needs to be transcoded
+        """
+        from .FFmpeg import FFmpeg # FFmpeg runs its commands through this class
+
+        _, from_extension = os.path.splitext(from_path)
+        _, to_extension = os.path.splitext(to_path)
+
+        if from_extension == to_extension:
+            await asyncio.get_event_loop().run_in_executor(None, shutil.move, from_path, to_path) # it may be a copy between filesystems
+        else:
+            logging.debug("Reformatting in progress...")
+            await FFmpeg.remux(from_path, to_path, preset)
+            os.remove(from_path) # ffmpeg won't remove the old file
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        """
+        Downloads a Twitch video.
+        :param id_or_url str:   ID or URL of the Twitch video to download
+        :param quality str:     Target quality for the downloaded video
+        :param out_path str:    Target path where to download
+        """
+        raise NotImplementedError(f"Cannot run download function on {self.__class__.__name__} instance")
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        """
+        Queries information about a video.
+        """
+        raise NotImplementedError(f"Cannot run get_info function on {self.__class__.__name__} instance")
+
+    async def get_last_video(self, channel: str) -> str:
+        """
+        Requests the last video from a channel.
+        """
+        raise NotImplementedError(f"Cannot run get_last_video function on {self.__class__.__name__} instance")
+
+    async def get_infos(self, ids_or_urls: List[str]) -> Dict[str,Dict[str,Any]]:
+        """
+        Queries information about multiple videos.
+        :return:    Information by video (using the same keys as `ids_or_urls`)
+        """
+        infos = await asyncio.gather(*[self.get_info(id_or_url) for id_or_url in ids_or_urls])
+        return dict(zip(ids_or_urls, infos))
+
+    async def get_last_videos(self, channels: List[str]) -> Dict[str,Optional[str]]:
+        """
+        Requests the last video from multiple channels.
+        :return:    Last video by channel; the channels that couldn't be queried are missing
+        """
+        last_videos = await asyncio.gather(*[self.get_last_video(channel) for channel in channels], return_exceptions=True)
+        r = {}
+        for channel,last_video in zip(channels, last_videos):
+            if isinstance(last_video, Exception):
+                logging.error(last_video, exc_info=last_video)
+            else:
+                r[channel] = last_video
+        return r
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        """
+        Queries the chat messages.
+        :param id_or_url str:   ID or URL of the Twitch video to download
+        :param format str:      Chat standard
+        :param out_path str:    Target path where to download
+        """
+        raise NotImplementedError(f"Cannot run get_chat function on {self.__class__.__name__} instance")
+
+    async def sync_chat(self, id_or_url: str, folder: str):
+        """
+        Downloads the chat messages got since the last call, so `get_chat` (with its output on `folder`) only needs
+        to get the remaining ones. Downloaders that can't get the chat incrementally don't do anything.
+        :param id_or_url str:   ID or URL of the Twitch video
+        :param folder str:      Folder where the messages are kept
+        """
+        pass
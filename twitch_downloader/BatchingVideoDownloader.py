@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any,Dict,List,Optional
+from .AsyncVideoDownloader import AsyncVideoDownloader
+
+class BatchingVideoDownloader(AsyncVideoDownloader):
+    """
+    Folds the `get_info` and `get_last_video` calls done at about the same time (eg. by different channels)
+    into a single `get_infos`/`get_last_videos` call.
+    """
+    def __init__(self, video_downloader: AsyncVideoDownloader, window: float = 0.5, max_batch: int = 100):
+        """
+        :param window float:    Seconds to wait for more calls before sending the batch
+        :param max_batch int:   Batch size that sends the batch without waiting
+        """
+        self._video_downloader = video_downloader
+        self._window = window
+        self._max_batch = max_batch
+        self._pending = {'info': {}, 'last_video': {}} # kind -> (key -> future)
+        self._flush_handles = {}
+
+    async def _enqueue(self, kind: str, key: str) -> Any:
+        pending = self._pending[kind]
+        if key not in pending:
+            loop = asyncio.get_event_loop()
+            pending[key] = loop.create_future()
+            if len(pending) >= self._max_batch:
+                self._flush(kind)
+            elif kind not in self._flush_handles:
+                self._flush_handles[kind] = loop.call_later(self._window, self._flush, kind)
+        return await asyncio.shield(pending[key]) # others may be waiting for the same result
+
+    def _flush(self, kind: str):
+        handle = self._flush_handles.pop(kind, None)
+        if handle is not None:
+            handle.cancel()
+        batch,self._pending[kind] = self._pending[kind],{}
+        asyncio.ensure_future(self._resolve(kind, batch))
+
+    async def _resolve(self, kind: str, batch: Dict[str,asyncio.Future]):
+        try:
+            if kind == 'info':
+                results = await self._video_downloader.get_infos(list(batch.keys()))
+            else:
+                results = await self._video_downloader.get_last_videos(list(batch.keys()))
+        except Exception as ex:
+            for future in batch.values():
+                future.set_exception(ex)
+            return
+
+        for key,future in batch.items():
+            if key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(Exception(f"Couldn't get the {kind.replace('_', ' ')} of {key}"))
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        return await self._enqueue('info', id_or_url)
+
+    async def get_last_video(self, channel: str) -> str:
+        return await self._enqueue('last_video', channel)
+
+    async def get_infos(self, ids_or_urls: List[str]) -> Dict[str,Dict[str,Any]]:
+        return await self._video_downloader.get_infos(ids_or_urls)
+
+    async def get_last_videos(self, channels: List[str]) -> Dict[str,Optional[str]]:
+        return await self._video_downloader.get_last_videos(channels)
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        await self._video_downloader.download(id_or_url, quality, out_path)
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        await self._video_downloader.get_chat(id_or_url, format, out_path)
+
+    async def sync_chat(self, id_or_url: str, folder: str):
+        await self._video_downloader.sync_chat(id_or_url, folder)
@@ -0,0 +1,108 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Any,Dict,List,Optional
+from .AsyncVideoDownloader import AsyncVideoDownloader
+from .metrics.Metrics import Metrics
+
+class MetadataCache:
+    """
+    LRU cache where every entry expires after some time; its hits and misses are counted on `Metrics`
+    """
+    def __init__(self, kind: str, ttl: float, max_entries: int):
+        """
+        :param kind str:    Label of the cache on the metrics
+        """
+        self._kind = kind
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict() # key -> (expiration time, value)
+
+    def get(self, key: str) -> Any:
+        """
+        :return:    The cached value, or `MetadataCache.MISSING` if it's not cached (or it expired)
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            Metrics.default().inc('cache_misses_total', kind=self._kind)
+            return MetadataCache.MISSING
+
+        self._entries.move_to_end(key)
+        Metrics.default().inc('cache_hits_total', kind=self._kind)
+        return entry[1]
+
+    def put(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False) # least recently used
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    MISSING = object()
+
+class CachedVideoDownloader(AsyncVideoDownloader):
+    """
+    Keeps the results of `get_info` and `get_last_video` for some time, so repeated lookups don't reach Twitch
+    """
+    def __init__(self, video_downloader: AsyncVideoDownloader, info_ttl: float = 60.0, last_video_ttl: float = 30.0, max_entries: int = 1024):
+        self._video_downloader = video_downloader
+        self._info = MetadataCache('info', info_ttl, max_entries)
+        self._last_video = MetadataCache('last_video', last_video_ttl, max_entries)
+
+    def invalidate(self, id_or_url: str):
+        """
+        Forgets the information of a video (eg. because it's known that it has changed)
+        """
+        self._info.invalidate(id_or_url)
+
+    def invalidate_channel(self, channel: str):
+        """
+        Forgets the last video of a channel (eg. because it just started streaming)
+        """
+        self._last_video.invalidate(channel)
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        return (await self.get_infos([id_or_url]))[id_or_url]
+
+    async def get_last_video(self, channel: str) -> str:
+        r = await self.get_last_videos([channel])
+        if channel not in r:
+            raise Exception(f"Couldn't get the last video of {channel}")
+        return r[channel]
+
+    async def get_infos(self, ids_or_urls: List[str]) -> Dict[str,Dict[str,Any]]:
+        r = {id_or_url: self._info.get(id_or_url) for id_or_url in ids_or_urls}
+        missing = [id_or_url for id_or_url,info in r.items() if info is MetadataCache.MISSING]
+        if len(missing) > 0:
+            infos = await self._video_downloader.get_infos(missing) if len(missing) > 1 else {missing[0]: await self._video_downloader.get_info(missing[0])}
+            for id_or_url,info in infos.items():
+                if len(info) > 0: # don't remember failed lookups
+                    self._info.put(id_or_url, info)
+                r[id_or_url] = info
+        logging.debug(f"Info cache: {len(ids_or_urls)-len(missing)} hits, {len(missing)} misses")
+        return r
+
+    async def get_last_videos(self, channels: List[str]) -> Dict[str,Optional[str]]:
+        r = {channel: self._last_video.get(channel) for channel in channels}
+        missing = [channel for channel,last_video in r.items() if last_video is MetadataCache.MISSING]
+        for channel in missing:
+            del r[channel]
+        if len(missing) > 0:
+            last_videos = await self._video_downloader.get_last_videos(missing) if len(missing) > 1 else {missing[0]: await self._video_downloader.get_last_video(missing[0])}
+            for channel,last_video in last_videos.items():
+                self._last_video.put(channel, last_video)
+                r[channel] = last_video
+        return r
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        await self._video_downloader.download(id_or_url, quality, out_path)
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        await self._video_downloader.get_chat(id_or_url, format, out_path)
+
+    async def sync_chat(self, id_or_url: str, folder: str):
+        await self._video_downloader.sync_chat(id_or_url, folder)
@@ -0,0 +1,181 @@
+import os
+import json
+import logging
+from typing import Any,Dict,List,Optional
+from .AsyncVideoDownloader import AsyncVideoDownloader
+from .metrics.Metrics import Metrics
+
+class FFmpeg:
+    """
+    ffmpeg/ffprobe operations over whole video files; all of them are done in a single streaming pass
+    """
+    # codecs that can be copied as-is into each container (`None` means anything)
+    _CONTAINER_CODECS = {
+        '.mkv':  None,
+        '.mp4':  {'video': {'h264', 'hevc', 'av1', 'mpeg4'}, 'audio': {'aac', 'mp3', 'opus', 'ac3', 'eac3', 'alac', 'flac'}},
+        '.mov':  {'video': {'h264', 'hevc', 'mpeg4', 'prores'}, 'audio': {'aac', 'mp3', 'ac3', 'alac'}},
+        '.webm': {'video': {'vp8', 'vp9', 'av1'}, 'audio': {'opus', 'vorbis'}},
+        '.ts':   {'video': {'h264', 'hevc', 'mpeg2video'}, 'audio': {'aac', 'mp3', 'ac3', 'opus'}},
+    }
+    # encoder used for each container when the codec doesn't fit (and for the renditions)
+    _CONTAINER_ENCODERS = {
+        '.mkv':  {'video': 'libx264', 'audio': 'aac'},
+        '.mp4':  {'video': 'libx264', 'audio': 'aac'},
+        '.mov':  {'video': 'libx264', 'audio': 'aac'},
+        '.webm': {'video': 'libvpx-vp9', 'audio': 'libopus'},
+        '.ts':   {'video': 'libx264', 'audio': 'aac'},
+    }
+    @staticmethod
+    async def probe(path: str) -> Dict[str,Any]:
+        """
+        Gets the container and streams information of a video.
+        """
+        result = await AsyncVideoDownloader.run_command('ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path, check=True)
+        return json.loads(result)
+
+    @staticmethod
+    async def get_duration(path: str) -> float:
+        """
+        Gets the duration (in seconds) of a video.
+        """
+        return float((await FFmpeg.probe(path))['format']['duration'])
+
+    @staticmethod
+    async def _run(operation: str, out_path: str, *args: List[str]):
+        """
+        Runs an ffmpeg command, measuring it
+        """
+        async with Metrics.default().time('ffmpeg_duration_seconds', operation=operation):
+            await AsyncVideoDownloader.run_command(*args, check=True)
+        if os.path.isfile(out_path):
+            Metrics.default().inc('ffmpeg_output_bytes_total', os.path.getsize(out_path), operation=operation)
+
+    @staticmethod
+    def _concat_entry(path: str) -> str:
+        return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n"
+
+    @staticmethod
+    async def concat(paths: List[str], out_path: str):
+        """
+        Joins consecutive recordings (with the same streams) into one, without re-encoding.
+        """
+        list_path = out_path + '.concat.txt'
+        with open(list_path, 'w') as f:
+            f.write("ffconcat version 1.0\n")
+            for path in paths:
+                f.write(FFmpeg._concat_entry(path))
+
+        try:
+            await FFmpeg._run('concat', out_path, 'ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                              '-map', '0', '-c', 'copy', out_path)
+        finally:
+            os.remove(list_path)
+
+    @staticmethod
+    async def merge(start_path: str, full_path: str, out_path: str, preset: Optional[str] = None):
+        """
+        Joins the start of a recording with a later (complete) recording of the same video, without re-encoding.
+        The beginning is taken from `start_path` (as it may have audio that was muted afterwards), and the rest
+        from `full_path`, starting where `start_path` ends.
+        The streams are joined into a mkv (that can hold any codec), and then remuxed into the container of `out_path`.
+        :param start_path str:  Partial recording, from the start of the video
+        :param full_path str:   Complete recording, from the start of the video
+        :param out_path str:    Where to save the merged video (its extension determines the container)
+        :param preset str:      x264 preset to use if the remux needs transcoding; `None` to use ffmpeg's default
+        """
+        start_duration = await FFmpeg.get_duration(start_path)
+        full_duration = await FFmpeg.get_duration(full_path)
+        logging.debug(f"Merging {start_duration:.1f}s of '{start_path}' with {max(full_duration - start_duration, 0):.1f}s of '{full_path}'")
+
+        merged_path = out_path if os.path.splitext(out_path)[1].lower() == '.mkv' else os.path.splitext(out_path)[0] + '.merge.mkv'
+        list_path = out_path + '.concat.txt'
+        with open(list_path, 'w') as f:
+            f.write("ffconcat version 1.0\n")
+            f.write(FFmpeg._concat_entry(start_path))
+            if start_duration < full_duration:
+                # the demuxer starts on the keyframe before `inpoint`, so some frames may be repeated; but nothing will be lost
+                f.write(FFmpeg._concat_entry(full_path))
+                f.write(f"inpoint {start_duration:.3f}\n")
+
+        try:
+            await FFmpeg._run('merge', merged_path, 'ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                              '-map', '0', '-c', 'copy', merged_path)
+        finally:
+            os.remove(list_path)
+
+        if merged_path != out_path:
+            try:
+                await FFmpeg.remux(merged_path, out_path, preset)
+            finally:
+                os.remove(merged_path)
+
+    @staticmethod
+    def _stream_args(stream: Dict[str,Any], n: int, extension: str, preset: Optional[str]) -> List[str]:
+        codec_type = stream['codec_type']
+        allowed = FFmpeg._CONTAINER_CODECS.get(extension)
+        if allowed is None or stream.get('codec_name') in allowed[codec_type]:
+            return [f'-c:{n}', 'copy']
+
+        encoder = FFmpeg._CONTAINER_ENCODERS[extension][codec_type]
+        logging.debug(f"Codec {stream.get('codec_name')} can't be stored on a {extension} file; transcoding it into {encoder}")
+        r = [f'-c:{n}', encoder]
+        if codec_type == 'video' and preset is not None and encoder == 'libx264':
+            r += [f'-preset:{n}', preset]
+        return r
+
+    @staticmethod
+    async def remux(from_path: str, to_path: str, preset: Optional[str] = None):
+        """
+        Changes the container of a video.
+        The streams are copied as they are; only the ones whose codec can't be stored on the target container are transcoded.
+        :param from_path str:   Video to remux
+        :param to_path str:     Where to save the video (its extension determines the container)
+        :param preset str:      x264 preset to use if transcoding is needed (eg. 'veryfast'); `None` to use ffmpeg's default
+        """
+        extension = os.path.splitext(to_path)[1].lower()
+        if extension not in FFmpeg._CONTAINER_CODECS:
+            raise ValueError(f"Unsupported output container '{extension}'")
+
+        # only video and audio; Twitch's streams also have ID3 metadata streams, that mp4 can't hold
+        streams = [stream for stream in (await FFmpeg.probe(from_path))['streams'] if stream.get('codec_type') in ('video', 'audio')]
+        args = ['ffmpeg', '-y', '-v', 'error', '-i', from_path]
+        for n,stream in enumerate(streams):
+            args += ['-map', f"0:{stream['index']}"] + FFmpeg._stream_args(stream, n, extension, preset)
+        if extension in ('.mp4', '.mov'):
+            args += ['-movflags', '+faststart'] # index at the beginning, so it can be played while it's being downloaded
+        args.append(to_path)
+
+        await FFmpeg._run('remux', to_path, *args)
+
+    @staticmethod
+    async def renditions(from_path: str, renditions: List[Dict[str,Any]], preset: Optional[str] = None):
+        """
+        Generates smaller copies of a video with a single ffmpeg run: the video is decoded once, and split into each of them.
+        :param from_path str:   Source video
+        :param renditions:      `path` (its extension determines the container), `height` and optionally `video_bitrate` and
+                                `audio_bitrate` (eg. '800k') of each copy
+        :param preset str:      x264 preset (eg. 'veryfast'); `None` to use ffmpeg's default
+        """
+        filters = [f"[0:v:0]split={len(renditions)}" + ''.join(f"[in{n}]" for n in range(len(renditions)))]
+        filters += [f"[in{n}]scale=-2:{rendition['height']}[out{n}]" for n,rendition in enumerate(renditions)]
+        args = ['ffmpeg', '-y', '-v', 'error', '-i', from_path, '-filter_complex', ';'.join(filters)]
+        for n,rendition in enumerate(renditions):
+            extension = os.path.splitext(rendition['path'])[1].lower()
+            if extension not in FFmpeg._CONTAINER_ENCODERS:
+                raise ValueError(f"Unsupported output container '{extension}'")
+            encoders = FFmpeg._CONTAINER_ENCODERS[extension]
+            args += ['-map', f'[out{n}]', '-map', '0:a:0?', '-c:v', encoders['video'], '-c:a', encoders['audio']]
+            if preset is not None and encoders['video'] == 'libx264':
+                args += ['-preset', preset]
+            if rendition.get('video_bitrate') is not None:
+                args += ['-b:v', rendition['video_bitrate']]
+            if rendition.get('audio_bitrate') is not None:
+                args += ['-b:a', rendition['audio_bitrate']]
+            if extension in ('.mp4', '.mov'):
+                args += ['-movflags', '+faststart']
+            args.append(rendition['path'])
+
+        await FFmpeg._run('renditions', renditions[0]['path'], *args)
+        for rendition in renditions[1:]:
+            if os.path.isfile(rendition['path']):
+                Metrics.default().inc('ffmpeg_output_bytes_total', os.path.getsize(rendition['path']), operation='renditions')
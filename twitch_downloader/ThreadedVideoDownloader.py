@@ -0,0 +1,34 @@
+import asyncio
+import functools
+from typing import Any,Callable,Dict,List,Optional
+from .VideoDownloader import VideoDownloader
+from .AsyncVideoDownloader import AsyncVideoDownloader
+
+class ThreadedVideoDownloader(AsyncVideoDownloader):
+    """
+    Runs a blocking `VideoDownloader` on the default executor, so it can be used where an `AsyncVideoDownloader` is expected
+    """
+    def __init__(self, video_downloader: VideoDownloader):
+        self._video_downloader = video_downloader
+
+    @staticmethod
+    async def _run_blocking(fn: Callable, *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(None, functools.partial(fn, *args))
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        await ThreadedVideoDownloader._run_blocking(self._video_downloader.download, id_or_url, quality, out_path)
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        return await ThreadedVideoDownloader._run_blocking(self._video_downloader.get_info, id_or_url)
+
+    async def get_last_video(self, channel: str) -> str:
+        return await ThreadedVideoDownloader._run_blocking(self._video_downloader.get_last_video, channel)
+
+    async def get_infos(self, ids_or_urls: List[str]) -> Dict[str,Dict[str,Any]]:
+        return await ThreadedVideoDownloader._run_blocking(self._video_downloader.get_infos, ids_or_urls)
+
+    async def get_last_videos(self, channels: List[str]) -> Dict[str,Optional[str]]:
+        return await ThreadedVideoDownloader._run_blocking(self._video_downloader.get_last_videos, channels)
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        await ThreadedVideoDownloader._run_blocking(self._video_downloader.get_chat, id_or_url, format, out_path)
@@ -2,13 +2,15 @@ import re
 import os,shutil
 import subprocess
 import logging
-from typing import Any,Dict
+from typing import Any,Dict,List,Optional
+from .metrics.Trace import Trace
 
 class InvalidQualityException(Exception):
     def __init__(self, message="Invalid quality for this video.", valid_qualities=None):
         if valid_qualities is not None:
             message += " Valid qualities are: " + str(valid_qualities)
         super().__init__(message)
+        self.valid_qualities = [] if valid_qualities is None else valid_qualities
 
 class VideoDownloader:
     @staticmethod
@@ -24,6 +26,29 @@ class VideoDownloader:
     def get_url(id: str) -> str:
         return f"https://www.twitch.tv/videos/{id}"
 
+    @staticmethod
+    def _quality_height(quality: str) -> float:
+        if 'source' in quality or quality == 'chunked':
+            return float('inf')
+        match = re.match(r'^(\d+)p', quality)
+        return 0 if match is None else int(match.group(1))
+
+    @staticmethod
+    def fallback_quality(quality: str, valid_qualities: List[str]) -> Optional[str]:
+        """
+        Picks the quality to use when the desired one is not available: the best one that is not better than it,
+        or the worst one if all of them are better.
+        :param valid_qualities: Qualities of the video (as `InvalidQualityException.valid_qualities`)
+        """
+        candidates = [name for name in valid_qualities if VideoDownloader._quality_height(name) > 0] # no 'audio_only'
+        if len(candidates) == 0:
+            return None
+        height = VideoDownloader._quality_height(quality)
+        lower = [name for name in candidates if VideoDownloader._quality_height(name) <= height]
+        if len(lower) > 0:
+            return max(lower, key=VideoDownloader._quality_height)
+        return min(candidates, key=VideoDownloader._quality_height)
+
     @staticmethod
     def move_and_reformat(from_path: str, to_path: str):
         _, from_extension = os.path.splitext(from_path)
@@ -32,9 +57,15 @@ class VideoDownloader:
         if from_extension == to_extension:
             shutil.move(from_path, to_path)
         else:
-            logging.debug(f"Reformatting in progress...")
-            result = subprocess.run(['ffmpeg', '-i', from_path, to_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            logging.debug(f"Result of reformatting: ```{result}```")
+            logging.debug("Reformatting in progress...")
+            # change only the container; if the codecs don't fit on the new one, transcode
+            faststart = ['-movflags', '+faststart'] if to_extension in ('.mp4', '.mov') else []
+            result = subprocess.run(['ffmpeg', '-y', '-i', from_path, '-map', '0:v', '-map', '0:a?', '-c', 'copy', *faststart, to_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if result.returncode != 0:
+                logging.debug("Couldn't remux; transcoding...")
+                Trace.log('ffmpeg', f"Result of remuxing: ```{result}```")
+                result = subprocess.run(['ffmpeg', '-y', '-i', from_path, to_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            Trace.log('ffmpeg', f"Result of reformatting: ```{result}```")
             os.remove(from_path) # ffmpeg won't remove the old file
 
     def download(self, id_or_url: str, quality: str, out_path: str):
@@ -58,6 +89,26 @@ class VideoDownloader:
         """
         raise NotImplementedError(f"Cannot run get_last_video function on {self.__class__.__name__} instance")
 
+    def get_infos(self, ids_or_urls: List[str]) -> Dict[str,Dict[str,Any]]:
+        """
+        Queries information about multiple videos.
+        :return:    Information by video (using the same keys as `ids_or_urls`)
+        """
+        return {id_or_url: self.get_info(id_or_url) for id_or_url in ids_or_urls}
+
+    def get_last_videos(self, channels: List[str]) -> Dict[str,Optional[str]]:
+        """
+        Requests the last video from multiple channels.
+        :return:    Last video by channel; the channels that couldn't be queried are missing
+        """
+        r = {}
+        for channel in channels:
+            try:
+                r[channel] = self.get_last_video(channel)
+            except Exception as ex:
+                logging.error(ex, exc_info=True)
+        return r
+
     def get_chat(self, id_or_url: str, format: str, out_path: str):
         """
         Queries the chat messages.
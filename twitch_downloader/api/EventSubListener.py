@@ -0,0 +1,163 @@
+import asyncio
+import hmac
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime,timedelta
+from typing import Any,Callable,Dict,Optional,Tuple
+
+class EventSubListener:
+    """
+    Small HTTP server receiving the Twitch EventSub notifications (webhook transport).
+    The messages are verified using the secret given when creating the subscriptions; the rest are rejected.
+    The subscriptions (`stream.online`/`stream.offline` for each channel) must point to `http(s)://<host>:<port><path>`
+    (behind a reverse proxy with HTTPS, as Twitch requires it).
+    """
+    MAX_MESSAGE_AGE = timedelta(minutes=10) # older messages could be replays
+    MAX_BODY_SIZE = 64*1024
+    MAX_SEEN_MESSAGES = 1024
+
+    def __init__(self, secret: str, on_event: Callable[[str,Dict[str,Any]],None], host: str = '0.0.0.0', port: int = 8080, path: str = '/eventsub'):
+        """
+        :param secret str:  Secret used to sign the messages
+        :param on_event:    Called with the subscription type (eg. 'stream.online') and the event of each notification
+        """
+        self._secret = secret
+        self._on_event = on_event
+        self._host = host
+        self._port = port
+        self._path = path
+        self._server = None
+        self._seen = OrderedDict() # IDs of the last messages; Twitch may re-send them
+        self._start = False
+
+    @staticmethod
+    def sign(secret: str, message_id: str, timestamp: str, body: bytes) -> str:
+        """
+        :return:    Value of the `Twitch-Eventsub-Message-Signature` header for that message
+        """
+        return 'sha256=' + hmac.new(secret.encode(), message_id.encode() + timestamp.encode() + body, hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def _parse_timestamp(timestamp: str) -> datetime:
+        # RFC3339 with nanoseconds; `datetime` only supports up to microseconds
+        timestamp = timestamp.rstrip('Z')
+        if '.' in timestamp:
+            timestamp, fraction = timestamp.split('.', 1)
+            timestamp += '.' + fraction[:6]
+        return datetime.fromisoformat(timestamp)
+
+    def _verify(self, headers: Dict[str,str], body: bytes) -> bool:
+        try:
+            message_id = headers['twitch-eventsub-message-id']
+            timestamp = headers['twitch-eventsub-message-timestamp']
+            signature = headers['twitch-eventsub-message-signature']
+        except KeyError:
+            return False
+
+        expected = EventSubListener.sign(self._secret, message_id, timestamp, body)
+        if not hmac.compare_digest(expected, signature):
+            return False
+
+        try:
+            return abs(datetime.utcnow() - EventSubListener._parse_timestamp(timestamp)) <= EventSubListener.MAX_MESSAGE_AGE
+        except ValueError:
+            return False
+
+    def _handle(self, headers: Dict[str,str], body: bytes) -> Tuple[int,str]:
+        """
+        :return:    Status code and body of the response
+        """
+        if not self._verify(headers, body):
+            logging.warning("Got an EventSub message with an invalid signature")
+            return 403, ''
+
+        message_id = headers['twitch-eventsub-message-id']
+        if message_id in self._seen:
+            return 204, '' # already handled
+        self._seen[message_id] = True
+        if len(self._seen) > EventSubListener.MAX_SEEN_MESSAGES:
+            self._seen.popitem(last=False)
+
+        try:
+            message = json.loads(body)
+        except ValueError:
+            return 400, ''
+
+        message_type = headers.get('twitch-eventsub-message-type')
+        subscription_type = message.get('subscription', {}).get('type')
+        if message_type == 'webhook_callback_verification':
+            logging.info(f"EventSub subscription {subscription_type} verified")
+            return 200, message['challenge']
+        elif message_type == 'notification':
+            logging.debug(f"Got EventSub notification {subscription_type}")
+            try:
+                self._on_event(subscription_type, message['event'])
+            except Exception as ex:
+                logging.error(ex, exc_info=True)
+            return 204, ''
+        elif message_type == 'revocation':
+            logging.warning(f"EventSub subscription {subscription_type} was revoked ({message['subscription'].get('status')}); only polling will be used")
+            return 204, ''
+        return 400, ''
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if line == '':
+                    break
+                key,_,value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+            if len(request_line) < 2 or request_line[0] != 'POST' or request_line[1] != self._path:
+                status,response = 404, ''
+            elif length > EventSubListener.MAX_BODY_SIZE:
+                status,response = 413, ''
+            else:
+                status,response = self._handle(headers, await reader.readexactly(length))
+        except (ValueError, asyncio.IncompleteReadError):
+            status,response = 400, ''
+
+        response = response.encode()
+        writer.write(f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\nContent-Type: text/plain\r\n"
+                     f"Content-Length: {len(response)}\r\nConnection: close\r\n\r\n".encode() + response)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def run(self):
+        if self.started:
+            raise Exception("Can't run the same instance twice!")
+        self._start = True
+
+        self._server = await asyncio.start_server(self._serve, self._host, self._port)
+        logging.info(f"Listening for EventSub notifications on {self._host}:{self._port}{self._path}")
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass # stopped
+
+    @property
+    def started(self) -> bool:
+        return self._start
+
+    @property
+    def port(self) -> Optional[int]:
+        """
+        Port being listened (useful if it was started on port 0)
+        """
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        self._start = False
+        if self._server is not None:
+            self._server.close()
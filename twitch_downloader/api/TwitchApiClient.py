@@ -0,0 +1,211 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+import http.client
+from urllib.parse import urlsplit
+from typing import Any,BinaryIO,Dict,Optional,Tuple
+from ..metrics.Metrics import Metrics
+
+class TwitchApiException(Exception):
+    pass
+
+class TwitchApiClient:
+    """
+    HTTP client for the Twitch endpoints (GQL, usher and the video CDN).
+    Connections are kept alive and re-used between requests (it's safe to use it from multiple threads).
+    """
+    CLIENT_ID = 'kimne78kx3ncx6brgo4mv6wki5h1ko' # public ID used by the Twitch web player
+
+    def __init__(self, gql_url: str = 'https://gql.twitch.tv/gql', usher_url: str = 'https://usher.ttvnw.net',
+                        max_idle_connections: int = 8, timeout: float = 30.0):
+        self._gql_url = gql_url
+        self._usher_url = usher_url
+        self._max_idle_connections = max_idle_connections
+        self._timeout = timeout
+        self._idle = {} # (scheme, host) -> idle connections
+        self._lock = threading.Lock()
+        self._validators = OrderedDict() # URL -> (ETag, Last-Modified, body) of the last response
+        self._max_validators = 256
+        self.not_modified = 0 # requests answered with "304 Not Modified"
+
+    _default = None
+
+    @staticmethod
+    def default() -> 'TwitchApiClient':
+        """
+        Client shared by everyone that doesn't get a specific one, so they all use the same connections
+        """
+        if TwitchApiClient._default is None:
+            TwitchApiClient._default = TwitchApiClient()
+        return TwitchApiClient._default
+
+    @staticmethod
+    def set_default(client: 'TwitchApiClient'):
+        """
+        Changes the shared client (eg. to use other endpoints)
+        """
+        TwitchApiClient._default = client
+
+    @property
+    def usher_url(self) -> str:
+        return self._usher_url
+
+    def _acquire(self, scheme: str, netloc: str) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        :return:    Connection, and if it was re-used
+        """
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self._timeout), False
+        return http.client.HTTPConnection(netloc, timeout=self._timeout), False
+
+    def _release(self, scheme: str, netloc: str, connection: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self._max_idle_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _request(self, method: str, url: str, body: Optional[bytes], headers: Optional[Dict[str,str]], out: Optional[BinaryIO]) -> Tuple[int,Dict[str,str],bytes]:
+        parts = urlsplit(url)
+        path = parts.path if parts.query == '' else parts.path + '?' + parts.query
+        metrics = Metrics.default()
+        start = time.monotonic()
+
+        while True:
+            connection,reused = self._acquire(parts.scheme, parts.netloc)
+            try:
+                connection.request(method, path or '/', body=body, headers=headers or {})
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if reused:
+                    metrics.inc('api_reconnections_total', host=parts.netloc)
+                    continue # the server closed the idle connection; try with another one
+                metrics.inc('api_requests_total', host=parts.netloc, status='error')
+                raise
+
+            received = 0
+            try:
+                data = b''
+                if out is not None and response.status == 200:
+                    while True:
+                        chunk = response.read(64*1024)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        received += len(chunk)
+                else:
+                    data = response.read()
+                    received = len(data)
+            except BaseException:
+                connection.close()
+                metrics.inc('api_requests_total', host=parts.netloc, status='error')
+                raise
+            metrics.observe('api_request_duration_seconds', time.monotonic() - start, host=parts.netloc)
+            metrics.inc('api_requests_total', host=parts.netloc, status=str(response.status))
+            metrics.inc('api_received_bytes_total', received, host=parts.netloc)
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(parts.scheme, parts.netloc, connection)
+            return response.status, {k.lower(): v for k,v in response.getheaders()}, data
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None, headers: Optional[Dict[str,str]] = None) -> Tuple[int,Dict[str,str],bytes]:
+        """
+        Sends a request.
+        :return:    Status, headers (lowercase) and body of the response
+        """
+        return self._request(method, url, body, headers, None)
+
+    def get_text(self, url: str) -> str:
+        """
+        Gets a text resource.
+        If the server gave a validator (ETag/Last-Modified) the last time, the request is conditional;
+        if the resource hasn't changed, the previous body is returned without downloading it again.
+        """
+        headers = {}
+        with self._lock:
+            cached = self._validators.get(url)
+        if cached is not None:
+            if cached[0] is not None:
+                headers['If-None-Match'] = cached[0]
+            if cached[1] is not None:
+                headers['If-Modified-Since'] = cached[1]
+
+        status,response_headers,data = self.request('GET', url, headers=headers)
+        if status == 304 and cached is not None:
+            with self._lock:
+                self.not_modified += 1
+            return cached[2]
+        if status != 200:
+            raise TwitchApiException(f"Got status {status} while requesting {url}")
+
+        text = data.decode('utf-8')
+        etag,last_modified = response_headers.get('etag'),response_headers.get('last-modified')
+        with self._lock:
+            if etag is not None or last_modified is not None:
+                self._validators[url] = (etag, last_modified, text)
+                self._validators.move_to_end(url)
+                while len(self._validators) > self._max_validators:
+                    self._validators.popitem(last=False)
+            else:
+                self._validators.pop(url, None)
+        return text
+
+    def download(self, url: str, out: BinaryIO) -> int:
+        """
+        Writes the body of a GET request into `out` while it's being received.
+        :return int:    Written bytes
+        """
+        start = out.tell()
+        status,_,_ = self._request('GET', url, None, None, out)
+        if status != 200:
+            raise TwitchApiException(f"Got status {status} while downloading {url}")
+        return out.tell() - start
+
+    def gql(self, query: str, variables: Optional[Dict[str,Any]] = None) -> Dict[str,Any]:
+        """
+        Runs a GQL query.
+        :return:    `data` field of the response
+        """
+        payload = {'query': query}
+        if variables is not None:
+            payload['variables'] = variables
+        return self._gql_response(self._post_gql(payload))
+
+    def gql_operation(self, operation_name: str, sha256: str, variables: Dict[str,Any]) -> Dict[str,Any]:
+        """
+        Runs a persisted GQL query (the ones the web player uses, identified by their hash).
+        :return:    `data` field of the response
+        """
+        payload = {'operationName': operation_name, 'variables': variables,
+                   'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha256}}}
+        return self._gql_response(self._post_gql(payload))
+
+    def _post_gql(self, payload: Any) -> Any:
+        status,_,data = self.request('POST', self._gql_url, json.dumps(payload).encode('utf-8'),
+                                     {'Client-ID': TwitchApiClient.CLIENT_ID, 'Content-Type': 'application/json'})
+        if status != 200:
+            raise TwitchApiException(f"Got status {status} from GQL: {data[:200]}")
+        return json.loads(data)
+
+    @staticmethod
+    def _gql_response(response: Dict[str,Any]) -> Dict[str,Any]:
+        if response.get('errors'):
+            raise TwitchApiException(f"GQL error: {response['errors']}")
+        return response['data']
+
+    def close(self):
+        with self._lock:
+            connections = [connection for idle in self._idle.values() for connection in idle]
+            self._idle = {}
+        for connection in connections:
+            connection.close()
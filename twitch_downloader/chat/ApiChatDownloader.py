@@ -0,0 +1,97 @@
+from .AsyncChatDownloader import AsyncChatDownloader
+from .ChatLog import ChatLog
+from .ChatStore import ChatStore
+from ..VideoDownloader import VideoDownloader
+from ..api.TwitchApiClient import TwitchApiClient
+
+import os
+import asyncio
+import logging
+from typing import Any,Dict,Optional
+
+class ApiChatDownloader(AsyncChatDownloader):
+    """
+    Downloads the chat page by page through the Twitch API.
+    The comments are appended to a log on the output's folder, so it can be called while the video is still
+    being streamed (`sync_chat`), and the final `get_chat` only needs to get the last comments.
+    At the end the log is converted into a `ChatStore`, and the requested format is exported from it.
+    """
+    STORE_FORMAT = 'tcs'
+    _COMMENTS_OPERATION = 'VideoCommentsByOffsetOrCursor'
+    _COMMENTS_HASH = 'b70a3591ff0f4e0313d126c6a1502d79a1c02baebb288227c582044aa76adf6a'
+
+    def __init__(self, client: TwitchApiClient = None, keep_store: bool = False):
+        """
+        :param keep_store bool: Keep the chat store (`<id>.tcs*` files, on the output's folder) along with the requested format
+        """
+        self._client = TwitchApiClient.default() if client is None else client
+        self._keep_store = keep_store
+        self._locks = {} # one sync at a time for each log
+
+    @staticmethod
+    def _parse_comment(node: Dict[str,Any]) -> Dict[str,Any]:
+        commenter = node.get('commenter') or {}
+        message = node.get('message') or {}
+        return {
+            'id': node['id'],
+            'offset': node['contentOffsetSeconds'],
+            'created': node.get('createdAt'),
+            'user': commenter.get('login', ''),
+            'display': commenter.get('displayName') or commenter.get('login', ''),
+            'color': message.get('userColor'),
+            'text': ''.join(fragment.get('text', '') for fragment in message.get('fragments') or []),
+        }
+
+    def _get_page(self, id: str, offset: float, cursor: Optional[str]) -> Dict[str,Any]:
+        variables = {'videoID': id}
+        if cursor is None:
+            variables['contentOffsetSeconds'] = int(offset)
+        else:
+            variables['cursor'] = cursor
+        video = self._client.gql_operation(ApiChatDownloader._COMMENTS_OPERATION, ApiChatDownloader._COMMENTS_HASH, variables)['video']
+        if video is None:
+            raise Exception(f"Couldn't get the chat of video {id}")
+        return video['comments']
+
+    def _sync(self, id: str, folder: str) -> int:
+        log = ChatLog(folder, id)
+        start_count = log.count
+        cursor = None
+        while True:
+            comments = self._get_page(id, log.last_offset, cursor)
+            edges = comments.get('edges') or []
+            log.append([comment for comment in (ApiChatDownloader._parse_comment(edge['node']) for edge in edges) if log.is_new(comment)])
+
+            if not comments['pageInfo']['hasNextPage'] or len(edges) == 0:
+                break
+            cursor = edges[-1]['cursor']
+        return log.count - start_count
+
+    async def sync_chat(self, id_or_url: str, folder: str):
+        id = VideoDownloader.get_id(id_or_url)
+        lock = self._locks.setdefault((id, folder), asyncio.Lock())
+        async with lock:
+            got = await asyncio.get_event_loop().run_in_executor(None, self._sync, id, folder)
+        logging.debug(f"Got {got} new chat messages of video {id}")
+
+    def _export(self, id: str, folder: str, format: str, out_path: str):
+        store_path = out_path if format == ApiChatDownloader.STORE_FORMAT else os.path.join(folder, f"{id}.{ApiChatDownloader.STORE_FORMAT}")
+        ChatStore.build(iter(ChatLog(folder, id)), store_path)
+        if format == ApiChatDownloader.STORE_FORMAT:
+            return
+
+        with ChatStore(store_path) as store, open(out_path, 'w', encoding='utf-8') as out:
+            store.export(format, out)
+        if not self._keep_store:
+            for path in ChatStore.files(store_path):
+                os.remove(path)
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        id = VideoDownloader.get_id(id_or_url)
+        folder = os.path.dirname(os.path.abspath(out_path))
+        await self.sync_chat(id, folder) # only the comments that weren't got while streaming
+        await asyncio.get_event_loop().run_in_executor(None, self._export, id, folder, format, out_path)
+        ChatLog(folder, id).remove()
+        # the log may have been synced on another folder (the capture's workspace, before it was moved)
+        for key in [key for key in self._locks if key[0] == id]:
+            del self._locks[key]
@@ -0,0 +1,5 @@
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+
+class AsyncChatDownloader(AsyncVideoDownloader):
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        pass
@@ -0,0 +1,26 @@
+from .AsyncChatDownloader import AsyncChatDownloader
+from ..VideoDownloader import VideoDownloader
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from ..metrics.Trace import Trace
+
+import os,shutil
+import sys
+import asyncio
+from typing import List
+
+class AsyncTCDChatDownloader(AsyncChatDownloader):
+    def __init__(self, tcd_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Twitch-Chat-Downloader/app.py")):
+        self._interpreter = sys.executable
+        self._tcd_path = tcd_path
+        self._expected_path = os.path.join(os.getcwd(), 'chats') # it will generate the file on the same folder as the MAIN script
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        id = VideoDownloader.get_id(id_or_url)
+        result = await self._run_command(id, '--format', format)
+        Trace.log('tcd', f"Result of the download chat command: ```{result}```")
+
+        # move the file
+        await asyncio.get_event_loop().run_in_executor(None, shutil.move, os.path.join(self._expected_path, f'v{id}.srt'), out_path)
+
+    async def _run_command(self, *args: List[str]) -> str:
+        return await AsyncVideoDownloader.run_command(self._interpreter, '-u', self._tcd_path, *args)
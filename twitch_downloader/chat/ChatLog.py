@@ -0,0 +1,72 @@
+import os
+import json
+from typing import Any,Dict,Iterator,List
+from scheduler.StateJournal import StateJournal
+
+class ChatLog:
+    """
+    Comments of a video already downloaded, appended to a JSON-lines file as they're got.
+    A cursor file (next to the log) keeps how far the log was written, so the download can continue from there.
+    """
+    def __init__(self, folder: str, id: str):
+        self._path = os.path.join(folder, f"{id}.chat.jsonl")
+        self._cursor_path = os.path.join(folder, f"{id}.chat.cursor.json")
+        self._cursor = StateJournal(self._cursor_path)
+        self.size = 0            # bytes of the log that are valid
+        self.count = 0           # comments on the log
+        self.last_offset = 0     # offset (seconds) of the last comment
+        self.last_ids = []       # IDs of the comments with `last_offset` (the next page may repeat them)
+        cursor = self._cursor.load()
+        if cursor is not None:
+            self.size,self.count,self.last_offset,self.last_ids = cursor['size'],cursor['count'],cursor['last_offset'],cursor['last_ids']
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def is_new(self, comment: Dict[str,Any]) -> bool:
+        return comment['offset'] > self.last_offset or (comment['offset'] == self.last_offset and comment['id'] not in self.last_ids)
+
+    def append(self, comments: List[Dict[str,Any]]):
+        """
+        Adds comments (newer than the ones already on the log) and saves the cursor.
+        """
+        if len(comments) == 0:
+            return
+
+        with open(self._path, 'ab') as f:
+            f.truncate(self.size) # something may have been written after the last saved cursor
+            f.seek(self.size)
+            for comment in comments:
+                f.write(json.dumps(comment).encode('utf-8') + b'\n')
+                if comment['offset'] != self.last_offset:
+                    self.last_offset = comment['offset']
+                    self.last_ids = []
+                self.last_ids.append(comment['id'])
+            f.flush()
+            os.fsync(f.fileno())
+            self.size = f.tell()
+        self.count += len(comments)
+        self._save_cursor()
+
+    def _save_cursor(self):
+        self._cursor.save({'size': self.size, 'count': self.count, 'last_offset': self.last_offset, 'last_ids': self.last_ids})
+
+    def __iter__(self) -> Iterator[Dict[str,Any]]:
+        """
+        Reads the comments one by one (without loading the whole log).
+        """
+        if not os.path.isfile(self._path):
+            return
+        with open(self._path, 'rb') as f:
+            read = 0
+            for line in f:
+                read += len(line)
+                if read > self.size:
+                    break # not confirmed by the cursor
+                yield json.loads(line)
+
+    def remove(self):
+        for path in (self._path, self._cursor_path):
+            if os.path.isfile(path):
+                os.remove(path)
@@ -0,0 +1,166 @@
+import os
+import json
+import mmap
+import array
+import struct
+from typing import Any,Callable,Dict,Iterable,Iterator,Optional,TextIO
+from .ChatWriter import ChatWriter
+
+class ChatStore:
+    """
+    Compact chat storage that can be queried without reading all of it:
+    - `<path>`:             length-prefixed binary messages (offset in ms, user number, message ID, creation time, text)
+    - `<path>.idx`:         offset in ms and position of each message, ordered; it's memory-mapped and binary-searched
+    - `<path>.users.json`:  user dictionary (login, display name and color of each user number)
+    - `<path>.users.idx`:   number of the messages of each user (first and count of each user, followed by the lists)
+    """
+    MAGIC = b'TCS2'
+    _RECORD = struct.Struct('<IIBBH')   # offset (ms), user number, ID length, creation time length, text length
+    _INDEX = struct.Struct('<IQ')       # offset (ms), position on the messages file
+    _USER_RANGE = struct.Struct('<II')  # first entry on the user lists, number of messages
+    _USER_ENTRY = struct.Struct('<I')   # message number
+
+    @staticmethod
+    def files(path: str) -> Iterable[str]:
+        return (path, path + '.idx', path + '.users.json', path + '.users.idx')
+
+    @staticmethod
+    def build(comments: Iterable[Dict[str,Any]], path: str):
+        """
+        Writes a store from comments ordered by offset (they're processed one by one).
+        """
+        users = {} # login -> number
+        user_list = []
+        user_messages = [] # message numbers of each user (just the numbers are kept)
+        with open(path, 'wb') as messages, open(path + '.idx', 'wb') as index:
+            messages.write(ChatStore.MAGIC)
+            for n,comment in enumerate(comments):
+                user = users.get(comment['user'])
+                if user is None:
+                    user = users[comment['user']] = len(user_list)
+                    user_list.append([comment['user'], comment['display'], comment.get('color')])
+                    user_messages.append(array.array('I'))
+                user_messages[user].append(n)
+
+                offset = int(round(comment['offset'] * 1000))
+                id = (comment.get('id') or '').encode('utf-8')[:0xFF]
+                created = (comment.get('created') or '').encode('utf-8')[:0xFF]
+                text = comment['text'].encode('utf-8')[:0xFFFF]
+                index.write(ChatStore._INDEX.pack(offset, messages.tell()))
+                messages.write(ChatStore._RECORD.pack(offset, user, len(id), len(created), len(text)))
+                messages.write(id + created + text)
+
+        with open(path + '.users.json', 'w', encoding='utf-8') as f:
+            json.dump(user_list, f)
+        with open(path + '.users.idx', 'wb') as f:
+            first = 0
+            for numbers in user_messages:
+                f.write(ChatStore._USER_RANGE.pack(first, len(numbers)))
+                first += len(numbers)
+            for numbers in user_messages:
+                f.write(struct.pack(f'<{len(numbers)}I', *numbers))
+
+    def __init__(self, path: str):
+        self._path = path
+        with open(path + '.users.json', 'r', encoding='utf-8') as f:
+            self._users = json.load(f)
+        self._user_numbers = {user[0]: n for n,user in enumerate(self._users)}
+
+        self._messages_file = open(path, 'rb')
+        self._index_file = open(path + '.idx', 'rb')
+        self._users_index_file = open(path + '.users.idx', 'rb')
+        self._messages = mmap.mmap(self._messages_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._messages[:len(ChatStore.MAGIC)] != ChatStore.MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a chat store")
+        self._count = os.path.getsize(path + '.idx') // ChatStore._INDEX.size
+        # mmap can't map empty files
+        self._index = None if self._count == 0 else mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._users_index = None if len(self._users) == 0 else mmap.mmap(self._users_index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> 'ChatStore':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if getattr(self, '_index', None) is not None:
+            self._index.close()
+        if getattr(self, '_users_index', None) is not None:
+            self._users_index.close()
+        self._messages.close()
+        self._index_file.close()
+        self._users_index_file.close()
+        self._messages_file.close()
+
+    def _index_entry(self, n: int):
+        return ChatStore._INDEX.unpack_from(self._index, n * ChatStore._INDEX.size)
+
+    def _user_entry(self, n: int) -> int:
+        return ChatStore._USER_ENTRY.unpack_from(self._users_index, len(self._users) * ChatStore._USER_RANGE.size + n * ChatStore._USER_ENTRY.size)[0]
+
+    def _bisect(self, offset_ms: int, low: int = 0, high: Optional[int] = None, message: Optional[Callable[[int],int]] = None) -> int:
+        """
+        :param message:     Message number of each entry between `low` and `high` (the number itself if `None`)
+        :return:            First entry with an offset equal or greater than `offset_ms`
+        """
+        if high is None:
+            high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._index_entry(middle if message is None else message(middle))[0] < offset_ms:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _read(self, position: int) -> Dict[str,Any]:
+        offset,user,id_length,created_length,length = ChatStore._RECORD.unpack_from(self._messages, position)
+        start = position + ChatStore._RECORD.size
+        id = self._messages[start:start+id_length].decode('utf-8')
+        start += id_length
+        created = self._messages[start:start+created_length].decode('utf-8')
+        start += created_length
+        login,display,color = self._users[user]
+        return {'id': id or None, 'offset': offset / 1000, 'created': created or None, 'user': login, 'display': display, 'color': color,
+                'text': self._messages[start:start+length].decode('utf-8', errors='replace')}
+
+    def between(self, start: float = 0, end: Optional[float] = None) -> Iterator[Dict[str,Any]]:
+        """
+        Messages sent between `start` (included) and `end` (excluded) seconds of the video.
+        """
+        end_ms = None if end is None else int(round(end * 1000))
+        for n in range(self._bisect(int(round(start * 1000))), self._count):
+            offset,position = self._index_entry(n)
+            if end_ms is not None and offset >= end_ms:
+                break
+            yield self._read(position)
+
+    def from_user(self, login: str, start: float = 0, end: Optional[float] = None) -> Iterator[Dict[str,Any]]:
+        """
+        Messages sent by a user; only its messages are read (through `<path>.users.idx`).
+        """
+        user = self._user_numbers.get(login)
+        if user is None:
+            return
+        first,count = ChatStore._USER_RANGE.unpack_from(self._users_index, user * ChatStore._USER_RANGE.size)
+        end_ms = None if end is None else int(round(end * 1000))
+        for n in range(self._bisect(int(round(start * 1000)), first, first + count, self._user_entry), first + count):
+            offset,position = self._index_entry(self._user_entry(n))
+            if end_ms is not None and offset >= end_ms:
+                break
+            yield self._read(position)
+
+    def __iter__(self) -> Iterator[Dict[str,Any]]:
+        for n in range(self._count):
+            yield self._read(self._index_entry(n)[1])
+
+    def export(self, format: str, out: TextIO, start: float = 0, end: Optional[float] = None):
+        """
+        Writes the messages (or the ones on a time range) on a chat format.
+        """
+        ChatWriter.write(self.between(start, end), format, out)
@@ -0,0 +1,61 @@
+import json
+from typing import Any,Dict,Iterable,TextIO
+
+class ChatWriter:
+    """
+    Writes comments on a chat format while they're read (the whole chat is never in memory)
+    """
+    FORMATS = ['srt', 'json', 'ass']
+    DURATION = 5.0 # seconds each comment is shown as a subtitle
+
+    @staticmethod
+    def _timestamp(seconds: float, separator: str = ',', hour_digits: int = 2, fraction_digits: int = 3) -> str:
+        hours,rest = divmod(seconds, 3600)
+        minutes,seconds = divmod(rest, 60)
+        fraction = int(round((seconds % 1) * 10**fraction_digits))
+        if fraction == 10**fraction_digits: # rounded up
+            fraction = 0
+            seconds += 1
+        return f"{int(hours):0{hour_digits}d}:{int(minutes):02d}:{int(seconds):02d}{separator}{fraction:0{fraction_digits}d}"
+
+    @staticmethod
+    def _write_srt(comments: Iterable[Dict[str,Any]], out: TextIO):
+        for n,comment in enumerate(comments, start=1):
+            start = ChatWriter._timestamp(comment['offset'])
+            end = ChatWriter._timestamp(comment['offset'] + ChatWriter.DURATION)
+            out.write(f"{n}\n{start} --> {end}\n{comment['display']}: {comment['text']}\n\n")
+
+    @staticmethod
+    def _write_json(comments: Iterable[Dict[str,Any]], out: TextIO):
+        out.write('[')
+        for n,comment in enumerate(comments):
+            if n > 0:
+                out.write(',')
+            out.write('\n' + json.dumps(comment))
+        out.write('\n]\n')
+
+    @staticmethod
+    def _write_ass(comments: Iterable[Dict[str,Any]], out: TextIO):
+        out.write("[Script Info]\nScriptType: v4.00+\nWrapStyle: 0\n\n"
+                  "[V4+ Styles]\nFormat: Name, Fontname, Fontsize, PrimaryColour, BackColour, Bold, Italic, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n"
+                  "Style: Default,Arial,20,&H00FFFFFF,&H80000000,0,0,1,1,0,7,10,10,10,1\n\n"
+                  "[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+        for comment in comments:
+            start = ChatWriter._timestamp(comment['offset'], '.', 1, 2)
+            end = ChatWriter._timestamp(comment['offset'] + ChatWriter.DURATION, '.', 1, 2)
+            text = comment['text'].replace('\n', ' ').replace('{', '(').replace('}', ')')
+            name = comment['display']
+            color = comment.get('color')
+            if color is not None and len(color) == 7:
+                name = "{\\c&H" + color[5:7] + color[3:5] + color[1:3] + "&}" + name + "{\\c}" # ASS colors are BGR
+            out.write(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{name}: {text}\n")
+
+    @staticmethod
+    def write(comments: Iterable[Dict[str,Any]], format: str, out: TextIO):
+        """
+        :param comments:    Comments (ordered by offset); they can be a generator
+        :param format str:  One of `FORMATS`
+        """
+        if format not in ChatWriter.FORMATS:
+            raise ValueError(f"Unsupported chat format '{format}'; valid formats are: {ChatWriter.FORMATS}")
+        getattr(ChatWriter, '_write_' + format)(comments, out)
@@ -1,11 +1,11 @@
 from .ChatDownloader import ChatDownloader
 from ..VideoDownloader import VideoDownloader
+from ..metrics.Trace import Trace
 
 import os,shutil
 import subprocess
 import sys
 from typing import List
-import logging
 
 class TCDChatDownloader(ChatDownloader):
     def __init__(self, tcd_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Twitch-Chat-Downloader/app.py")):
@@ -16,7 +16,7 @@ class TCDChatDownloader(ChatDownloader):
     def get_chat(self, id_or_url: str, format: str, out_path: str):
         id = VideoDownloader.get_id(id_or_url)
         result = self._run_command(id, '--format', format)
-        logging.debug(f"Result of the download chat command: ```{result}```")
+        Trace.log('tcd', f"Result of the download chat command: ```{result}```")
 
         # move the file
         shutil.move(os.path.join(self._expected_path, f'v{id}.srt'), out_path)
@@ -0,0 +1,61 @@
+from typing import Dict,Any
+import logging
+import os
+from .TwitchDownloaderFactory import TwitchDownloaderFactory
+from ..VideoDownloader import VideoDownloader,InvalidQualityException
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from ..metrics.Metrics import Metrics
+from ..chat.AsyncChatDownloader import AsyncChatDownloader
+from ..chat.AsyncTCDChatDownloader import AsyncTCDChatDownloader
+from ..chat.ApiChatDownloader import ApiChatDownloader
+from ..video.AsyncTwitchDlDownloader import AsyncTwitchDlDownloader
+
+class AsyncVideoAndChatDownloader(AsyncVideoDownloader):
+    """
+    Merges AsyncChatDownloader and AsyncTwitchDlDownloader to get both chat and video
+    """
+    def __init__(self, twitchdl_downloader: AsyncTwitchDlDownloader, chat_downloader: AsyncChatDownloader):
+        self._twitchdl_downloader = twitchdl_downloader
+        self._chat_downloader = chat_downloader
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        try:
+            await self._download(id_or_url, quality, out_path)
+        except InvalidQualityException as ex:
+            # use the closest one that is there instead
+            fallback = VideoDownloader.fallback_quality(quality, ex.valid_qualities)
+            if fallback is None or fallback == quality:
+                raise ex
+            logging.warning(f"Quality {quality} is not available; downloading {fallback} instead")
+            Metrics.default().inc('quality_fallbacks_total')
+            await self._download(id_or_url, fallback, out_path)
+
+    async def _download(self, id_or_url: str, quality: str, out_path: str):
+        await self._twitchdl_downloader.download(id_or_url, quality, out_path)
+        if not os.path.isfile(out_path):
+            raise Exception("Couldn't find file at its expected path.")
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        return await self._twitchdl_downloader.get_info(id_or_url)
+
+    async def get_last_video(self, channel: str) -> str:
+        return await self._twitchdl_downloader.get_last_video(channel)
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        await self._chat_downloader.get_chat(id_or_url, format, out_path)
+
+    async def sync_chat(self, id_or_url: str, folder: str):
+        await self._chat_downloader.sync_chat(id_or_url, folder)
+
+class AsyncTwitchVideoAndChatDownloaderFactory(TwitchDownloaderFactory):
+    def __init__(self, native_chat: bool = False, chat_store: bool = False):
+        """
+        :param native_chat bool:    Download the chat through the Twitch API (instead of TCD)
+        :param chat_store bool:     Keep the native chat store along with the chat
+        """
+        self._native_chat = native_chat
+        self._chat_store = chat_store
+
+    def build(self) -> AsyncVideoDownloader:
+        return AsyncVideoAndChatDownloader(twitchdl_downloader=AsyncTwitchDlDownloader(),
+                                           chat_downloader=ApiChatDownloader(keep_store=self._chat_store) if self._native_chat else AsyncTCDChatDownloader())
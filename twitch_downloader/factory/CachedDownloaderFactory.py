@@ -0,0 +1,24 @@
+from .TwitchDownloaderFactory import TwitchDownloaderFactory
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from ..ThreadedVideoDownloader import ThreadedVideoDownloader
+from ..CachedVideoDownloader import CachedVideoDownloader
+
+class CachedDownloaderFactory(TwitchDownloaderFactory):
+    """
+    Adds a metadata cache in front of the downloaders of another factory.
+    All the built downloaders are the same one, so they share the cache.
+    """
+    def __init__(self, downloader_factory: TwitchDownloaderFactory, info_ttl: float = 60.0, last_video_ttl: float = 30.0, max_entries: int = 1024):
+        self._downloader_factory = downloader_factory
+        self._info_ttl = info_ttl
+        self._last_video_ttl = last_video_ttl
+        self._max_entries = max_entries
+        self._downloader = None
+
+    def build(self) -> AsyncVideoDownloader:
+        if self._downloader is None:
+            downloader = self._downloader_factory.build()
+            if not isinstance(downloader, AsyncVideoDownloader):
+                downloader = ThreadedVideoDownloader(downloader)
+            self._downloader = CachedVideoDownloader(downloader, self._info_ttl, self._last_video_ttl, self._max_entries)
+        return self._downloader
@@ -0,0 +1,39 @@
+from typing import Optional
+from .TwitchDownloaderFactory import TwitchDownloaderFactory
+from .AsyncTwitchVideoAndChatDownloaderFactory import AsyncVideoAndChatDownloader
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from ..api.TwitchApiClient import TwitchApiClient
+from ..hls.RateLimiter import RateLimiter
+from ..chat.AsyncTCDChatDownloader import AsyncTCDChatDownloader
+from ..chat.ApiChatDownloader import ApiChatDownloader
+from ..video.HlsVideoDownloader import HlsVideoDownloader
+from scheduler.ResourceLimits import ResourceLimits
+from storage.StorageManager import StorageManager
+
+class HlsVideoAndChatDownloaderFactory(TwitchDownloaderFactory):
+    """
+    Downloads the videos natively (parallel HLS segments), and the chat natively or with TCD
+    """
+    def __init__(self, client: TwitchApiClient = None, connections: int = 4, job_rate: Optional[float] = None, global_rate: Optional[float] = None,
+                        native_chat: bool = True, chat_store: bool = False, limits: Optional[ResourceLimits] = None, storage: Optional[StorageManager] = None):
+        """
+        :param job_rate float:      Max. bytes per second of each download (`None` for no limit)
+        :param global_rate float:   Max. bytes per second of all the downloads together (`None` for no limit)
+        :param native_chat bool:    Download the chat through the Twitch API (instead of TCD)
+        :param chat_store bool:     Keep the native chat store along with the chat
+        :param limits:              Limits shared with the rest of the FFmpeg jobs (the downloads are reformatted after getting the segments)
+        :param storage:             Where to reserve the space of the reformatted videos
+        """
+        self._native_chat = native_chat
+        self._chat_store = chat_store
+        self._client = TwitchApiClient.default() if client is None else client
+        self._connections = connections
+        self._job_rate = job_rate
+        self._limits = limits
+        self._storage = storage
+        self._global_limiter = None if global_rate is None else RateLimiter(global_rate) # shared by all the built downloaders
+
+    def build(self) -> AsyncVideoDownloader:
+        return AsyncVideoAndChatDownloader(twitchdl_downloader=HlsVideoDownloader(self._client, self._connections, self._job_rate, self._global_limiter,
+                                                                                  self._limits, self._storage),
+                                           chat_downloader=ApiChatDownloader(self._client, self._chat_store) if self._native_chat else AsyncTCDChatDownloader())
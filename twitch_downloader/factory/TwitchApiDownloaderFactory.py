@@ -0,0 +1,39 @@
+from .TwitchDownloaderFactory import TwitchDownloaderFactory
+from .AsyncTwitchVideoAndChatDownloaderFactory import AsyncTwitchVideoAndChatDownloaderFactory
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from ..ThreadedVideoDownloader import ThreadedVideoDownloader
+from ..BatchingVideoDownloader import BatchingVideoDownloader
+from ..api.TwitchApiClient import TwitchApiClient
+from ..video.TwitchApiDownloader import TwitchApiDownloader
+
+class TwitchApiDownloaderFactory(TwitchDownloaderFactory):
+    """
+    Queries the videos through the Twitch API; downloads them with twitch-dl and TCD.
+    All the built downloaders share the same HTTP connections.
+    """
+    def __init__(self, client: TwitchApiClient = None, downloader_factory: TwitchDownloaderFactory = None, batch_window: float = None):
+        """
+        :param batch_window float:  If set, all the built downloaders will be the same one, batching the queries done
+                                    within this amount of seconds
+        """
+        self._client = TwitchApiClient.default() if client is None else client
+        self._downloader_factory = AsyncTwitchVideoAndChatDownloaderFactory() if downloader_factory is None else downloader_factory
+        self._batch_window = batch_window
+        self._batching_downloader = None
+
+    @property
+    def client(self) -> TwitchApiClient:
+        return self._client
+
+    def build(self) -> AsyncVideoDownloader:
+        if self._batch_window is not None:
+            if self._batching_downloader is None:
+                self._batching_downloader = BatchingVideoDownloader(self._build(), self._batch_window)
+            return self._batching_downloader
+        return self._build()
+
+    def _build(self) -> AsyncVideoDownloader:
+        downloader = self._downloader_factory.build()
+        if not isinstance(downloader, AsyncVideoDownloader):
+            downloader = ThreadedVideoDownloader(downloader)
+        return TwitchApiDownloader(self._client, downloader)
@@ -1,5 +1,4 @@
 from typing import Dict,Any
-from time import sleep
 import logging
 import os
 from .TwitchDownloaderFactory import TwitchDownloaderFactory
@@ -17,24 +16,20 @@ class VideoAndChatDownloader(VideoDownloader):
         self._chat_downloader = chat_downloader
 
     def download(self, id_or_url: str, quality: str, out_path: str):
-        # there's a bug with TwitchDl where sometimes the quality disappears, and another where the program crashes and it needs to be launched again; we'll try some times
-        tries = 0
-        max_tries = 4
-        while tries < max_tries:
-            try:
-                self._twitchdl_downloader.download(id_or_url, quality, out_path)
-                if not os.path.isfile(out_path):
-                    raise Exception("Couldn't find file at its expected path.")
-                break # downloaded succesfully
-            except InvalidQualityException as ex: # retrying with other exceptions could be bad
-                tries += 1
-                if tries >= max_tries:
-                    raise ex # reached max retries
-                else:
-                    # try again after some time
-                    logging.debug("Got an " + ex.__class__.__name__ + "; trying again to make sure it's not a false-negative.")
-                    logging.debug(ex, exc_info=True)
-                    sleep(8)
+        try:
+            self._download(id_or_url, quality, out_path)
+        except InvalidQualityException as ex:
+            # use the closest one that is there instead
+            fallback = VideoDownloader.fallback_quality(quality, ex.valid_qualities)
+            if fallback is None or fallback == quality:
+                raise ex
+            logging.warning(f"Quality {quality} is not available; downloading {fallback} instead")
+            self._download(id_or_url, fallback, out_path)
+
+    def _download(self, id_or_url: str, quality: str, out_path: str):
+        self._twitchdl_downloader.download(id_or_url, quality, out_path)
+        if not os.path.isfile(out_path):
+            raise Exception("Couldn't find file at its expected path.")
 
     def get_info(self, id_or_url: str) -> Dict[str,Any]:
         return self._twitchdl_downloader.get_info(id_or_url)
@@ -0,0 +1,141 @@
+import re
+import os
+from datetime import datetime
+from typing import Dict,List,Optional
+from urllib.parse import urljoin,urlparse
+
+class HlsSegment:
+    def __init__(self, index: int, uri: str, duration: float, discontinuity: bool = False, title: str = '', program_date_time: Optional[datetime] = None):
+        self.index = index                  # position of the segment inside the stream (it doesn't change when it gets muted)
+        self.uri = uri                      # absolute URL of the segment
+        self.duration = duration            # in seconds
+        self.discontinuity = discontinuity  # there's a `#EXT-X-DISCONTINUITY` right before the segment
+        self.title = title                  # title on `#EXTINF`; Twitch uses 'live' for the stream segments
+        self.program_date_time = program_date_time # when it was streamed (UTC), if the playlist says it
+
+    @property
+    def ad(self) -> bool:
+        """
+        Ad inserted by Twitch on a live stream
+        """
+        return self.title != '' and self.title != 'live'
+
+    @property
+    def muted(self) -> bool:
+        return HlsSegment._muted_pattern.search(os.path.basename(urlparse(self.uri).path)) is not None
+
+    _muted_pattern = re.compile(r'-muted\.\w+$')
+
+class HlsPlaylist:
+    """
+    Media playlist (the one with the segments) of a HLS stream
+    """
+    def __init__(self, segments: List[HlsSegment], target_duration: float, media_sequence: int, ended: bool):
+        self.segments = segments
+        self.target_duration = target_duration
+        self.media_sequence = media_sequence
+        self.ended = ended                  # `#EXT-X-ENDLIST` found; no more segments will be added
+
+    @property
+    def duration(self) -> float:
+        return sum(segment.duration for segment in self.segments)
+
+    @staticmethod
+    def _segment_index(uri: str, default: int) -> int:
+        # Twitch VOD segments are named `<n>.ts`, `<n>-muted.ts` or `<n>-unmuted.ts`; live segments don't follow any pattern
+        match = re.match(r'^(\d+)(?:-(?:un)?muted)?\.\w+$', os.path.basename(urlparse(uri).path))
+        return default if match is None else int(match.group(1))
+
+    @staticmethod
+    def _parse_date_time(date_time: str) -> datetime:
+        # ISO 8601 with milliseconds and timezone (always UTC on Twitch)
+        date_time = re.sub(r'(Z|[+-]00:?00)$', '', date_time)
+        if '.' in date_time:
+            date_time, fraction = date_time.split('.', 1)
+            date_time += '.' + fraction[:6].ljust(6, '0')
+        return datetime.fromisoformat(date_time)
+
+    @staticmethod
+    def parse(text: str, base_url: str) -> 'HlsPlaylist':
+        """
+        Parses a media playlist.
+        :param text str:        Contents of the playlist
+        :param base_url str:    URL of the playlist (the segments are relative to it)
+        """
+        segments = []
+        target_duration = 0.0
+        media_sequence = 0
+        ended = False
+
+        duration = None
+        title = ''
+        discontinuity = False
+        program_date_time = None
+        for line in text.splitlines():
+            line = line.strip()
+            if line == '':
+                continue
+            elif line.startswith('#EXT-X-TARGETDURATION:'):
+                target_duration = float(line.split(':', 1)[1])
+            elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                media_sequence = int(line.split(':', 1)[1])
+            elif line.startswith('#EXTINF:'):
+                info = line.split(':', 1)[1].split(',', 1)
+                duration = float(info[0])
+                title = '' if len(info) < 2 else info[1].strip()
+            elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+                try:
+                    program_date_time = HlsPlaylist._parse_date_time(line.split(':', 1)[1])
+                except ValueError:
+                    program_date_time = None
+            elif line == '#EXT-X-DISCONTINUITY':
+                discontinuity = True
+            elif line == '#EXT-X-ENDLIST':
+                ended = True
+            elif not line.startswith('#') and duration is not None:
+                index = HlsPlaylist._segment_index(line, media_sequence + len(segments))
+                segments.append(HlsSegment(index, urljoin(base_url, line), duration, discontinuity, title, program_date_time))
+                duration = None
+                title = ''
+                discontinuity = False
+                program_date_time = None
+
+        return HlsPlaylist(segments, target_duration, media_sequence, ended)
+
+    @staticmethod
+    def parse_master(text: str, base_url: str) -> Dict[str,str]:
+        """
+        Parses a master playlist.
+        :return:    Media playlist URL by its quality name (both the display name, like '480p', and the group ID, like '480p30')
+        """
+        names = {} # group ID -> display name
+        for match in re.finditer(r'#EXT-X-MEDIA:.*?GROUP-ID="([^"]+)".*?NAME="([^"]+)"', text):
+            names[match.group(1)] = match.group(2)
+
+        r = {}
+        group_id = None
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith('#EXT-X-STREAM-INF:'):
+                match = re.search(r'VIDEO="([^"]+)"', line)
+                group_id = None if match is None else match.group(1)
+            elif line != '' and not line.startswith('#') and group_id is not None:
+                url = urljoin(base_url, line)
+                r[group_id] = url
+                r.setdefault(names.get(group_id, group_id), url)
+                group_id = None
+        return r
+
+    @staticmethod
+    def select_quality(playlists: Dict[str,str], quality: str) -> Optional[str]:
+        """
+        Picks the media playlist with the desired quality, using the same names as twitch-dl (eg. '480p', '720p60' or 'source').
+        """
+        if quality in playlists:
+            return playlists[quality]
+        if quality == 'source' and 'chunked' in playlists:
+            return playlists['chunked']
+        for name,url in playlists.items():
+            if name.startswith(quality) or name.split(' ')[0] == quality: # '480p' -> '480p30'; '1080p60' -> '1080p60 (source)'
+                return url
+        return None
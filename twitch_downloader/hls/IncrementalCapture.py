@@ -0,0 +1,52 @@
+import os
+import asyncio
+import logging
+from .HlsPlaylist import HlsPlaylist
+from .SegmentManifest import SegmentManifest
+from .TwitchPlaylistResolver import TwitchPlaylistResolver
+from ..api.TwitchApiClient import TwitchApiClient
+
+class IncrementalCapture:
+    """
+    Captures a (maybe still growing) video by appending to a part file only the segments that weren't captured before.
+    The segments are stored as they were got, so segments muted afterwards by Twitch are kept unmuted.
+    """
+    def __init__(self, client: TwitchApiClient = None, resolver: TwitchPlaylistResolver = None):
+        self._client = TwitchApiClient.default() if client is None else client
+        self._resolver = TwitchPlaylistResolver(self._client) if resolver is None else resolver
+
+    @staticmethod
+    def manifest_path(part_path: str) -> str:
+        return part_path + '.manifest.json'
+
+    def _capture(self, id: str, quality: str, part_path: str) -> float:
+        manifest = SegmentManifest(IncrementalCapture.manifest_path(part_path))
+        playlist_url = self._resolver.get_playlist(id, quality)
+        playlist = HlsPlaylist.parse(self._client.get_text(playlist_url), playlist_url)
+
+        new_segments = [segment for segment in playlist.segments if segment.index >= manifest.next_index]
+        logging.debug(f"Got {len(new_segments)} new segments for video {id} ({len(manifest.segments)} already captured)")
+        with SegmentManifest.open_part(part_path, manifest.size) as f:
+            for segment in new_segments:
+                size = self._client.download(segment.uri, f)
+                f.flush()
+                manifest.add(segment.index, segment.duration, size)
+                manifest.save()
+
+        return manifest.duration
+
+    async def capture(self, id: str, quality: str, part_path: str) -> float:
+        """
+        Appends the new segments of a video into `part_path`.
+        :param id str:          ID of the Twitch video
+        :param quality str:     Quality of the video (the same for all the calls on the same `part_path`)
+        :param part_path str:   File where to append the segments (MPEG-TS)
+        :return float:          Captured seconds
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, self._capture, id, quality, part_path)
+
+    @staticmethod
+    def cleanup(part_path: str):
+        for path in (part_path, IncrementalCapture.manifest_path(part_path)):
+            if os.path.isfile(path):
+                os.remove(path)
@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime,timedelta
+from typing import Any,Dict,List,Optional
+from .HlsPlaylist import HlsPlaylist,HlsSegment
+from .SegmentManifest import SegmentManifest
+from .TwitchPlaylistResolver import TwitchPlaylistResolver
+from ..VideoDownloader import InvalidQualityException
+from ..api.TwitchApiClient import TwitchApiClient
+from ..metrics.Metrics import Metrics
+from scheduler.StateJournal import StateJournal
+
+class LiveCapture:
+    """
+    Records a stream while it airs, so nothing gets muted and there's no need to download the video once it ends.
+    The segments are downloaded as soon as they appear on the live playlist, and kept on a bounded buffer until they're
+    appended to the part file. The ads are skipped, and after each discontinuity (or lost segments) a new part file is started,
+    so each part has continuous timestamps; they're joined once the stream ends.
+    """
+    OFFLINE_TIMEOUT = 60.0      # seconds without playlist before considering that the stream has ended (or that it won't start)
+    SEGMENT_RETRIES = 3
+    START_TOLERANCE = timedelta(seconds=30) # max delay between the start of the stream and the first captured segment
+
+    def __init__(self, channel: str, quality: str, folder: str, client: TwitchApiClient = None, resolver: TwitchPlaylistResolver = None,
+                        buffer_size: int = 16):
+        """
+        :param channel str:     Channel to record
+        :param quality str:     Quality of the recording
+        :param folder str:      Where to store the part files; if it already has some, the new ones are added after them
+        :param buffer_size int: Max downloaded segments waiting to be written
+        """
+        self._channel = channel
+        self._quality = quality
+        self._folder = folder
+        self._client = TwitchApiClient.default() if client is None else client
+        self._resolver = TwitchPlaylistResolver(self._client) if resolver is None else resolver
+        self._buffer_size = buffer_size
+        self._manifest = None
+        self._wake = None
+        self._start = False
+
+    @staticmethod
+    def manifest_path(folder: str) -> str:
+        return os.path.join(folder, 'live.json')
+
+    @staticmethod
+    def load(folder: str) -> Optional[Dict[str,Any]]:
+        """
+        :return:    Information of the recording on `folder` (parts, start time, lost segments), or `None` if there's none
+        """
+        return StateJournal(LiveCapture.manifest_path(folder)).load()
+
+    @staticmethod
+    def is_complete(manifest: Optional[Dict[str,Any]], published: datetime) -> bool:
+        """
+        :param published:   Start of the stream (UTC)
+        :return:            If the recording has the whole stream
+        """
+        if manifest is None or len(manifest['parts']) == 0 or manifest['start'] is None or manifest['lost'] > 0:
+            return False
+        return datetime.fromisoformat(manifest['start']) <= published + LiveCapture.START_TOLERANCE
+
+    @staticmethod
+    def parts(folder: str) -> List[str]:
+        manifest = LiveCapture.load(folder)
+        if manifest is None:
+            return []
+        return [os.path.join(folder, part['name']) for part in manifest['parts']]
+
+    @property
+    def started(self) -> bool:
+        return self._start
+
+    def _save(self):
+        StateJournal(LiveCapture.manifest_path(self._folder)).save(self._manifest)
+
+    def _get_segment(self, segment: HlsSegment) -> Optional[bytes]:
+        for attempt in range(LiveCapture.SEGMENT_RETRIES):
+            try:
+                status,_,data = self._client.request('GET', segment.uri)
+                if status == 200:
+                    return data
+                logging.debug(f"Got status {status} while downloading segment {segment.index} of {self._channel}")
+                Metrics.default().inc('segment_retries_total')
+            except OSError as ex:
+                logging.debug(f"Couldn't download segment {segment.index} of {self._channel}: {ex}")
+                Metrics.default().inc('segment_retries_total')
+        return None
+
+    def _append(self, segment: HlsSegment, data: bytes, new_part: bool):
+        parts = self._manifest['parts']
+        if new_part or len(parts) == 0:
+            parts.append({'name': f"live.{len(parts)}.ts", 'duration': 0.0, 'size': 0})
+        part = parts[-1]
+        with SegmentManifest.open_part(os.path.join(self._folder, part['name']), part['size']) as f:
+            f.write(data)
+        part['duration'] += segment.duration
+        part['size'] += len(data)
+        if self._manifest['start'] is None:
+            start = segment.program_date_time if segment.program_date_time is not None else datetime.utcnow() - timedelta(seconds=segment.duration)
+            self._manifest['start'] = start.isoformat()
+        self._save()
+
+    async def _write(self, buffer: asyncio.Queue):
+        loop = asyncio.get_event_loop()
+        while True:
+            item = await buffer.get()
+            if item is None:
+                return # no more segments
+            await loop.run_in_executor(None, self._append, *item)
+            Metrics.default().set('live_buffer_depth', buffer.qsize(), channel=self._channel)
+            Metrics.default().inc('live_captured_seconds_total', item[0].duration, channel=self._channel)
+
+    async def _fetch(self, buffer: asyncio.Queue):
+        loop = asyncio.get_event_loop()
+        playlist_url = None
+        last_sequence = None
+        offline_since = None
+        new_part = len(self._manifest['parts']) > 0 # resumed; we don't know what we've lost meanwhile
+        if new_part:
+            self._manifest['lost'] += 1
+        while self.started:
+            try:
+                if playlist_url is None:
+                    playlist_url = await loop.run_in_executor(None, self._resolver.get_live_playlist, self._channel, self._quality)
+                playlist = HlsPlaylist.parse(await loop.run_in_executor(None, self._client.get_text, playlist_url), playlist_url)
+                offline_since = None
+            except InvalidQualityException:
+                raise
+            except Exception as ex:
+                # offline, or the token has expired
+                logging.debug(f"Couldn't get the live playlist of {self._channel}: {ex}")
+                playlist_url = None
+                if offline_since is None:
+                    offline_since = time.time()
+                elif time.time() - offline_since > LiveCapture.OFFLINE_TIMEOUT:
+                    return
+                await self._sleep(2.0)
+                continue
+
+            for n,segment in enumerate(playlist.segments):
+                sequence = playlist.media_sequence + n
+                if last_sequence is not None and sequence <= last_sequence:
+                    continue # already got
+                if last_sequence is not None and sequence > last_sequence + 1:
+                    # we were too slow; the playlist already dropped them
+                    logging.warning(f"Lost {sequence - last_sequence - 1} segments of {self._channel}")
+                    Metrics.default().inc('live_lost_segments_total', sequence - last_sequence - 1, channel=self._channel)
+                    self._manifest['lost'] += 1
+                    new_part = True
+                last_sequence = sequence
+
+                if segment.ad:
+                    new_part = True # the stream will continue after a discontinuity
+                    continue
+
+                data = await loop.run_in_executor(None, self._get_segment, segment)
+                if data is None:
+                    logging.warning(f"Couldn't download segment {sequence} of {self._channel}")
+                    Metrics.default().inc('live_lost_segments_total', channel=self._channel)
+                    self._manifest['lost'] += 1
+                    new_part = True
+                    continue
+                await buffer.put((segment, data, new_part or segment.discontinuity)) # waits if the writer is falling behind
+                new_part = False
+
+            if playlist.ended:
+                return
+            await self._sleep(max(playlist.target_duration / 2, 1.0))
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """
+        Records the stream until it ends (or `stop` is called).
+        """
+        if self.started:
+            raise Exception("Can't run the same instance twice!")
+        self._start = True
+        self._wake = asyncio.Event()
+
+        os.makedirs(self._folder, exist_ok=True)
+        self._manifest = LiveCapture.load(self._folder)
+        if self._manifest is None:
+            self._manifest = {'channel': self._channel, 'start': None, 'lost': 0, 'parts': []}
+
+        buffer = asyncio.Queue(maxsize=self._buffer_size)
+        writer = asyncio.ensure_future(self._write(buffer))
+        try:
+            await self._fetch(buffer)
+        finally:
+            await buffer.put(None)
+            await writer
+            self._save()
+            self._start = False
+            logging.info(f"Live capture of {self._channel} finished ({sum(part['duration'] for part in self._manifest['parts']):.0f}s)")
+
+    def stop(self):
+        self._start = False
+        if self._wake is not None:
+            self._wake.set()
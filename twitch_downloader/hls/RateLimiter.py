@@ -0,0 +1,27 @@
+import time
+import threading
+
+class RateLimiter:
+    """
+    Token bucket shared between threads; `consume` blocks while the rate is exceeded
+    """
+    def __init__(self, rate: float, burst: float = None):
+        """
+        :param rate float:  Allowed units (eg. bytes) per second
+        :param burst float: Units that can be consumed at once after being idle; by default, one second worth of them
+        """
+        self._rate = rate
+        self._burst = rate if burst is None else burst
+        self._tokens = self._burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: float):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            self._tokens -= amount # it can go negative; the wait pays the debt
+            wait = 0 if self._tokens >= 0 else -self._tokens / self._rate
+        if wait > 0:
+            time.sleep(wait)
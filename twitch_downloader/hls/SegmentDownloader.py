@@ -0,0 +1,145 @@
+import io
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO,Dict,List,Optional
+from .HlsPlaylist import HlsPlaylist,HlsSegment
+from .RateLimiter import RateLimiter
+from ..api.TwitchApiClient import TwitchApiClient
+from ..metrics.Metrics import Metrics
+from scheduler.StateJournal import StateJournal
+
+class _ThrottledWriter(io.RawIOBase):
+    """
+    Writes into a buffer, waiting on the rate limiters before accepting the data
+    """
+    def __init__(self, limiters: List[RateLimiter]):
+        self._buffer = io.BytesIO()
+        self._limiters = limiters
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        for limiter in self._limiters:
+            limiter.consume(len(data))
+        return self._buffer.write(data)
+
+    def tell(self) -> int:
+        return self._buffer.tell()
+
+    def getvalue(self) -> bytes:
+        return self._buffer.getvalue()
+
+class SegmentDownloader:
+    """
+    Downloads all the segments of a HLS playlist using multiple connections.
+    The segments are appended (in any order) to a part file, and an index with their position (and a bitmap with the
+    downloaded ones) is kept next to it; if the download is interrupted, only the missing segments are downloaded again.
+    """
+    def __init__(self, client: TwitchApiClient, connections: int = 4, retries: int = 5, backoff: float = 2.0,
+                        job_rate: Optional[float] = None, global_limiter: Optional[RateLimiter] = None):
+        """
+        :param connections int:         Segments downloaded at the same time
+        :param retries int:             Tries of each segment before giving up
+        :param backoff float:           Seconds to wait after the first failure of a segment; it doubles with each failure
+        :param job_rate float:          Max. bytes per second of this download (`None` for no limit)
+        :param global_limiter:          Limiter shared with other downloads
+        """
+        self._client = client
+        self._connections = connections
+        self._retries = retries
+        self._backoff = backoff
+        self._job_rate = job_rate
+        self._global_limiter = global_limiter
+
+    @staticmethod
+    def index_path(part_path: str) -> str:
+        return part_path + '.index.json'
+
+    @staticmethod
+    def _load_index(part_path: str, segments: int) -> Dict[int,List[int]]:
+        index = StateJournal(SegmentDownloader.index_path(part_path)).load()
+        if index is None or not os.path.isfile(part_path):
+            return {}
+        if index['segments'] != segments:
+            logging.warning(f"The playlist changed since the last download ({index['segments']} -> {segments} segments); starting over")
+            return {}
+
+        bitmap = bytes.fromhex(index['bitmap'])
+        entries = {int(n): entry for n,entry in index['entries'].items()}
+        part_size = os.path.getsize(part_path)
+        # trust only the segments that are both on the bitmap and completely written
+        return {n: entry for n,entry in entries.items() if bitmap[n // 8] & (1 << (n % 8)) and entry[0] + entry[1] <= part_size}
+
+    @staticmethod
+    def _save_index(part_path: str, segments: int, entries: Dict[int,List[int]]):
+        bitmap = bytearray((segments + 7) // 8)
+        for n in entries:
+            bitmap[n // 8] |= 1 << (n % 8)
+        StateJournal(SegmentDownloader.index_path(part_path)).save({'segments': segments, 'bitmap': bitmap.hex(), 'entries': entries})
+
+    def _fetch(self, segment: HlsSegment, limiters: List[RateLimiter]) -> bytes:
+        failures = 0
+        while True:
+            try:
+                writer = _ThrottledWriter(limiters)
+                self._client.download(segment.uri, writer)
+                return writer.getvalue()
+            except Exception as ex:
+                failures += 1
+                if failures >= self._retries:
+                    raise
+                wait = self._backoff * 2**(failures - 1)
+                Metrics.default().inc('segment_retries_total')
+                logging.debug(f"Couldn't download segment {segment.index} ({ex}); trying again in {wait:.0f}s")
+                time.sleep(wait)
+
+    def download(self, playlist_url: str, out_path: str):
+        """
+        Downloads the video into `out_path` (MPEG-TS).
+        """
+        playlist = HlsPlaylist.parse(self._client.get_text(playlist_url), playlist_url)
+        part_path = out_path + '.part'
+        segments = len(playlist.segments)
+        entries = SegmentDownloader._load_index(part_path, segments)
+        pending = [n for n in range(segments) if n not in entries]
+        logging.debug(f"Downloading {len(pending)} segments ({len(entries)} already downloaded) with {self._connections} connections")
+
+        limiters = [limiter for limiter in (None if self._job_rate is None else RateLimiter(self._job_rate), self._global_limiter) if limiter is not None]
+        lock = threading.Lock()
+        last_save = [time.monotonic()]
+
+        def download_segment(part: BinaryIO, n: int):
+            data = self._fetch(playlist.segments[n], limiters)
+            with lock:
+                offset = part.seek(0, os.SEEK_END)
+                part.write(data)
+                entries[n] = [offset, len(data)]
+                if time.monotonic() - last_save[0] > 5.0:
+                    part.flush()
+                    SegmentDownloader._save_index(part_path, segments, entries)
+                    last_save[0] = time.monotonic()
+
+        with open(part_path, 'ab' if len(entries) > 0 else 'wb') as part:
+            try:
+                with ThreadPoolExecutor(max_workers=self._connections) as executor:
+                    for future in [executor.submit(download_segment, part, n) for n in pending]:
+                        future.result() # raises the first failure (once all the others are done)
+            finally:
+                part.flush()
+                SegmentDownloader._save_index(part_path, segments, entries)
+
+        # write the segments in order
+        with open(part_path, 'rb') as part, open(out_path, 'wb') as out:
+            for n in range(segments):
+                offset,size = entries[n]
+                part.seek(offset)
+                while size > 0:
+                    chunk = part.read(min(size, 1024*1024))
+                    out.write(chunk)
+                    size -= len(chunk)
+        os.remove(part_path)
+        os.remove(SegmentDownloader.index_path(part_path))
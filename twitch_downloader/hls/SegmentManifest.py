@@ -0,0 +1,43 @@
+from typing import BinaryIO
+from scheduler.StateJournal import StateJournal
+
+class SegmentManifest:
+    """
+    Segments of a video that are already on the part file (in order), persisted next to it
+    """
+    def __init__(self, path: str):
+        self._journal = StateJournal(path)
+        self.segments = []      # [index, duration, size] of each captured segment
+        self.chunks = []        # position (on `segments`) of the first segment of each chunk file, if they're split into chunks
+        data = self._journal.load()
+        if data is not None:
+            self.segments = data['segments']
+            self.chunks = data.get('chunks', [])
+
+    @staticmethod
+    def open_part(path: str, size: int) -> BinaryIO:
+        """
+        Opens a part file to append segments after its first `size` bytes (the ones that are on its manifest)
+        """
+        f = open(path, 'ab')
+        f.truncate(size) # a previous capture may have been interrupted in the middle of a segment
+        f.seek(size)
+        return f
+
+    @property
+    def next_index(self) -> int:
+        return 0 if len(self.segments) == 0 else self.segments[-1][0] + 1
+
+    @property
+    def duration(self) -> float:
+        return sum(segment[1] for segment in self.segments)
+
+    @property
+    def size(self) -> int:
+        return sum(segment[2] for segment in self.segments)
+
+    def add(self, index: int, duration: float, size: int):
+        self.segments.append([index, duration, size])
+
+    def save(self):
+        self._journal.save({'segments': self.segments, 'chunks': self.chunks})
@@ -0,0 +1,137 @@
+import os
+import math
+import shutil
+import asyncio
+import logging
+from typing import List,Tuple
+from .HlsPlaylist import HlsPlaylist
+from .SegmentManifest import SegmentManifest
+from .TwitchPlaylistResolver import TwitchPlaylistResolver
+from ..api.TwitchApiClient import TwitchApiClient
+from ..FFmpeg import FFmpeg
+
+class SegmentedCapture:
+    """
+    Same as `IncrementalCapture`, but the segments are appended into chunk files of `chunk_duration` seconds, listed on a HLS
+    playlist (`index.m3u8`, EVENT type) as soon as they're full; so the capture can be played (or served) while the stream goes on.
+    A full chunk is never written again, and the new data is only appended to the last one.
+    Once the video has ended, `compact` joins the chunks into a single file.
+    """
+    def __init__(self, client: TwitchApiClient = None, resolver: TwitchPlaylistResolver = None, chunk_duration: float = 60.0):
+        """
+        :param chunk_duration float:    Min. seconds of each chunk (they end on a segment boundary)
+        """
+        self._client = TwitchApiClient.default() if client is None else client
+        self._resolver = TwitchPlaylistResolver(self._client) if resolver is None else resolver
+        self._chunk_duration = chunk_duration
+
+    @staticmethod
+    def manifest_path(folder: str) -> str:
+        return os.path.join(folder, 'manifest.json')
+
+    @staticmethod
+    def index_path(folder: str) -> str:
+        return os.path.join(folder, 'index.m3u8')
+
+    @staticmethod
+    def _chunk_name(n: int) -> str:
+        return f"chunk.{n}.ts"
+
+    @staticmethod
+    def _chunks(manifest: SegmentManifest) -> List[Tuple[float,int]]:
+        """
+        :return:    Duration and size of each chunk
+        """
+        bounds = manifest.chunks + [len(manifest.segments)]
+        return [(sum(segment[1] for segment in manifest.segments[start:end]), sum(segment[2] for segment in manifest.segments[start:end]))
+                    for start,end in zip(bounds, bounds[1:])]
+
+    @staticmethod
+    def chunks(folder: str) -> List[str]:
+        """
+        :return:    Paths of the chunks of a capture (the last one may be still growing)
+        """
+        manifest = SegmentManifest(SegmentedCapture.manifest_path(folder))
+        return [os.path.join(folder, SegmentedCapture._chunk_name(n)) for n in range(len(manifest.chunks))]
+
+    @staticmethod
+    def size(folder: str) -> int:
+        return SegmentManifest(SegmentedCapture.manifest_path(folder)).size
+
+    def _write_index(self, folder: str, manifest: SegmentManifest, ended: bool, segment_duration: float):
+        chunks = SegmentedCapture._chunks(manifest)
+        if not ended:
+            chunks = chunks[:-1] # still growing
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-PLAYLIST-TYPE:EVENT',
+                 f'#EXT-X-TARGETDURATION:{math.ceil(self._chunk_duration + segment_duration)}', '#EXT-X-MEDIA-SEQUENCE:0']
+        for n,(duration,_) in enumerate(chunks):
+            lines += [f'#EXTINF:{duration:.3f},', SegmentedCapture._chunk_name(n)]
+        if ended:
+            lines.append('#EXT-X-ENDLIST')
+
+        tmp_path = SegmentedCapture.index_path(folder) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, SegmentedCapture.index_path(folder)) # the players may be reading it
+
+    def _capture(self, id: str, quality: str, folder: str) -> float:
+        os.makedirs(folder, exist_ok=True)
+        manifest = SegmentManifest(SegmentedCapture.manifest_path(folder))
+        playlist_url = self._resolver.get_playlist(id, quality)
+        playlist = HlsPlaylist.parse(self._client.get_text(playlist_url), playlist_url)
+
+        new_segments = [segment for segment in playlist.segments if segment.index >= manifest.next_index]
+        logging.debug(f"Got {len(new_segments)} new segments for video {id} ({len(manifest.segments)} already captured)")
+        if len(manifest.chunks) == 0:
+            manifest.chunks.append(0)
+        chunk_duration,chunk_size = SegmentedCapture._chunks(manifest)[-1]
+
+        f = SegmentManifest.open_part(os.path.join(folder, SegmentedCapture._chunk_name(len(manifest.chunks) - 1)), chunk_size)
+        try:
+            for segment in new_segments:
+                if chunk_duration >= self._chunk_duration:
+                    # it's full; go for the next one
+                    f.close()
+                    manifest.chunks.append(len(manifest.segments))
+                    manifest.save()
+                    self._write_index(folder, manifest, False, playlist.target_duration)
+                    f = open(os.path.join(folder, SegmentedCapture._chunk_name(len(manifest.chunks) - 1)), 'wb')
+                    chunk_duration = 0.0
+
+                size = self._client.download(segment.uri, f)
+                f.flush()
+                manifest.add(segment.index, segment.duration, size)
+                manifest.save()
+                chunk_duration += segment.duration
+        finally:
+            f.close()
+
+        self._write_index(folder, manifest, playlist.ended, playlist.target_duration)
+        return manifest.duration
+
+    async def capture(self, id: str, quality: str, folder: str) -> float:
+        """
+        Appends the new segments of a video into the chunks on `folder`.
+        :param id str:          ID of the Twitch video
+        :param quality str:     Quality of the video (the same for all the calls on the same `folder`)
+        :param folder str:      Where to store the chunks, the index and the manifest
+        :return float:          Captured seconds
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, self._capture, id, quality, folder)
+
+    @staticmethod
+    async def compact(folder: str, out_path: str):
+        """
+        Joins the chunks into a single file (copying the streams; no re-encoding), and removes them
+        """
+        chunks = [path for path in SegmentedCapture.chunks(folder) if os.path.isfile(path)]
+        if len(chunks) == 0:
+            logging.warning(f"Nothing to compact on '{folder}'")
+            return
+        if len(chunks) == 1:
+            shutil.move(chunks[0], out_path)
+        else:
+            tmp_path = os.path.splitext(out_path)[0] + '.tmp' + os.path.splitext(out_path)[1]
+            await FFmpeg.concat(chunks, tmp_path)
+            os.replace(tmp_path, out_path)
+        shutil.rmtree(folder, ignore_errors=True)
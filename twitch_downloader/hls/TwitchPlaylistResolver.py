@@ -0,0 +1,69 @@
+from urllib.parse import urlencode
+from typing import Dict
+from .HlsPlaylist import HlsPlaylist
+from ..VideoDownloader import VideoDownloader,InvalidQualityException
+from ..api.TwitchApiClient import TwitchApiClient,TwitchApiException
+
+class TwitchPlaylistResolver:
+    """
+    Finds the HLS playlist of a Twitch video (the same way the web player does)
+    """
+    def __init__(self, client: TwitchApiClient = None):
+        self._client = TwitchApiClient.default() if client is None else client
+
+    def _get_access_token(self, id: str) -> Dict[str,str]:
+        query = 'query { videoPlaybackAccessToken(id: "%s", params: {platform: "web", playerBackend: "mediaplayer", playerType: "site"}) { signature value } }' % id
+        token = self._client.gql(query)['videoPlaybackAccessToken']
+        if token is None:
+            raise TwitchApiException(f"Couldn't get the access token of video {id}")
+        return token
+
+    def get_playlists(self, id_or_url: str) -> Dict[str,str]:
+        """
+        Gets the media playlists of a video.
+        :return:    Media playlist URL by its quality
+        """
+        id = VideoDownloader.get_id(id_or_url)
+        token = self._get_access_token(id)
+        url = f"{self._client.usher_url}/vod/{id}.m3u8?" + urlencode({'nauth': token['value'], 'nauthsig': token['signature'],
+                                                                         'allow_source': 'true', 'player': 'twitchweb'})
+        return HlsPlaylist.parse_master(self._client.get_text(url), url)
+
+    def get_playlist(self, id_or_url: str, quality: str) -> str:
+        """
+        Gets the media playlist of a video with the desired quality.
+        """
+        playlists = self.get_playlists(id_or_url)
+        url = HlsPlaylist.select_quality(playlists, quality)
+        if url is None:
+            raise InvalidQualityException(valid_qualities=list(playlists.keys()))
+        return url
+
+    def _get_live_access_token(self, channel: str) -> Dict[str,str]:
+        query = 'query { streamPlaybackAccessToken(channelName: "%s", params: {platform: "web", playerBackend: "mediaplayer", playerType: "site"}) { signature value } }' % channel
+        token = self._client.gql(query)['streamPlaybackAccessToken']
+        if token is None:
+            raise TwitchApiException(f"Couldn't get the access token of channel {channel}")
+        return token
+
+    def get_live_playlists(self, channel: str) -> Dict[str,str]:
+        """
+        Gets the media playlists of the current stream of a channel.
+        It will raise an exception if the channel is not streaming.
+        :return:    Media playlist URL by its quality
+        """
+        channel = channel.lower()
+        token = self._get_live_access_token(channel)
+        url = f"{self._client.usher_url}/api/channel/hls/{channel}.m3u8?" + urlencode({'sig': token['signature'], 'token': token['value'],
+                                                                                        'allow_source': 'true', 'player': 'twitchweb'})
+        return HlsPlaylist.parse_master(self._client.get_text(url), url)
+
+    def get_live_playlist(self, channel: str, quality: str) -> str:
+        """
+        Gets the media playlist of the current stream of a channel with the desired quality.
+        """
+        playlists = self.get_live_playlists(channel)
+        url = HlsPlaylist.select_quality(playlists, quality)
+        if url is None:
+            raise InvalidQualityException(valid_qualities=list(playlists.keys()))
+        return url
@@ -0,0 +1,141 @@
+import time
+import threading
+from typing import Dict,Optional,Tuple
+
+class _Timer:
+    """
+    Measures the time inside a `with`/`async with` block, and adds it to a timing metric (even if it raises)
+    """
+    def __init__(self, metrics: 'Metrics', name: str, labels: Dict[str,str]):
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+        self._start = None
+        self.elapsed = None
+
+    def __enter__(self) -> '_Timer':
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.monotonic() - self._start
+        self._metrics.observe(self._name, self.elapsed, **self._labels)
+        return False
+
+    async def __aenter__(self) -> '_Timer':
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        return self.__exit__(*exc)
+
+class Metrics:
+    """
+    Counters, gauges and timings of the program, exported on the Prometheus text format.
+    Every metric can have labels (as keyword arguments); it's safe to use it from multiple threads.
+    """
+    PREFIX = 'twitch_downloader_'
+    BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 5*60.0, 30*60.0, 60*60.0) # seconds
+
+    _default = None
+
+    @staticmethod
+    def default() -> 'Metrics':
+        """
+        Registry shared by the whole program
+        """
+        if Metrics._default is None:
+            Metrics._default = Metrics()
+        return Metrics._default
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}    # name -> 'counter', 'gauge' or 'histogram'
+        self._help = {}     # name -> description
+        self._values = {}   # name -> labels -> value (`[buckets..., sum, count]` for the histograms)
+
+    @staticmethod
+    def _key(labels: Dict[str,str]) -> Tuple[Tuple[str,str],...]:
+        return tuple(sorted((k, str(v)) for k,v in labels.items()))
+
+    def _series(self, name: str, type: str, labels: Dict[str,str], initial):
+        if self._types.setdefault(name, type) != type:
+            raise ValueError(f"Metric {name} is a {self._types[name]}, not a {type}")
+        return self._values.setdefault(name, {}).setdefault(Metrics._key(labels), initial)
+
+    def describe(self, name: str, help: str):
+        with self._lock:
+            self._help[name] = help
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """
+        Increases a counter
+        """
+        with self._lock:
+            self._series(name, 'counter', labels, 0.0)
+            self._values[name][Metrics._key(labels)] += value
+
+    def set(self, name: str, value: float, **labels):
+        """
+        Sets the current value of a gauge
+        """
+        with self._lock:
+            self._series(name, 'gauge', labels, 0.0)
+            self._values[name][Metrics._key(labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        Adds a sample to a timing
+        """
+        with self._lock:
+            histogram = self._series(name, 'histogram', labels, [0]*len(Metrics.BUCKETS) + [0.0, 0])
+            for n,bucket in enumerate(Metrics.BUCKETS):
+                if seconds <= bucket:
+                    histogram[n] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def time(self, name: str, **labels) -> _Timer:
+        """
+        Measures a block of code:
+        `with metrics.time('remux_seconds'): ...` (or `async with`)
+        """
+        return _Timer(self, name, labels)
+
+    def get(self, name: str, **labels) -> Optional[float]:
+        """
+        :return:    Value of a counter/gauge, or number of samples of a timing (`None` if it was never set)
+        """
+        with self._lock:
+            value = self._values.get(name, {}).get(Metrics._key(labels))
+        if isinstance(value, list):
+            return value[-1]
+        return value
+
+    @staticmethod
+    def _labels(key: Tuple[Tuple[str,str],...], extra: Tuple[Tuple[str,str],...] = ()) -> str:
+        labels = key + extra
+        if len(labels) == 0:
+            return ''
+        return '{' + ','.join(k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for k,v in labels) + '}'
+
+    def render(self) -> str:
+        """
+        :return:    All the metrics, on the Prometheus text format
+        """
+        lines = []
+        with self._lock:
+            for name,series in sorted(self._values.items()):
+                full_name = Metrics.PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} {self._types[name]}")
+                for key,value in sorted(series.items()):
+                    if self._types[name] != 'histogram':
+                        lines.append(f"{full_name}{Metrics._labels(key)} {value}")
+                        continue
+                    for n,bucket in enumerate(Metrics.BUCKETS):
+                        lines.append(f"{full_name}_bucket{Metrics._labels(key, (('le', str(bucket)),))} {value[n]}")
+                    lines.append(f"{full_name}_bucket{Metrics._labels(key, (('le', '+Inf'),))} {value[-1]}")
+                    lines.append(f"{full_name}_sum{Metrics._labels(key)} {value[-2]}")
+                    lines.append(f"{full_name}_count{Metrics._labels(key)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
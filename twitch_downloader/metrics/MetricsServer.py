@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Optional
+from .Metrics import Metrics
+
+class MetricsServer:
+    """
+    Serves the metrics on `http://<host>:<port>/metrics` (Prometheus text format)
+    """
+    def __init__(self, metrics: Metrics = None, host: str = '127.0.0.1', port: int = 9464):
+        self._metrics = Metrics.default() if metrics is None else metrics
+        self._host = host
+        self._port = port
+        self._server = None
+        self._start = False
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()).strip() != b'':
+                pass # headers; not needed
+        except (ValueError, ConnectionError):
+            writer.close()
+            return
+
+        if len(request_line) >= 2 and request_line[0] == 'GET' and request_line[1].split('?')[0] == '/metrics':
+            status,content_type,body = '200 OK', 'text/plain; version=0.0.4', self._metrics.render().encode()
+        else:
+            status,content_type,body = '404 Not Found', 'text/plain', b''
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def run(self):
+        if self.started:
+            raise Exception("Can't run the same instance twice!")
+        self._start = True
+
+        self._server = await asyncio.start_server(self._serve, self._host, self._port)
+        logging.info(f"Serving the metrics on http://{self._host}:{self.port}/metrics")
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass # stopped
+
+    @property
+    def started(self) -> bool:
+        return self._start
+
+    @property
+    def port(self) -> Optional[int]:
+        """
+        Port being listened (useful if it was started on port 0)
+        """
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        self._start = False
+        if self._server is not None:
+            self._server.close()
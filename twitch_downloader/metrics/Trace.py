@@ -0,0 +1,36 @@
+import logging
+import threading
+
+class Trace:
+    """
+    Very verbose messages (like the whole output of the commands, with their progress bars), logged on the TRACE level (below DEBUG).
+    Only one of every `sample_every` messages of the same kind is logged, and they're truncated to `max_length`.
+    """
+    LEVEL = 5
+    sample_every = 10
+    max_length = 4096
+
+    _counts = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def log(kind: str, message: str, logger: logging.Logger = None):
+        """
+        :param kind str:    What the message is (eg. the command that generated it); each kind is sampled on its own
+        """
+        if logger is None:
+            logger = logging.getLogger()
+        if not logger.isEnabledFor(Trace.LEVEL):
+            return
+
+        with Trace._lock:
+            count = Trace._counts.get(kind, 0)
+            Trace._counts[kind] = count + 1
+        if count % Trace.sample_every != 0:
+            return
+
+        if len(message) > Trace.max_length:
+            message = message[:Trace.max_length] + f"... ({len(message) - Trace.max_length} more characters)"
+        logger.log(Trace.LEVEL, f"[{kind}, 1/{Trace.sample_every} sampled] {message}")
+
+logging.addLevelName(Trace.LEVEL, 'TRACE')
@@ -0,0 +1,48 @@
+from ..VideoDownloader import VideoDownloader
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from .TwitchDlDownloader import TwitchDlDownloader
+from ..metrics.Trace import Trace
+from typing import Any,Dict,List
+import os
+import sys
+import asyncio
+
+class AsyncTwitchDlDownloader(AsyncVideoDownloader):
+    def __init__(self, twitchdl_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "twitch-dl")):
+        self._interpreter = sys.executable
+        self._twitchdl_path = twitchdl_path
+
+    async def _run_command(self, *args: List[str]) -> str:
+        return await AsyncVideoDownloader.run_command(self._interpreter, '-u', self._twitchdl_path, *args)
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        id = VideoDownloader.get_id(id_or_url)
+        result = await self._run_command('download', id, '--quality', quality)
+        Trace.log('twitch-dl download', f"Result of the download command: ```{result}```")
+
+        video_path = TwitchDlDownloader._parse_download(result, quality)
+        await AsyncVideoDownloader.move_and_reformat(video_path, out_path)
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        id = VideoDownloader.get_id(id_or_url)
+        tries = 5
+
+        while tries > 0:
+            info = await self._run_command('info', id)
+            Trace.log('twitch-dl info', f"Result of the info command: ```{info}```")
+
+            r = TwitchDlDownloader._parse_info(info)
+            if r is not None:
+                return r # we're done
+
+            # something went wrong while fetching; try again later
+            await asyncio.sleep(2)
+            tries -= 1
+
+        return {}
+
+    async def get_last_video(self, channel: str) -> str:
+        info = await self._run_command('videos', channel, '--limit', '1')
+        Trace.log('twitch-dl videos', f"Result of the videos command: ```{info}```")
+
+        return TwitchDlDownloader._parse_last_video(info, channel)
@@ -0,0 +1,46 @@
+from ..VideoDownloader import VideoDownloader
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from ..api.TwitchApiClient import TwitchApiClient
+from ..hls.RateLimiter import RateLimiter
+from ..hls.SegmentDownloader import SegmentDownloader
+from ..hls.TwitchPlaylistResolver import TwitchPlaylistResolver
+from scheduler.ResourceLimits import ResourceLimits
+from storage.StorageManager import StorageManager
+from typing import Optional
+import os
+import asyncio
+import logging
+
+class HlsVideoDownloader(AsyncVideoDownloader):
+    """
+    Downloads the videos by getting their HLS segments in parallel; interrupted downloads are resumed.
+    """
+    def __init__(self, client: TwitchApiClient = None, connections: int = 4, job_rate: Optional[float] = None, global_limiter: Optional[RateLimiter] = None,
+                        limits: Optional[ResourceLimits] = None, storage: Optional[StorageManager] = None):
+        """
+        :param connections int:     Segments downloaded at the same time by each download
+        :param job_rate float:      Max. bytes per second of each download (`None` for no limit)
+        :param global_limiter:      Limiter shared by all the downloads (`None` for no limit)
+        :param limits:              If set, the segments are reformatted into the final container as any other FFmpeg job
+        :param storage:             If set, the space of the reformatted video is reserved before writing it
+        """
+        self._limits = limits
+        self._storage = storage
+        self._client = TwitchApiClient.default() if client is None else client
+        self._resolver = TwitchPlaylistResolver(self._client)
+        self._segment_downloader = SegmentDownloader(self._client, connections, job_rate=job_rate, global_limiter=global_limiter)
+
+    def _download(self, id: str, quality: str, ts_path: str):
+        playlist_url = self._resolver.get_playlist(id, quality)
+        self._segment_downloader.download(playlist_url, ts_path)
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        id = VideoDownloader.get_id(id_or_url)
+        ts_path = os.path.splitext(out_path)[0] + '.download.ts' # the part file is next to it, so it can be resumed
+        logging.debug(f"Downloading video {id} into {ts_path}...")
+        await asyncio.get_event_loop().run_in_executor(None, self._download, id, quality, ts_path)
+        if self._limits is None or self._storage is None or os.path.splitext(out_path)[1] == '.ts':
+            await AsyncVideoDownloader.move_and_reformat(ts_path, out_path)
+            return
+        async with self._storage.reserve(os.path.dirname(out_path) or '.', os.path.getsize(ts_path), out_path), self._limits.ffmpeg_jobs:
+            await AsyncVideoDownloader.move_and_reformat(ts_path, out_path)
@@ -0,0 +1,98 @@
+from ..VideoDownloader import VideoDownloader
+from ..AsyncVideoDownloader import AsyncVideoDownloader
+from ..api.TwitchApiClient import TwitchApiClient,TwitchApiException
+from ..metrics.Trace import Trace
+from typing import Any,Dict,List,Optional
+from datetime import datetime,timedelta
+import asyncio
+import logging
+import json
+
+class TwitchApiDownloader(AsyncVideoDownloader):
+    """
+    Gets the video information straight from Twitch's GQL API, without launching any process.
+    Downloads (and chats) are delegated to another downloader.
+    """
+    _INFO_QUERY = 'query($id: ID!) { video(id: $id) { id publishedAt lengthSeconds } }'
+    _LAST_VIDEO_QUERY = 'query($login: String!) { user(login: $login) { videos(first: 1, type: ARCHIVE, sort: TIME) { edges { node { id } } } } }'
+    _INFO_FIELDS = '{ id publishedAt lengthSeconds }'
+    _LAST_VIDEO_FIELDS = '{ videos(first: 1, type: ARCHIVE, sort: TIME) { edges { node { id } } } }'
+    BATCH_SIZE = 35 # lookups per request; GQL rejects too complex queries
+
+    def __init__(self, client: TwitchApiClient, downloader: AsyncVideoDownloader):
+        self._client = client
+        self._downloader = downloader
+
+    async def _gql(self, query: str, variables: Dict[str,Any]) -> Dict[str,Any]:
+        return await asyncio.get_event_loop().run_in_executor(None, self._client.gql, query, variables)
+
+    @staticmethod
+    def _parse_published(published: str) -> datetime:
+        # Twitch uses UTC ('2022-01-31T18:03:51Z'); we keep it as a naive datetime, as twitch-dl does
+        return datetime.strptime(published, '%Y-%m-%dT%H:%M:%SZ')
+
+    @staticmethod
+    def _parse_info(video: Optional[Dict[str,Any]]) -> Dict[str,Any]:
+        if video is None:
+            return {} # removed (or never existed)
+        return {
+            'published': TwitchApiDownloader._parse_published(video['publishedAt']),
+            'length': timedelta(seconds=video['lengthSeconds'])
+        }
+
+    @staticmethod
+    def _parse_last_video(user: Optional[Dict[str,Any]], channel: str) -> Optional[str]:
+        if user is None:
+            raise TwitchApiException(f"Channel {channel} not found")
+        edges = user['videos']['edges']
+        return None if len(edges) == 0 else edges[0]['node']['id']
+
+    async def get_info(self, id_or_url: str) -> Dict[str,Any]:
+        id = VideoDownloader.get_id(id_or_url)
+        data = await self._gql(TwitchApiDownloader._INFO_QUERY, {'id': id})
+        Trace.log('gql info', f"Result of the info query: ```{data}```")
+        return TwitchApiDownloader._parse_info(data['video'])
+
+    async def get_last_video(self, channel: str) -> str:
+        data = await self._gql(TwitchApiDownloader._LAST_VIDEO_QUERY, {'login': channel})
+        Trace.log('gql videos', f"Result of the videos query: ```{data}```")
+        return TwitchApiDownloader._parse_last_video(data['user'], channel)
+
+    async def _gql_batch(self, field: str, argument: str, values: List[str], fields: str) -> List[Any]:
+        """
+        Runs the same lookup for multiple values, using one aliased query for each `BATCH_SIZE` values.
+        :return:    Result of each lookup (in the same order as `values`)
+        """
+        chunks = [values[n:n+TwitchApiDownloader.BATCH_SIZE] for n in range(0, len(values), TwitchApiDownloader.BATCH_SIZE)]
+        queries = ['query { ' + ' '.join(f'r{n}: {field}({argument}: {json.dumps(value)}) {fields}' for n,value in enumerate(chunk)) + ' }' for chunk in chunks]
+        results = await asyncio.gather(*[self._gql(query, None) for query in queries])
+        return [data[f'r{n}'] for chunk,data in zip(chunks, results) for n in range(len(chunk))]
+
+    async def get_infos(self, ids_or_urls: List[str]) -> Dict[str,Dict[str,Any]]:
+        if len(ids_or_urls) == 0:
+            return {}
+        videos = await self._gql_batch('video', 'id', [VideoDownloader.get_id(id_or_url) for id_or_url in ids_or_urls], TwitchApiDownloader._INFO_FIELDS)
+        logging.debug(f"Got the information of {len(videos)} videos in a batch")
+        return {id_or_url: TwitchApiDownloader._parse_info(video) for id_or_url,video in zip(ids_or_urls, videos)}
+
+    async def get_last_videos(self, channels: List[str]) -> Dict[str,Optional[str]]:
+        if len(channels) == 0:
+            return {}
+        users = await self._gql_batch('user', 'login', channels, TwitchApiDownloader._LAST_VIDEO_FIELDS)
+        logging.debug(f"Got the last video of {len(users)} channels in a batch")
+        r = {}
+        for channel,user in zip(channels, users):
+            try:
+                r[channel] = TwitchApiDownloader._parse_last_video(user, channel)
+            except TwitchApiException as ex:
+                logging.error(ex)
+        return r
+
+    async def download(self, id_or_url: str, quality: str, out_path: str):
+        await self._downloader.download(id_or_url, quality, out_path)
+
+    async def get_chat(self, id_or_url: str, format: str, out_path: str):
+        await self._downloader.get_chat(id_or_url, format, out_path)
+
+    async def sync_chat(self, id_or_url: str, folder: str):
+        await self._downloader.sync_chat(id_or_url, folder)
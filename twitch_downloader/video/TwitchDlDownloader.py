@@ -1,9 +1,9 @@
 from ..VideoDownloader import VideoDownloader,InvalidQualityException
-from typing import Any,Dict,List
+from ..metrics.Trace import Trace
+from typing import Any,Dict,List,Optional
 import os
 import re
 import subprocess
-import logging
 import sys
 from datetime import datetime,timedelta
 from time import sleep
@@ -20,7 +20,19 @@ class TwitchDlDownloader(VideoDownloader):
     def download(self, id_or_url: str, quality: str, out_path: str):
         id = VideoDownloader.get_id(id_or_url)
         result = self._run_command('download', id, '--quality', quality)
-        logging.debug(f"Result of the download command: ```{result}```")
+        Trace.log('twitch-dl download', f"Result of the download command: ```{result}```")
+
+        video_path = TwitchDlDownloader._parse_download(result, quality)
+        VideoDownloader.move_and_reformat(video_path, out_path)
+
+    @staticmethod
+    def _parse_download(result: str, quality: str) -> str:
+        """
+        Gets the path of the downloaded video from the output of the download command.
+        :param result str:      Output of the download command
+        :param quality str:     Quality requested to the download command
+        :return str:            Path of the downloaded video
+        """
         result = TwitchDlDownloader._escape_ansi(result)
 
         invalid_quality_pattern = re.compile(r'Quality \'' + re.escape(quality) + r'\' not found. Available qualities are: (.+)')
@@ -33,8 +45,7 @@ class TwitchDlDownloader(VideoDownloader):
         if not ok_match:
             raise Exception(result) # something wrong happened
             
-        video_path = os.path.join(os.getcwd(), ok_match.group(1)) # it will generate the file on the same folder as the MAIN script
-        VideoDownloader.move_and_reformat(video_path, out_path)
+        return os.path.join(os.getcwd(), ok_match.group(1)) # it will generate the file on the same folder as the MAIN script
 
     @staticmethod
     def _escape_ansi(line: str):
@@ -45,42 +56,54 @@ class TwitchDlDownloader(VideoDownloader):
         ansi_escape = re.compile(r'(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]')
         return ansi_escape.sub('', line)
 
-    def get_info(self, id_or_url: str) -> Dict[str,Any]:
+    @staticmethod
+    def _parse_info(info: str) -> Optional[Dict[str,Any]]:
+        """
+        Gets the video information from the output of the info command.
+        :return:    The information, or `None` if the output is not valid
+        """
+        info_pattern = re.compile(r'Published\s+(\d{4}-\d{2}-\d{2})\s*@\s*(\d{2}:\d{2}:\d{2})\s+Length:\s*(.*)')
+        info_match = info_pattern.search(TwitchDlDownloader._escape_ansi(info))
+        if not info_match:
+            return None
+
         r = {}
+        r['published'] = datetime.strptime(info_match.group(1) + " " + info_match.group(2), '%Y-%m-%d %H:%M:%S')
+
+        # examples of length:
+        # 47 h 59 min
+        # 3 h 14 min
+        # 35 min 46 sec
+        length_pattern = re.compile(r'(?:(\d+) h)?\s*(\d+) min')
+        length_match = length_pattern.search(info_match.group(3))
+        if length_match:
+            r['length'] = timedelta(minutes=int(length_match.group(2)), hours=int("0" if length_match.group(1) is None else length_match.group(1)))
 
+        return r
+
+    def get_info(self, id_or_url: str) -> Dict[str,Any]:
         id = VideoDownloader.get_id(id_or_url)
         tries = 5
 
         while tries > 0:
             info = self._run_command('info', id)
-            logging.debug(f"Result of the info command: ```{info}```")
-
-            info_pattern = re.compile(r'Published\s+(\d{4}-\d{2}-\d{2})\s*@\s*(\d{2}:\d{2}:\d{2})\s+Length:\s*(.*)')
-            info_match = info_pattern.search(TwitchDlDownloader._escape_ansi(info))
-            if info_match:
-                r['published'] = datetime.strptime(info_match.group(1) + " " + info_match.group(2), '%Y-%m-%d %H:%M:%S')
-
-                # examples of length:
-                # 47 h 59 min
-                # 3 h 14 min
-                # 35 min 46 sec
-                length_pattern = re.compile(r'(?:(\d+) h)?\s*(\d+) min')
-                length_match = length_pattern.search(info_match.group(3))
-                if length_match:
-                    r['length'] = timedelta(minutes=int(length_match.group(2)), hours=int("0" if length_match.group(1) is None else length_match.group(1)))
+            Trace.log('twitch-dl info', f"Result of the info command: ```{info}```")
 
+            r = TwitchDlDownloader._parse_info(info)
+            if r is not None:
                 return r # we're done
 
             # something went wrong while fetching; try again later
             sleep(2)
             tries -= 1
 
-        return r
-
-    def get_last_video(self, channel: str) -> str:
-        info = self._run_command('videos', channel, '--limit', '1')
-        logging.debug(f"Result of the videos command: ```{info}```")
+        return {}
 
+    @staticmethod
+    def _parse_last_video(info: str, channel: str) -> Optional[str]:
+        """
+        Gets the last video ID from the output of the videos command.
+        """
         info = TwitchDlDownloader._escape_ansi(info)
         if info == "No videos found\n":
             return None
@@ -92,4 +115,10 @@ class TwitchDlDownloader(VideoDownloader):
             if not info_match:
                 raise Exception(f"Couldn't match regex on output {info}")
             
-            return info_match.group(1) # last video ID
\ No newline at end of file
+            return info_match.group(1) # last video ID
+
+    def get_last_video(self, channel: str) -> str:
+        info = self._run_command('videos', channel, '--limit', '1')
+        Trace.log('twitch-dl videos', f"Result of the videos command: ```{info}```")
+
+        return TwitchDlDownloader._parse_last_video(info, channel)